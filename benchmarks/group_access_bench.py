@@ -0,0 +1,173 @@
+"""
+Обращения к Redis в GroupChatAccessMiddleware на один апдейт группы.
+
+Каждый сценарий прогоняется через middleware с RedisStorage, как в боте:
+считаются round trips клиента, команды на сервере (включая команды
+внутри Lua-скрипта аренды и чтения FSM) и медианное время. Обработчик
+ничего не делает — состояние, которое он оставил бы после себя,
+записывается заранее, поэтому в счёт попадает только middleware.
+
+Ответ «бот занят» (/start при активном инициаторе не в главном меню)
+уходит в Telegram и здесь не замеряется; до ответа этот путь совпадает
+с началом перехвата: скрипт и чтение состояния инициатора.
+
+Нужен запущенный Redis (REDIS_URL из настроек). Запуск из корня репозитория:
+    python -m benchmarks.group_access_bench [--repeat 200]
+
+--root позволяет прогнать те же замеры на другой копии репозитория,
+например на git worktree предыдущего коммита.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+CHAT_ID = -100123
+INITIATOR_ID = 1001
+OTHER_ID = 1002
+SCENARIO_STATE = "TextGenerationStates:waiting_for_text"
+
+
+def _message(bot, user_id: int, text: str):
+    from aiogram import types
+
+    return types.Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=types.Chat(id=CHAT_ID, type="supergroup"),
+        from_user=types.User(id=user_id, is_bot=False, first_name="Bench"),
+        text=text,
+    ).as_(bot)
+
+
+async def _run(args) -> None:
+    from aiogram import Bot
+    from aiogram.fsm.context import FSMContext
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    from benchmarks.redis_counting import RedisCommandCounter, format_commands
+    from src.bot.middlewares import GroupChatAccessMiddleware
+    from src.bot.states import MainMenuStates
+    from src.config import settings
+    from src.services.rate_limiter import rate_limiter
+
+    main_menu = str(MainMenuStates.main_menu)
+    bot = Bot(token=os.environ["BOT_TOKEN"])
+    storage = RedisStorage.from_url(settings.REDIS_URL)
+    middleware = GroupChatAccessMiddleware(storage=storage)
+    await rate_limiter.initialize()
+    redis_client = rate_limiter.redis_client
+
+    def state_of(user_id: int) -> FSMContext:
+        return FSMContext(
+            storage=storage,
+            key=StorageKey(bot_id=bot.id, chat_id=CHAT_ID, user_id=user_id),
+        )
+
+    async def handler(event, data):
+        return None
+
+    def update(user_id: int, text: str = "текст"):
+        async def run():
+            event = _message(bot, user_id, text)
+            await middleware(handler, event, {"state": state_of(user_id)})
+
+        return run
+
+    async def reset():
+        await redis_client.delete(
+            f"chat:{CHAT_ID}:initiator",
+            f"chat:{CHAT_ID}:initiator:last_activity",
+            f"chat:{CHAT_ID}:initiator_lease",
+        )
+        await state_of(INITIATOR_ID).set_state(SCENARIO_STATE)
+        await state_of(OTHER_ID).set_state(SCENARIO_STATE)
+
+    async def with_initiator(initiator_state: str = SCENARIO_STATE):
+        await reset()
+        await update(INITIATOR_ID)()
+        await state_of(INITIATOR_ID).set_state(initiator_state)
+
+    async def expired_initiator():
+        await with_initiator()
+        # Любая аренда считается истёкшей
+        settings.INACTIVITY_TIMEOUT = -1
+
+    async def takeover():
+        await with_initiator(main_menu)
+        await state_of(OTHER_ID).set_state(main_menu)
+
+    async def return_to_menu():
+        await with_initiator(main_menu)
+
+    scenarios = [
+        ("новый инициатор", reset, update(INITIATOR_ID)),
+        ("клик инициатора", with_initiator, update(INITIATOR_ID)),
+        ("истёк таймаут неактивности", expired_initiator, update(INITIATOR_ID)),
+        ("чужой клик", with_initiator, update(OTHER_ID)),
+        ("/start с перехватом (BUSY)", takeover, update(OTHER_ID, "/start")),
+        ("возврат в главное меню", return_to_menu, update(INITIATOR_ID)),
+    ]
+
+    inactivity_timeout = settings.INACTIVITY_TIMEOUT
+    print(f"Код: {args.root}, медиана из {args.repeat} замеров\n")
+    print(f"{'сценарий':<30}{'RTT':>5}{'команд':>8}{'медиана, мкс':>14}  команды")
+    try:
+        async with RedisCommandCounter(settings.REDIS_URL) as counter:
+            for title, prepare, flow in scenarios:
+                # Прогрев: загрузка скриптов (NOSCRIPT) и соединений
+                await prepare()
+                await flow()
+                settings.INACTIVITY_TIMEOUT = inactivity_timeout
+
+                await prepare()
+                round_trips, commands = await counter.measure(flow)
+                settings.INACTIVITY_TIMEOUT = inactivity_timeout
+
+                timings = []
+                for _ in range(args.repeat):
+                    await prepare()
+                    started = time.perf_counter()
+                    await flow()
+                    timings.append((time.perf_counter() - started) * 1e6)
+                    settings.INACTIVITY_TIMEOUT = inactivity_timeout
+                timings.sort()
+
+                print(
+                    f"{title:<30}{round_trips:>5}{sum(commands.values()):>8}"
+                    f"{timings[len(timings) // 2]:>14.0f}  {format_commands(commands)}"
+                )
+    finally:
+        await reset()
+        await state_of(INITIATOR_ID).clear()
+        await state_of(OTHER_ID).clear()
+        await storage.close()
+        await rate_limiter.close()
+        await bot.session.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--root", default=str(REPO_ROOT))
+    args = parser.parse_args()
+
+    os.environ.setdefault("ADMIN_ID", "1")
+    os.environ.setdefault("DB_PORT", "5432")
+    os.environ.setdefault("REDIS_PORT", "6379")
+    # Бот не подключается к Telegram, но src.bot создаёт его при импорте
+    os.environ.setdefault("BOT_TOKEN", "123456:bench")
+    sys.path.insert(0, args.root)
+    sys.path.insert(1, str(REPO_ROOT))
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Пиковая память и процессорное время наложения текста и логотипа.
+
+Каждый замер выполняется в отдельном процессе: ru_maxrss монотонен,
+поэтому прирост пика считается от RSS перед вызовом и не смешивается
+с предыдущими замерами. Входное изображение (JPEG) готовится
+заранее и передаётся файлом.
+
+Запуск из корня репозитория:
+    python -m benchmarks.overlay_memory_bench [--sizes 1024 4096]
+
+--root позволяет прогнать те же замеры на другой копии репозитория,
+например на git worktree предыдущего коммита.
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+# decode — только декодирование входа, точка отсчёта для остальных случаев
+CASES = ("decode", "text", "logo")
+TEXT = (
+    "Благотворительная ярмарка в эту субботу: мастер-классы, выставка работ "
+    "подопечных и музыка. Вход свободный, начало в 12:00."
+)
+LOGO_SIZE = 512
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * resource.getpagesize() / 2**20
+
+
+def _peak_rss_mb() -> float:
+    # В Linux ru_maxrss в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _make_inputs(size: int, directory: str) -> tuple:
+    from PIL import Image
+
+    # Градиент с лёгким шумом: сжимается примерно как сгенерированная картинка
+    gradient = Image.linear_gradient("L").resize((size, size))
+    noise = Image.effect_noise((size, size), 12)
+    base = Image.merge(
+        "RGB",
+        (
+            Image.blend(gradient, noise, 0.3),
+            Image.blend(gradient.rotate(90), noise, 0.3),
+            Image.blend(gradient.rotate(180), noise, 0.3),
+        ),
+    )
+    base_path = os.path.join(directory, f"base_{size}.jpg")
+    base.save(base_path, format="JPEG", quality=90)
+
+    logo = Image.new("RGBA", (LOGO_SIZE, LOGO_SIZE), (220, 40, 40, 180))
+    logo_path = os.path.join(directory, "logo.png")
+    logo.save(logo_path, format="PNG")
+    return base_path, logo_path
+
+
+def _run_case(case: str, base_path: str, logo_path: str) -> dict:
+    """Один замер; выполняется в дочернем процессе"""
+    os.environ.setdefault("ADMIN_ID", "1")
+    os.environ.setdefault("DB_PORT", "5432")
+    os.environ.setdefault("REDIS_PORT", "6379")
+
+    from src.services.image_overlay import apply_image_overlay
+    from src.services.text_overlay import TextOverlayService
+
+    base_bytes = Path(base_path).read_bytes()
+    logo_bytes = Path(logo_path).read_bytes()
+    if case == "decode":
+        from PIL import Image
+
+        def run():
+            image = Image.open(io.BytesIO(base_bytes))
+            image.load()
+            return base_bytes
+    elif case == "text":
+        service = TextOverlayService()
+        font = service.list_fonts()[0]
+
+        def run():
+            return service.apply_text(base_bytes, TEXT, font)
+    else:
+
+        def run():
+            return apply_image_overlay(base_bytes, logo_bytes)
+
+    rss_before = _rss_mb()
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    result = run()
+    return {
+        "cpu_ms": (time.process_time() - cpu_started) * 1000,
+        "wall_ms": (time.perf_counter() - wall_started) * 1000,
+        "peak_delta_mb": _peak_rss_mb() - rss_before,
+        "output_kb": len(result) / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4096])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--root", default=str(REPO_ROOT))
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    parser.add_argument("--logo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        sys.path.insert(0, args.root)
+        print(json.dumps(_run_case(args.case, args.base, args.logo)))
+        return
+
+    print(f"Код: {args.root}, медиана из {args.repeat} процессов\n")
+    print(
+        f"{'случай':<16}{'CPU, мс':>10}{'время, мс':>12}"
+        f"{'прирост пика RSS, МБ':>24}{'результат, КБ':>16}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            base_path, logo_path = _make_inputs(size, directory)
+            for case in CASES:
+                runs = []
+                for _ in range(args.repeat):
+                    output = subprocess.run(
+                        [
+                            sys.executable,
+                            __file__,
+                            "--case",
+                            case,
+                            "--root",
+                            args.root,
+                            "--base",
+                            base_path,
+                            "--logo",
+                            logo_path,
+                        ],
+                        cwd=args.root,
+                        check=True,
+                        capture_output=True,
+                        text=True,
+                    ).stdout
+                    runs.append(json.loads(output.strip().splitlines()[-1]))
+
+                median = {
+                    key: sorted(run[key] for run in runs)[len(runs) // 2]
+                    for key in runs[0]
+                }
+                print(
+                    f"{f'{case} {size}²':<16}{median['cpu_ms']:>10.0f}"
+                    f"{median['wall_ms']:>12.0f}{median['peak_delta_mb']:>24.1f}"
+                    f"{median['output_kb']:>16.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
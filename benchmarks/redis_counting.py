@@ -0,0 +1,68 @@
+"""
+Подсчёт обращений к Redis для бенчмарков.
+
+Round trip — одна отправка клиента (send_packed_command): отдельная
+команда, EVALSHA или весь pipeline. Команды на сервере берутся из
+INFO commandstats и включают вызовы redis.call внутри Lua-скриптов.
+Нужен настоящий Redis (REDIS_URL из настроек).
+"""
+
+from collections import Counter
+from typing import Awaitable, Callable, Tuple
+
+import redis.asyncio as redis
+from redis.asyncio.connection import AbstractConnection
+
+# Команды самого счётчика, которые не относятся к замеру
+_SERVICE_COMMANDS = {"config", "info"}
+
+
+class RedisCommandCounter:
+    """Считает round trips клиента и команды сервера для одного вызова"""
+
+    def __init__(self, redis_url: str):
+        self._stats = redis.from_url(redis_url, decode_responses=True)
+        self._round_trips = 0
+        self._counting = False
+        self._original_send = None
+
+    async def __aenter__(self) -> "RedisCommandCounter":
+        counter = self
+        original_send = AbstractConnection.send_packed_command
+
+        async def send_packed_command(connection, command, check_health=True):
+            if counter._counting:
+                counter._round_trips += 1
+            return await original_send(connection, command, check_health)
+
+        self._original_send = original_send
+        AbstractConnection.send_packed_command = send_packed_command
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        AbstractConnection.send_packed_command = self._original_send
+        await self._stats.aclose()
+
+    async def measure(
+        self, flow: Callable[[], Awaitable[object]]
+    ) -> Tuple[int, Counter]:
+        """Round trips и команды сервера (по именам) за один вызов flow"""
+        await self._stats.config_resetstat()
+        self._round_trips = 0
+        self._counting = True
+        try:
+            await flow()
+        finally:
+            self._counting = False
+        stats = await self._stats.info("commandstats")
+
+        commands = Counter()
+        for name, values in stats.items():
+            command = name.removeprefix("cmdstat_")
+            if command not in _SERVICE_COMMANDS:
+                commands[command.upper()] = values["calls"]
+        return self._round_trips, commands
+
+
+def format_commands(commands: Counter) -> str:
+    return ", ".join(f"{name}×{calls}" for name, calls in sorted(commands.items()))
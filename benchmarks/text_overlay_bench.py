@@ -0,0 +1,162 @@
+"""
+Микробенчмарк вёрстки текста на изображении.
+
+Сравнивает перенос строк до кэширования (textlength для каждого растущего
+префикса строки, шрифт загружается заново) с текущим _wrap_text
+на холодных и прогретых кэшах, а также подбор размера шрифта
+и apply_text целиком.
+
+Запуск из корня репозитория:
+    python -m benchmarks.text_overlay_bench [--repeat 20]
+"""
+
+import argparse
+import io
+import os
+import time
+from typing import Callable, List
+
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ.setdefault("REDIS_PORT", "6379")
+
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+
+from src.services.text_overlay import (  # noqa: E402
+    TextOverlayService,
+    _load_font,
+    _text_width,
+)
+
+SHORT_TEXT = "Субботник в парке в эту субботу"
+LONG_TEXT = (
+    "Приглашаем всех жителей района на благотворительную ярмарку: "
+    "мастер-классы, выставка работ подопечных, угощения и музыка. "
+    "Все собранные средства пойдут на оборудование для реабилитационного "
+    "центра. Приходите с семьёй и друзьями, будем рады каждому!\n"
+    "Вход свободный, начало в 12:00."
+) * 2
+
+
+def _legacy_wrap(
+    text: str, font_path: str, font_size: int, max_width: int
+) -> List[str]:
+    """Перенос строк в том виде, в каком он был до кэширования ширин"""
+    font = ImageFont.truetype(font_path, size=font_size)
+    draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    lines = []
+    for paragraph in text.strip().splitlines():
+        paragraph = paragraph.strip()
+        if not paragraph:
+            lines.append("")
+            continue
+
+        current_line = ""
+        for word in paragraph.split():
+            test_line = f"{current_line} {word}".strip()
+            if draw.textlength(test_line, font=font) <= max_width:
+                current_line = test_line
+            else:
+                if current_line:
+                    lines.append(current_line)
+                current_line = word
+
+        if current_line:
+            lines.append(current_line)
+
+    return lines
+
+
+def _clear_caches() -> None:
+    _load_font.cache_clear()
+    _text_width.cache_clear()
+
+
+def _measure(func: Callable[[], object], repeat: int, cold: bool = False) -> float:
+    """Медианное время вызова в миллисекундах"""
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            _clear_caches()
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _make_image(size: int) -> bytes:
+    image = Image.new("RGB", (size, size), (90, 140, 200))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--size", type=int, default=1024)
+    args = parser.parse_args()
+
+    service = TextOverlayService()
+    font_name = service.list_fonts()[0]
+    font_path = service._get_font_path(font_name)
+    image_bytes = _make_image(args.size)
+
+    max_width = int(args.size * 0.7)
+    font_size = max(60, int(args.size * 0.07))
+
+    print(
+        f"Шрифт: {font_name}, изображение {args.size}x{args.size}, "
+        f"повторов: {args.repeat}, медиана в мс\n"
+    )
+    print(f"{'операция':<36}{'короткий':>12}{'длинный':>12}")
+
+    cases = [
+        (
+            "перенос до кэширования",
+            lambda text: _legacy_wrap(text, font_path, font_size, max_width),
+            False,
+        ),
+        (
+            "_wrap_text, холодный кэш",
+            lambda text: service._wrap_text(text, font_path, font_size, max_width),
+            True,
+        ),
+        (
+            "_wrap_text, прогретый кэш",
+            lambda text: service._wrap_text(text, font_path, font_size, max_width),
+            False,
+        ),
+        (
+            "_fit_font_size, холодный кэш",
+            lambda text: service._fit_font_size(text, font_path, font_size, max_width),
+            True,
+        ),
+        (
+            "_fit_font_size, прогретый кэш",
+            lambda text: service._fit_font_size(text, font_path, font_size, max_width),
+            False,
+        ),
+        (
+            "apply_text, холодный кэш",
+            lambda text: service.apply_text(image_bytes, text, font_name),
+            True,
+        ),
+        (
+            "apply_text, прогретый кэш",
+            lambda text: service.apply_text(image_bytes, text, font_name),
+            False,
+        ),
+    ]
+
+    for title, run, cold in cases:
+        timings = []
+        for text in (SHORT_TEXT, LONG_TEXT):
+            run(text)
+            timings.append(_measure(lambda: run(text), args.repeat, cold=cold))
+        print(f"{title:<36}{timings[0]:>12.2f}{timings[1]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Обращения к Redis при учёте лимита операций пользователя.
+
+Для каждого сценария апдейта (OperationBudgetMiddleware, check_user_limit,
+резерв перед вызовом модели, track_user_operation) считает round trips
+клиента и команды на сервере, включая команды внутри Lua-скриптов,
+а также медианное время. Для сравнения приведён учёт до перехода
+на Lua-скрипт: get_remaining_requests + track_operation.
+
+Нужен запущенный Redis (REDIS_URL из настроек). Запуск из корня репозитория:
+    python -m benchmarks.user_limit_bench [--repeat 200]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import os
+import random
+import time
+from datetime import datetime
+
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ.setdefault("REDIS_PORT", "6379")
+# Бот не подключается к Telegram, но src.bot создаёт его при импорте
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+
+from aiogram import types  # noqa: E402
+from aiogram.fsm.context import FSMContext  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+
+from benchmarks.redis_counting import (  # noqa: E402
+    RedisCommandCounter,
+    format_commands,
+)
+from src.bot.bot_decorators import check_user_limit, track_user_operation  # noqa: E402
+from src.bot.middlewares import OperationBudgetMiddleware  # noqa: E402
+from src.config import settings  # noqa: E402
+from src.services.operation_cost import (  # noqa: E402
+    charge_operation,
+    open_operation_scope,
+    refund_operation,
+    reserve_operation,
+)
+from src.services.rate_limiter import rate_limiter  # noqa: E402
+
+SCENARIO_STATE = "TextGenerationStates:waiting_for_text"
+
+
+async def _legacy_flow(user_id: int) -> None:
+    """Учёт в том виде, в каком он был до Lua-скрипта (2 + 4 команды)"""
+    client = rate_limiter.redis_client
+    key = f"rate_limit:user:{user_id}:operations"
+    window = settings.USER_OPERATIONS_WINDOW
+
+    # get_remaining_requests в check_user_limit
+    now = time.time()
+    await client.zremrangebyscore(key, 0, now - window)
+    await client.zcard(key)
+
+    # track_operation после успешного обработчика
+    now = time.time()
+    await client.zremrangebyscore(key, 0, now - window)
+    await client.zcard(key)
+    await client.zadd(key, {str(now): now})
+    await client.expire(key, window)
+
+
+def _message(user_id: int) -> types.Message:
+    user = types.User(id=user_id, is_bot=False, first_name="Bench")
+    return types.Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=types.Chat(id=user_id, type="private"),
+        from_user=user,
+    )
+
+
+@check_user_limit()
+async def _menu_handler(message: types.Message) -> None:
+    pass
+
+
+@check_user_limit()
+async def _text_handler(message: types.Message) -> None:
+    # Резерв и стоимость — то, что делает AIManager._generation вокруг модели
+    await reserve_operation(message.from_user.id)
+    charge_operation("text")
+    await track_user_operation(message.from_user.id)
+
+
+@check_user_limit()
+async def _unsent_handler(message: types.Message) -> None:
+    # Генерация завершилась, но ответ не отправлен: списывает middleware
+    await reserve_operation(message.from_user.id)
+    charge_operation("text")
+
+
+@check_user_limit()
+async def _failed_handler(message: types.Message) -> None:
+    reservation_id = await reserve_operation(message.from_user.id)
+    await refund_operation(message.from_user.id, reservation_id)
+
+
+async def _leave_handler(message: types.Message, state: FSMContext) -> None:
+    await state.clear()
+
+
+async def _abandon_reservation(user_id: int) -> None:
+    """Резерв прерванного апдейта: остаётся открытым в Redis"""
+
+    async def interrupted():
+        open_operation_scope()
+        await reserve_operation(user_id)
+
+    await asyncio.create_task(interrupted(), context=contextvars.Context())
+
+
+def _scenarios(user_id: int):
+    middleware = OperationBudgetMiddleware()
+    message = _message(user_id)
+    storage = MemoryStorage()
+    state = FSMContext(
+        storage=storage, key=StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+    )
+
+    def update(handler):
+        async def run():
+            data = {"event_from_user": message.from_user}
+            await middleware(lambda event, data: handler(event), message, data)
+
+        return run
+
+    async def leave():
+        await state.set_state(SCENARIO_STATE)
+        await middleware(
+            lambda event, data: _leave_handler(event, state),
+            message,
+            {
+                "event_from_user": message.from_user,
+                "state": state,
+                "raw_state": SCENARIO_STATE,
+            },
+        )
+
+    return [
+        ("вход в меню", None, update(_menu_handler)),
+        ("генерация, списание в обработчике", None, update(_text_handler)),
+        ("генерация, списание в middleware", None, update(_unsent_handler)),
+        ("ошибка генерации (возврат)", None, update(_failed_handler)),
+        ("выход из сценария, резервов нет", None, leave),
+        (
+            "выход из сценария, 1 брошенный резерв",
+            lambda: _abandon_reservation(user_id),
+            leave,
+        ),
+        ("до Lua: проверка + запись", None, lambda: _legacy_flow(user_id)),
+    ]
+
+
+async def _cleanup(user_id: int) -> None:
+    client = rate_limiter.redis_client
+    await client.delete(
+        f"rate_limit:user:{user_id}:operations",
+        f"rate_limit:gcra:user:{user_id}:operations",
+        f"rate_limit:user:{user_id}:reservations",
+    )
+
+
+async def _run(algorithm: str, repeat: int) -> None:
+    rate_limiter.algorithm = algorithm
+    user_id = random.randint(10**9, 2 * 10**9)
+    print(f"\nАлгоритм: {algorithm}")
+    print(f"{'сценарий':<40}{'RTT':>5}{'команд':>8}{'медиана, мкс':>14}  команды")
+
+    async with RedisCommandCounter(settings.REDIS_URL) as counter:
+        for title, prepare, flow in _scenarios(user_id):
+            # Прогрев: загрузка скриптов (NOSCRIPT) и соединения
+            if prepare:
+                await prepare()
+            await flow()
+
+            if prepare:
+                await prepare()
+            round_trips, commands = await counter.measure(flow)
+
+            timings = []
+            for _ in range(repeat):
+                if prepare:
+                    await prepare()
+                started = time.perf_counter()
+                await flow()
+                timings.append((time.perf_counter() - started) * 1e6)
+            timings.sort()
+            await _cleanup(user_id)
+
+            print(
+                f"{title:<40}{round_trips:>5}{sum(commands.values()):>8}"
+                f"{timings[len(timings) // 2]:>14.0f}  {format_commands(commands)}"
+            )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument(
+        "--algorithm",
+        choices=["sliding_window", "gcra"],
+        nargs="+",
+        default=["sliding_window", "gcra"],
+    )
+    args = parser.parse_args()
+
+    # Лимит не должен кончиться за время замера
+    settings.USER_OPERATIONS_LIMIT = 10**6
+    await rate_limiter.initialize()
+    try:
+        for algorithm in args.algorithm:
+            await _run(algorithm, args.repeat)
+    finally:
+        await rate_limiter.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -11,11 +11,14 @@ from aiogram.types import BotCommand
 from src.bot.handlers import get_handlers_router
 from src.bot.middlewares import (
     DBSessionMiddleware,
+    OperationBudgetMiddleware,
+    OverlayPrefetchCleanupMiddleware,
     RemoveLastKeyboardMiddleware,
     UserAccessMiddleware,
     GroupChatAccessMiddleware,
 )
 from src.config import settings
+from src.services.ai_manager import ai_manager
 from src.services.rate_limiter import rate_limiter
 
 logger = logging.getLogger(__name__)
@@ -43,6 +46,14 @@ dp.callback_query.middleware(remove_keyboard_middleware)
 dp.message.middleware(GroupChatAccessMiddleware(storage=storage))
 dp.callback_query.middleware(GroupChatAccessMiddleware(storage=storage))
 
+operation_budget_middleware = OperationBudgetMiddleware()
+dp.message.middleware(operation_budget_middleware)
+dp.callback_query.middleware(operation_budget_middleware)
+
+overlay_prefetch_cleanup_middleware = OverlayPrefetchCleanupMiddleware()
+dp.message.middleware(overlay_prefetch_cleanup_middleware)
+dp.callback_query.middleware(overlay_prefetch_cleanup_middleware)
+
 
 dp.include_router(get_handlers_router())
 
@@ -55,6 +66,9 @@ async def on_startup():
         logger.error(f"Ошибка подключения к Redis: {e}")
         raise
 
+    await ai_manager.startup()
+    logger.info("HTTP клиенты AI-сервисов готовы")
+
 
 async def on_shutdown():
     try:
@@ -63,6 +77,12 @@ async def on_shutdown():
     except Exception as e:
         logger.error(f"Ошибка отключения Redis: {e}")
 
+    try:
+        await ai_manager.shutdown()
+        logger.info("HTTP клиенты AI-сервисов закрыты")
+    except Exception as e:
+        logger.error(f"Ошибка закрытия HTTP клиентов: {e}")
+
 
 async def setup_bot():
     await bot.set_my_commands(
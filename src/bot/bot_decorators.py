@@ -1,8 +1,13 @@
 import logging
 from functools import wraps
+from typing import Optional
 from aiogram import types
 from aiogram.fsm.context import FSMContext
-from src.services.rate_limiter import rate_limiter
+from src.services.operation_cost import (
+    check_operation_budget,
+    settle_operation,
+    take_spent_cost,
+)
 from src.config import settings
 from src.bot.keyboards import back_to_menu_keyboard
 
@@ -13,6 +18,9 @@ def check_user_limit():
     """
     Декоратор для проверки лимита операций пользователя
 
+    Только проверяет остаток: единица лимита резервируется перед самим
+    вызовом модели, поэтому вход в сценарий без генерации лимит не тратит.
+
     Usage:
         @check_user_limit()
         async def my_handler(message: Message, state: FSMContext):
@@ -55,19 +63,10 @@ def check_user_limit():
                 logger.error("Декоратор check_user_limit: не найден message/callback")
                 return await func(*args, **kwargs)
 
-            user_key = f"user:{user_id}:operations"
-
-            # Получаем текущее количество запросов
-            remaining = await rate_limiter.get_remaining_requests(
-                key=user_key,
-                max_requests=settings.USER_OPERATIONS_LIMIT,
-                window_seconds=settings.USER_OPERATIONS_WINDOW,
-            )
+            limit = await check_operation_budget(user_id)
 
-            if remaining <= 0:
-                remaining_time = await get_remaining_time(
-                    user_key, settings.USER_OPERATIONS_WINDOW
-                )
+            if not limit.allowed:
+                remaining_time = int(limit.reset_after / 60)
 
                 minutes_text = "минут" if remaining_time != 1 else "минуту"
                 time_info = (
@@ -78,7 +77,8 @@ def check_user_limit():
 
                 await message.edit_text(
                     f"⏱ Превышен лимит операций.\n\n"
-                    f"Доступно: {settings.USER_OPERATIONS_LIMIT} операций в интервале.\n"
+                    f"Доступно: {settings.USER_OPERATIONS_LIMIT} единиц лимита "
+                    f"в интервале (текст — 1, изображение — до 4).\n"
                     f"Попробуйте {time_info}.",
                     reply_markup=back_to_menu_keyboard(),
                 )
@@ -98,17 +98,8 @@ def check_user_limit():
                 operation_success = state_data.get("_operation_success", False)
 
                 if operation_success:
-                    try:
-                        await rate_limiter.track_operation(
-                            key=user_key,
-                            max_requests=settings.USER_OPERATIONS_LIMIT,
-                            window_seconds=settings.USER_OPERATIONS_WINDOW,
-                        )
-                        await state.update_data(_operation_success=False)
-                    except Exception as e:
-                        logger.warning(
-                            f"Не удалось записать операцию для user {user_id}: {e}"
-                        )
+                    await track_user_operation(user_id)
+                    await state.update_data(_operation_success=False)
 
             return result
 
@@ -117,50 +108,41 @@ def check_user_limit():
     return decorator
 
 
-async def track_user_operation(user_id: int) -> None:
+async def track_user_operation(
+    user_id: int, cost: Optional[int] = None
+) -> Optional[int]:
     """
-    Записать успешную операцию пользователя
+    Списать стоимость успешной операции с лимита пользователя
+
+    По умолчанию списывается сумма стоимостей вызовов ai_manager,
+    выполненных при обработке текущего апдейта (не меньше 1). Единицы,
+    зарезервированные перед вызовами модели, входят в эту сумму; операция
+    записывается даже сверх лимита.
 
     Usage:
         try:
             result = await ai_manager.generate_text(...)
             await message.answer(result)
-            await track_user_operation(user_id)
+            remaining = await track_user_operation(user_id)
         except Exception:
             await message.answer("Ошибка")
-    """
-    try:
-        await rate_limiter.track_operation(
-            key=f"user:{user_id}:operations",
-            max_requests=settings.USER_OPERATIONS_LIMIT,
-            window_seconds=settings.USER_OPERATIONS_WINDOW,
-        )
-    except Exception as e:
-        logger.warning(f"Не удалось записать операцию для user {user_id}: {e}")
 
-
-async def get_remaining_time(key: str, window_seconds: int) -> int:
-    """
-    Получить оставшееся время до сброса лимита (в минутах)
+    Returns:
+        Остаток лимита или None, если записать операцию не удалось
     """
-    import time
-
-    if not rate_limiter.redis_client:
-        await rate_limiter.initialize()
-
-    rate_key = f"rate_limit:{key}"
+    if cost is None:
+        cost = max(take_spent_cost(), 1)
 
     try:
-        oldest = await rate_limiter.redis_client.zrange(rate_key, 0, 0, withscores=True)
-
-        if not oldest:
-            return 0
+        result = await settle_operation(user_id, cost)
+    except Exception as e:
+        logger.warning(f"Не удалось записать операцию для user {user_id}: {e}")
+        return None
+    return result.remaining
 
-        oldest_timestamp = oldest[0][1]
-        time_passed = time.time() - oldest_timestamp
-        remaining = max(0, window_seconds - time_passed)
 
-        return int(remaining / 60)
-    except Exception as e:
-        logger.error(f"Ошибка получения remaining_time: {e}")
-        return 0
+def format_budget(remaining: Optional[int]) -> str:
+    """Строка об остатке лимита для сообщения после операции"""
+    if remaining is None:
+        return ""
+    return f"\n\n<i>Остаток лимита: {remaining} из {settings.USER_OPERATIONS_LIMIT}</i>"
@@ -5,7 +5,8 @@ from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.bot.bot_decorators import track_user_operation
+from src.bot.bot_decorators import format_budget, track_user_operation
+from src.bot.handlers.utils.queue_status import show_queue_position
 from src.bot.keyboards import back_to_menu_keyboard, main_menu_keyboard
 from src.bot.states import ContentPlanStates
 from src.services.ai_manager import ai_manager
@@ -138,6 +139,7 @@ async def preferences_input_handler(
     user_id = message.from_user.id
 
     loading_msg = await message.answer("⏳ Создаю контент-план...\n")
+    show_queue_position(loading_msg)
 
     try:
         plan = await ai_manager.generate_content_plan(
@@ -164,9 +166,10 @@ async def preferences_input_handler(
 
         await state.clear()
 
-        await track_user_operation(user_id)
+        remaining = await track_user_operation(user_id)
         return await message.answer(
-            "✅ Контент-план создан!\n\nВы можете сохранить его или создать новый.",
+            "✅ Контент-план создан!\n\nВы можете сохранить его или создать новый."
+            + format_budget(remaining),
             reply_markup=main_menu_keyboard(),
         )
 
@@ -4,7 +4,13 @@ from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.types import BufferedInputFile
 
-from src.bot.bot_decorators import track_user_operation, check_user_limit
+from src.bot.bot_decorators import (
+    track_user_operation,
+    check_user_limit,
+    format_budget,
+)
+from src.bot.handlers.utils.queue_status import show_queue_position
+from src.bot.handlers.utils.telegram_files import download_file_bytes
 from src.bot.keyboards import (
     back_to_menu_keyboard,
     image_style_keyboard,
@@ -21,7 +27,12 @@ from src.bot.keyboards import (
 from src.bot.states import ImageGenerationStates
 from src.services.text_overlay import TextOverlayConfig
 from src.services.ai_manager import ai_manager
-from src.bot.handlers.utils.image_overlay import build_image_with_overlay
+from src.services.image_output import photo_filename
+from src.bot.handlers.utils.image_overlay import (
+    build_image_with_overlay,
+    cancel_overlay_prefetch,
+    prefetch_overlay_assets,
+)
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -102,6 +113,7 @@ async def _start_manual_image_generation(
         f"<b>Стиль:</b> {style_name or style}\n"
         f"<b>Цвета:</b> {colors_name or colors}"
     )
+    show_queue_position(loading_msg)
 
     await state.set_state(ImageGenerationStates.waiting_results)
 
@@ -142,6 +154,7 @@ async def _start_manual_image_generation(
             overlay_text=overlay_text,
             overlay_font=overlay_font,
             overlay_config=overlay_config,
+            user_id=callback.from_user.id,
         )
 
         try:
@@ -159,7 +172,9 @@ async def _start_manual_image_generation(
 
         caption = "✅ <b>Готово! Вот ваше изображение.</b>"
         photo_message = await callback.message.answer_photo(
-            photo=BufferedInputFile(image_bytes, filename="generated_image.jpg"),
+            photo=BufferedInputFile(
+                image_bytes, filename=photo_filename("generated_image")
+            ),
             caption=caption,
         )
         result_file_id = (
@@ -170,10 +185,11 @@ async def _start_manual_image_generation(
             last_result_caption=caption,
         )
 
-        await track_user_operation(user_id=callback.from_user.id)
+        remaining = await track_user_operation(user_id=callback.from_user.id)
 
         return await callback.message.answer(
-            "Выберите действие:", reply_markup=image_generation_results_keyboard()
+            "Выберите действие:" + format_budget(remaining),
+            reply_markup=image_generation_results_keyboard(),
         )
 
     except Exception:
@@ -327,13 +343,12 @@ async def edit_prompt_handler(message: types.Message, state: FSMContext):
         "⏳ Редактирую изображение...\n\n"
         "<i>Этап 1/2: Анализирую исходное изображение...</i>"
     )
+    show_queue_position(loading_msg)
 
     await state.set_state(ImageGenerationStates.waiting_results)
 
     try:
-        file = await message.bot.get_file(source_file_id)
-        image_io = await message.bot.download_file(file.file_path)
-        source_image_data = image_io.read()
+        source_image_data = await download_file_bytes(message.bot, source_file_id)
 
         try:
             await loading_msg.edit_text(
@@ -348,6 +363,7 @@ async def edit_prompt_handler(message: types.Message, state: FSMContext):
             edit_request=edit_prompt,
             width=1024,
             height=1024,
+            user_id=message.from_user.id,
         )
 
         try:
@@ -364,7 +380,9 @@ async def edit_prompt_handler(message: types.Message, state: FSMContext):
             f"<i>Изменения:</i> {edit_prompt}"
         )
         photo_message = await message.answer_photo(
-            photo=BufferedInputFile(image_bytes, filename="edited_image.jpg"),
+            photo=BufferedInputFile(
+                image_bytes, filename=photo_filename("edited_image")
+            ),
             caption=caption,
         )
         result_file_id = (
@@ -375,10 +393,11 @@ async def edit_prompt_handler(message: types.Message, state: FSMContext):
             last_result_caption=caption,
         )
 
-        await track_user_operation(user_id=message.from_user.id)
+        remaining = await track_user_operation(user_id=message.from_user.id)
 
         return await message.answer(
-            "Выберите действие:", reply_markup=image_generation_results_keyboard()
+            "Выберите действие:" + format_budget(remaining),
+            reply_markup=image_generation_results_keyboard(),
         )
 
     except Exception:
@@ -477,13 +496,12 @@ async def example_prompt_handler(message: types.Message, state: FSMContext):
         "⏳ Создаю изображение по примеру...\n\n"
         "<i>Этап 1/2: Анализирую стиль примера...</i>"
     )
+    show_queue_position(loading_msg)
 
     await state.set_state(ImageGenerationStates.waiting_results)
 
     try:
-        file = await message.bot.get_file(example_file_id)
-        image_io = await message.bot.download_file(file.file_path)
-        example_image_data = image_io.read()
+        example_image_data = await download_file_bytes(message.bot, example_file_id)
 
         try:
             await loading_msg.edit_text(
@@ -498,6 +516,7 @@ async def example_prompt_handler(message: types.Message, state: FSMContext):
             creation_request=example_prompt,
             width=1024,
             height=1024,
+            user_id=message.from_user.id,
         )
 
         try:
@@ -514,7 +533,9 @@ async def example_prompt_handler(message: types.Message, state: FSMContext):
             f"<i>Описание:</i> {example_prompt}"
         )
         photo_message = await message.answer_photo(
-            photo=BufferedInputFile(image_bytes, filename="example_based_image.jpg"),
+            photo=BufferedInputFile(
+                image_bytes, filename=photo_filename("example_based_image")
+            ),
             caption=caption,
         )
         result_file_id = (
@@ -525,10 +546,11 @@ async def example_prompt_handler(message: types.Message, state: FSMContext):
             last_result_caption=caption,
         )
 
-        await track_user_operation(user_id=message.from_user.id)
+        remaining = await track_user_operation(user_id=message.from_user.id)
 
         return await message.answer(
-            "Выберите действие:", reply_markup=image_generation_results_keyboard()
+            "Выберите действие:" + format_budget(remaining),
+            reply_markup=image_generation_results_keyboard(),
         )
 
     except Exception:
@@ -746,6 +768,7 @@ async def image_result_regenerate_handler(
 
     await callback.answer()
     loading_msg = await callback.message.answer("⏳ Создаю новый вариант...")
+    show_queue_position(loading_msg)
 
     try:
         if mode == "edit":
@@ -759,15 +782,14 @@ async def image_result_regenerate_handler(
                     reply_markup=image_generation_results_keyboard(),
                 )
 
-            file = await callback.bot.get_file(source_file_id)
-            image_io = await callback.bot.download_file(file.file_path)
-            source_image_data = image_io.read()
+            source_image_data = await download_file_bytes(callback.bot, source_file_id)
 
             image_bytes = await ai_manager.edit_image(
                 source_image_data=source_image_data,
                 edit_request=edit_request,
                 width=1024,
                 height=1024,
+                user_id=callback.from_user.id,
             )
 
         elif mode == "example":
@@ -781,15 +803,16 @@ async def image_result_regenerate_handler(
                     reply_markup=image_generation_results_keyboard(),
                 )
 
-            file = await callback.bot.get_file(example_file_id)
-            image_io = await callback.bot.download_file(file.file_path)
-            example_image_data = image_io.read()
+            example_image_data = await download_file_bytes(
+                callback.bot, example_file_id
+            )
 
             image_bytes = await ai_manager.create_image_from_example(
                 example_image_data=example_image_data,
                 creation_request=creation_request,
                 width=1024,
                 height=1024,
+                user_id=callback.from_user.id,
             )
 
         else:
@@ -815,13 +838,16 @@ async def image_result_regenerate_handler(
                 overlay_text=overlay_text,
                 overlay_font=overlay_font,
                 overlay_config=overlay_config,
+                user_id=callback.from_user.id,
             )
 
         await loading_msg.delete()
 
         caption = "✅ <b>Новый вариант готов!</b>"
         photo_message = await callback.message.answer_photo(
-            photo=BufferedInputFile(image_bytes, filename="regenerated_image.jpg"),
+            photo=BufferedInputFile(
+                image_bytes, filename=photo_filename("regenerated_image")
+            ),
             caption=caption,
         )
         result_file_id = (
@@ -832,10 +858,11 @@ async def image_result_regenerate_handler(
             last_result_caption=caption,
         )
 
-        await track_user_operation(user_id=callback.from_user.id)
+        remaining = await track_user_operation(user_id=callback.from_user.id)
 
         return await callback.message.answer(
-            "Выберите действие:", reply_markup=image_generation_results_keyboard()
+            "Выберите действие:" + format_budget(remaining),
+            reply_markup=image_generation_results_keyboard(),
         )
 
     except Exception:
@@ -883,6 +910,10 @@ async def image_overlay_file_handler(message: types.Message, state: FSMContext):
         )
 
     await state.update_data(pending_overlay_file_id=file_id)
+    data = await state.get_data()
+    base_file_id = data.get("last_result_file_id")
+    if base_file_id:
+        prefetch_overlay_assets(message.bot, state.key, base_file_id, file_id)
     await state.set_state(ImageGenerationStates.adding_overlay_type)
     return await message.answer(
         "Выберите, как использовать изображение:",
@@ -911,6 +942,7 @@ async def image_overlay_type_handler(callback: types.CallbackQuery, state: FSMCo
             pending_overlay_file_id=None,
             pending_overlay_type=None,
         )
+        cancel_overlay_prefetch(state.key)
         await callback.answer("Добавление отменено")
         return await callback.message.answer(
             "Выберите действие:", reply_markup=image_generation_results_keyboard()
@@ -952,6 +984,7 @@ async def image_asset_position_handler(
             pending_overlay_file_id=None,
             pending_overlay_type=None,
         )
+        cancel_overlay_prefetch(state.key)
         await callback.answer("Добавление отменено")
         return await callback.message.answer(
             "Выберите действие:", reply_markup=image_generation_results_keyboard()
@@ -984,6 +1017,7 @@ async def image_asset_position_handler(
             overlay_file_id=overlay_file_id,
             overlay_type=overlay_type,
             position=value,
+            state_key=state.key,
         )
         try:
             await processing_msg.delete()
@@ -992,7 +1026,9 @@ async def image_asset_position_handler(
 
         caption = data.get("last_result_caption") or "✅ Обновлённое изображение"
         photo_message = await callback.message.answer_photo(
-            photo=BufferedInputFile(merged_bytes, filename="image_with_overlay.png"),
+            photo=BufferedInputFile(
+                merged_bytes, filename=photo_filename("image_with_overlay")
+            ),
             caption=caption,
         )
         result_file_id = (
@@ -1007,10 +1043,11 @@ async def image_asset_position_handler(
         )
         await state.set_state(ImageGenerationStates.waiting_results)
 
-        await track_user_operation(user_id=callback.from_user.id)
+        remaining = await track_user_operation(user_id=callback.from_user.id)
 
         return await callback.message.answer(
-            "Выберите действие:", reply_markup=image_generation_results_keyboard()
+            "Выберите действие:" + format_budget(remaining),
+            reply_markup=image_generation_results_keyboard(),
         )
 
     except Exception:
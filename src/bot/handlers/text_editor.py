@@ -2,6 +2,7 @@ from aiogram import types, Router, F
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.bot.handlers.utils.queue_status import show_queue_position
 from src.bot.keyboards import (
     back_to_menu_keyboard,
     text_redactor_results_keyboard,
@@ -9,6 +10,7 @@ from src.bot.keyboards import (
 from src.bot.states import TextEditorStates
 from src.services.ai_manager import ai_manager
 from src.bot.bot_decorators import check_user_limit, track_user_operation
+from src.bot.handlers.utils.streaming import stream_to_message
 from src.bot.handlers.utils.text_formatter import markdown_to_html
 
 router = Router()
@@ -46,13 +48,22 @@ async def edit_request_handler(
     state_data = await state.get_data()
 
     loading_msg = await message.answer("⏳ Редактирую текст...")
+    show_queue_position(loading_msg)
 
     try:
-        edited_text, errors, recommendations = await ai_manager.edit_post(
-            user_id=user_id,
-            session=session,
-            original_post=state_data["original_text"],
-            edit_request=edit_text,
+        raw_response = await stream_to_message(
+            loading_msg,
+            ai_manager.stream_edit_post(
+                user_id=user_id,
+                session=session,
+                original_post=state_data["original_text"],
+                edit_request=edit_text,
+            ),
+            header="⏳ Редактирую текст...\n\n",
+            render=lambda raw: ai_manager.parse_edit_response(raw)[0],
+        )
+        edited_text, errors, recommendations = ai_manager.parse_edit_response(
+            raw_response
         )
     except Exception:
         await loading_msg.delete()
@@ -129,6 +140,7 @@ async def editing_handler(
     user_id = message.from_user.id
 
     loading_msg = await message.answer("⏳ Редактирую текст...")
+    show_queue_position(loading_msg)
 
     try:
         # Используем edit_post для редактирования на основе исходного поста
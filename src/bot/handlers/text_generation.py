@@ -5,7 +5,12 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import BufferedInputFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.bot.bot_decorators import check_user_limit, track_user_operation
+from src.bot.bot_decorators import (
+    check_user_limit,
+    format_budget,
+    track_user_operation,
+)
+from src.bot.handlers.utils.queue_status import show_queue_position
 from src.bot.keyboards import (
     back_to_menu_keyboard,
     text_generation_results_keyboard,
@@ -14,7 +19,13 @@ from src.bot.keyboards import (
 )
 from src.bot.states import TextGenerationStates
 from src.services.ai_manager import ai_manager
-from src.bot.handlers.utils.image_overlay import build_image_with_overlay
+from src.services.image_output import photo_filename
+from src.bot.handlers.utils.image_overlay import (
+    build_image_with_overlay,
+    cancel_overlay_prefetch,
+    prefetch_overlay_assets,
+)
+from src.bot.handlers.utils.streaming import stream_to_message
 from src.bot.handlers.utils.text_formatter import markdown_to_html
 from src.services.service_decorators import TextLengthLimitError
 
@@ -65,24 +76,35 @@ async def generate_post_with_image(
     user_text: str,
 ):
     loading_msg = await message.answer("⏳ Создаю пост...")
+    show_queue_position(loading_msg)
 
     try:
-        post = await ai_manager.generate_free_text_post(
-            user_id=user_id,
-            session=session,
-            user_idea=user_text,
-            style="разговорный",
+        post = await stream_to_message(
+            loading_msg,
+            ai_manager.stream_free_text_post(
+                user_id=user_id,
+                session=session,
+                user_idea=user_text,
+                style="разговорный",
+            ),
+            header="⏳ Создаю пост...\n\n",
         )
+        post = post.strip()
 
         await loading_msg.edit_text("⏳ Создаю изображение для поста...")
+        show_queue_position(loading_msg, "⏳ Создаю изображение для поста...")
 
-        image_bytes = await ai_manager.generate_image_from_post(post_text=post)
+        image_bytes = await ai_manager.generate_image_from_post(
+            post_text=post, user_id=user_id
+        )
 
         await loading_msg.delete()
 
         await message.answer("✨ <b>Готово! Ваш пост:</b>")
 
-        image_file = BufferedInputFile(image_bytes, filename="post_image.jpg")
+        image_file = BufferedInputFile(
+            image_bytes, filename=photo_filename("post_image")
+        )
         photo_message = await message.answer_photo(
             photo=image_file, caption=markdown_to_html(post)
         )
@@ -94,10 +116,11 @@ async def generate_post_with_image(
             image_file_id=image_file_id,
         )
 
-        await track_user_operation(user_id)
+        remaining = await track_user_operation(user_id)
 
         return await message.answer(
-            "Выберите действие", reply_markup=text_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=text_generation_results_keyboard(),
         )
 
     except TextLengthLimitError:
@@ -154,7 +177,9 @@ async def free_text_voice_handler(
         audio_data = audio_file.read()
 
         user_text = await ai_manager.transcribe_voice(
-            audio_data=audio_data, audio_format="opus"
+            audio_data=audio_data,
+            audio_format="opus",
+            user_id=message.from_user.id,
         )
 
         await transcribe_msg.delete()
@@ -209,13 +234,18 @@ async def text_result_change_image_handler(
 
     await callback.answer()
     loading_msg = await callback.message.answer("⏳ Создаю новое изображение...")
+    show_queue_position(loading_msg)
 
     try:
-        image_bytes = await ai_manager.generate_image_from_post(post_text=post)
+        image_bytes = await ai_manager.generate_image_from_post(
+            post_text=post, user_id=callback.from_user.id
+        )
 
         await loading_msg.delete()
 
-        image_file = BufferedInputFile(image_bytes, filename="post_image.jpg")
+        image_file = BufferedInputFile(
+            image_bytes, filename=photo_filename("post_image")
+        )
         photo_message = await callback.message.answer_photo(
             photo=image_file, caption="🖼 Новое изображение для вашего поста"
         )
@@ -223,10 +253,11 @@ async def text_result_change_image_handler(
         image_file_id = photo_message.photo[-1].file_id if photo_message.photo else None
         await state.update_data(image_file_id=image_file_id, has_image=True)
 
-        await track_user_operation(user_id=callback.from_user.id)
+        remaining = await track_user_operation(user_id=callback.from_user.id)
 
         return await callback.message.answer(
-            "Выберите действие", reply_markup=text_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=text_generation_results_keyboard(),
         )
 
     except Exception:
@@ -275,6 +306,10 @@ async def adding_overlay_file_handler(message: types.Message, state: FSMContext)
         )
 
     await state.update_data(pending_overlay_file_id=file_id)
+    data = await state.get_data()
+    base_file_id = data.get("image_file_id")
+    if base_file_id:
+        prefetch_overlay_assets(message.bot, state.key, base_file_id, file_id)
     await state.set_state(TextGenerationStates.adding_overlay_type)
     return await message.answer(
         "Выберите, как использовать изображение:",
@@ -305,6 +340,7 @@ async def overlay_type_selected_handler(
             pending_overlay_file_id=None,
             pending_overlay_type=None,
         )
+        cancel_overlay_prefetch(state.key)
         await callback.answer("Добавление отменено")
         return await callback.message.answer(
             "Выберите действие", reply_markup=text_generation_results_keyboard()
@@ -346,6 +382,7 @@ async def overlay_position_selected_handler(
             pending_overlay_file_id=None,
             pending_overlay_type=None,
         )
+        cancel_overlay_prefetch(state.key)
         await callback.answer("Добавление отменено")
         return await callback.message.answer(
             "Выберите действие", reply_markup=text_generation_results_keyboard()
@@ -378,6 +415,7 @@ async def overlay_position_selected_handler(
             overlay_file_id=overlay_file_id,
             overlay_type=overlay_type,
             position=value,
+            state_key=state.key,
         )
         try:
             await processing_msg.delete()
@@ -388,7 +426,7 @@ async def overlay_position_selected_handler(
         photo_message = await callback.message.answer_photo(
             photo=BufferedInputFile(
                 merged_bytes,
-                filename="post_image_with_overlay.png",
+                filename=photo_filename("post_image_with_overlay"),
             ),
             caption=markdown_to_html(post_text),
         )
@@ -405,10 +443,11 @@ async def overlay_position_selected_handler(
         )
         await state.set_state(TextGenerationStates.waiting_results)
 
-        await track_user_operation(user_id=callback.from_user.id)
+        remaining = await track_user_operation(user_id=callback.from_user.id)
 
         return await callback.message.answer(
-            "Выберите действие", reply_markup=text_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=text_generation_results_keyboard(),
         )
 
     except Exception:
@@ -465,14 +504,22 @@ async def editing_handler(
     user_id = message.from_user.id
 
     loading_msg = await message.answer("⏳ Обновляю пост...")
+    show_queue_position(loading_msg)
 
     try:
-        updated_post = await ai_manager.generate_free_text_post(
-            user_id=user_id,
-            session=session,
-            user_idea=f"Исходный пост:\n{original_post}\n\nИзменения: {edit_request}",
-            style="разговорный",
+        # В модель уходит только правка: сам пост и прошлые правки — в истории
+        updated_post = await stream_to_message(
+            loading_msg,
+            ai_manager.stream_revise_post(
+                user_id=user_id,
+                session=session,
+                flow="free_text",
+                original_post=original_post,
+                edit_request=edit_request,
+            ),
+            header="⏳ Обновляю пост...\n\n",
         )
+        updated_post = updated_post.strip()
 
         await loading_msg.edit_text("✨ Сохраняю изменения...")
         await loading_msg.delete()
@@ -498,9 +545,10 @@ async def editing_handler(
         else:
             await message.answer(markdown_to_html(updated_post))
 
-        await track_user_operation(user_id=user_id)
+        remaining = await track_user_operation(user_id=user_id)
         return await message.answer(
-            "Выберите действие", reply_markup=text_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=text_generation_results_keyboard(),
         )
 
     except TextLengthLimitError:
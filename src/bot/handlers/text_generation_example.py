@@ -2,7 +2,12 @@ from aiogram import types, Router, F
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.bot.bot_decorators import check_user_limit, track_user_operation
+from src.bot.bot_decorators import (
+    check_user_limit,
+    format_budget,
+    track_user_operation,
+)
+from src.bot.handlers.utils.queue_status import show_queue_position
 from src.bot.keyboards import (
     back_to_menu_keyboard,
     from_example_generation_results_keyboard,
@@ -128,7 +133,9 @@ async def example_topic_voice_handler(
         audio_data = audio_file.read()
 
         new_topic = await ai_manager.transcribe_voice(
-            audio_data=audio_data, audio_format="opus"
+            audio_data=audio_data,
+            audio_format="opus",
+            user_id=message.from_user.id,
         )
 
         await transcribe_msg.delete()
@@ -199,6 +206,7 @@ async def generate_post_from_example(
 ):
     """Генерация поста по примеру (только текст)"""
     loading_msg = await message.answer("⏳ Анализирую пример и создаю новый пост...")
+    show_queue_position(loading_msg)
 
     try:
         post = await ai_manager.generate_post_from_example(
@@ -215,10 +223,11 @@ async def generate_post_from_example(
         await message.answer("✨ <b>Готово! Ваш пост в стиле примера:</b>")
         await message.answer(markdown_to_html(post))
 
-        await track_user_operation(user_id)
+        remaining = await track_user_operation(user_id)
 
         return await message.answer(
-            "Выберите действие", reply_markup=from_example_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=from_example_generation_results_keyboard(),
         )
 
     except TextLengthLimitError:
@@ -274,6 +283,7 @@ async def editing_handler(
     user_id = message.from_user.id
 
     loading_msg = await message.answer("⏳ Обновляю пост...")
+    show_queue_position(loading_msg)
 
     try:
         edited_text, errors, recommendations = await ai_manager.edit_post(
@@ -289,10 +299,11 @@ async def editing_handler(
         await message.answer("✨ <b>Пост обновлён:</b>")
         await message.answer(markdown_to_html(edited_text))
 
-        await track_user_operation(user_id)
+        remaining = await track_user_operation(user_id)
 
         return await message.answer(
-            "Выберите действие", reply_markup=from_example_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=from_example_generation_results_keyboard(),
         )
 
     except Exception:
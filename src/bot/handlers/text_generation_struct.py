@@ -3,7 +3,12 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import BufferedInputFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.bot.bot_decorators import check_user_limit, track_user_operation
+from src.bot.bot_decorators import (
+    check_user_limit,
+    format_budget,
+    track_user_operation,
+)
+from src.bot.handlers.utils.queue_status import show_queue_position
 from src.bot.keyboards import (
     back_to_menu_keyboard,
     text_generation_results_keyboard,
@@ -24,7 +29,12 @@ from src.bot.keyboards import (
 from src.bot.states import TextGenerationStructStates
 from src.services.text_overlay import TextOverlayConfig
 from src.services.ai_manager import ai_manager
-from src.bot.handlers.utils.image_overlay import build_image_with_overlay
+from src.services.image_output import photo_filename
+from src.bot.handlers.utils.image_overlay import (
+    build_image_with_overlay,
+    cancel_overlay_prefetch,
+    prefetch_overlay_assets,
+)
 from src.bot.handlers.utils.text_formatter import markdown_to_html
 from src.services.service_decorators import TextLengthLimitError
 
@@ -94,7 +104,7 @@ async def _start_struct_post_generation(
     )
 
 
-async def _generate_struct_image(post_text: str, data: dict) -> bytes:
+async def _generate_struct_image(post_text: str, data: dict, user_id: int) -> bytes:
     overlay_mode = data.get("overlay_mode", "none")
     overlay_text = data.get("overlay_text")
     overlay_font = data.get("overlay_font")
@@ -108,6 +118,7 @@ async def _generate_struct_image(post_text: str, data: dict) -> bytes:
         prepared_info_text=overlay_text if overlay_mode == "custom" else None,
         overlay_font=overlay_font,
         overlay_config=overlay_config,
+        user_id=user_id,
     )
 
 
@@ -178,7 +189,9 @@ async def question_1_voice_handler(message: types.Message, state: FSMContext):
         audio_data = audio_file.read()
 
         event_text = await ai_manager.transcribe_voice(
-            audio_data=audio_data, audio_format="opus"
+            audio_data=audio_data,
+            audio_format="opus",
+            user_id=message.from_user.id,
         )
 
         await transcribe_msg.delete()
@@ -253,7 +266,9 @@ async def question_2_voice_handler(message: types.Message, state: FSMContext):
         audio_data = audio_file.read()
 
         description_text = await ai_manager.transcribe_voice(
-            audio_data=audio_data, audio_format="opus"
+            audio_data=audio_data,
+            audio_format="opus",
+            user_id=message.from_user.id,
         )
 
         await transcribe_msg.delete()
@@ -527,6 +542,7 @@ async def generate_struct_post_with_image(
         loading_msg = await callback_or_message.message.answer("⏳ Создаю пост...")
     else:
         loading_msg = await callback_or_message.answer("⏳ Создаю пост...")
+    show_queue_position(loading_msg)
 
     try:
         post = await ai_manager.generate_structured_form_post(
@@ -545,8 +561,9 @@ async def generate_struct_post_with_image(
         )
 
         await loading_msg.edit_text("⏳ Создаю изображение для поста...")
+        show_queue_position(loading_msg, "⏳ Создаю изображение для поста...")
 
-        image_bytes = await _generate_struct_image(post, data)
+        image_bytes = await _generate_struct_image(post, data, user_id)
 
         await loading_msg.delete()
         await state.update_data(
@@ -563,7 +580,9 @@ async def generate_struct_post_with_image(
         if is_callback:
             await callback_or_message.message.answer("✨ <b>Готово! Ваш пост:</b>")
 
-            image_file = BufferedInputFile(image_bytes, filename="post_image.jpg")
+            image_file = BufferedInputFile(
+                image_bytes, filename=photo_filename("post_image")
+            )
             photo_message = await callback_or_message.message.answer_photo(
                 photo=image_file, caption=markdown_to_html(post)
             )
@@ -572,15 +591,18 @@ async def generate_struct_post_with_image(
             )
             await state.update_data(image_file_id=image_file_id, has_image=True)
 
-            await track_user_operation(user_id)
+            remaining = await track_user_operation(user_id)
 
             return await callback_or_message.message.answer(
-                "Выберите действие", reply_markup=text_generation_results_keyboard()
+                "Выберите действие" + format_budget(remaining),
+                reply_markup=text_generation_results_keyboard(),
             )
         else:
             await callback_or_message.answer("✨ <b>Готово! Ваш пост:</b>")
 
-            image_file = BufferedInputFile(image_bytes, filename="post_image.jpg")
+            image_file = BufferedInputFile(
+                image_bytes, filename=photo_filename("post_image")
+            )
             photo_message = await callback_or_message.answer_photo(
                 photo=image_file, caption=markdown_to_html(post)
             )
@@ -589,10 +611,11 @@ async def generate_struct_post_with_image(
             )
             await state.update_data(image_file_id=image_file_id, has_image=True)
 
-            await track_user_operation(user_id)
+            remaining = await track_user_operation(user_id)
 
             return await callback_or_message.answer(
-                "Выберите действие", reply_markup=text_generation_results_keyboard()
+                "Выберите действие" + format_budget(remaining),
+                reply_markup=text_generation_results_keyboard(),
             )
 
     except TextLengthLimitError:
@@ -808,24 +831,28 @@ async def text_result_change_image_handler(
 
     await callback.answer()
     loading_msg = await callback.message.answer("⏳ Создаю новое изображение...")
+    show_queue_position(loading_msg)
 
     try:
-        image_bytes = await _generate_struct_image(post, data)
+        image_bytes = await _generate_struct_image(post, data, callback.from_user.id)
 
         await loading_msg.delete()
 
         # Отправляем новое изображение
-        image_file = BufferedInputFile(image_bytes, filename="post_image.jpg")
+        image_file = BufferedInputFile(
+            image_bytes, filename=photo_filename("post_image")
+        )
         photo_message = await callback.message.answer_photo(
             photo=image_file, caption=markdown_to_html(post)
         )
         image_file_id = photo_message.photo[-1].file_id if photo_message.photo else None
         await state.update_data(image_file_id=image_file_id, has_image=True)
 
-        await track_user_operation(callback.from_user.id)
+        remaining = await track_user_operation(callback.from_user.id)
 
         return await callback.message.answer(
-            "Выберите действие", reply_markup=text_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=text_generation_results_keyboard(),
         )
 
     except Exception:
@@ -871,6 +898,10 @@ async def struct_overlay_file_handler(message: types.Message, state: FSMContext)
         )
 
     await state.update_data(pending_overlay_file_id=file_id)
+    data = await state.get_data()
+    base_file_id = data.get("image_file_id")
+    if base_file_id:
+        prefetch_overlay_assets(message.bot, state.key, base_file_id, file_id)
     await state.set_state(TextGenerationStructStates.adding_overlay_type)
     return await message.answer(
         "Выберите, как использовать изображение:",
@@ -899,6 +930,7 @@ async def struct_overlay_type_handler(callback: types.CallbackQuery, state: FSMC
             pending_overlay_file_id=None,
             pending_overlay_type=None,
         )
+        cancel_overlay_prefetch(state.key)
         await callback.answer("Добавление отменено")
         return await callback.message.answer(
             "Выберите действие", reply_markup=text_generation_results_keyboard()
@@ -940,6 +972,7 @@ async def struct_overlay_image_position_handler(
             pending_overlay_file_id=None,
             pending_overlay_type=None,
         )
+        cancel_overlay_prefetch(state.key)
         await callback.answer("Добавление отменено")
         return await callback.message.answer(
             "Выберите действие", reply_markup=text_generation_results_keyboard()
@@ -972,6 +1005,7 @@ async def struct_overlay_image_position_handler(
             overlay_file_id=overlay_file_id,
             overlay_type=overlay_type,
             position=value,
+            state_key=state.key,
         )
         try:
             await processing_msg.delete()
@@ -981,7 +1015,8 @@ async def struct_overlay_image_position_handler(
         post_text = data.get("post") or "Обновлённое изображение"
         photo_message = await callback.message.answer_photo(
             photo=BufferedInputFile(
-                merged_bytes, filename="struct_post_image_with_overlay.png"
+                merged_bytes,
+                filename=photo_filename("struct_post_image_with_overlay"),
             ),
             caption=markdown_to_html(post_text),
         )
@@ -998,10 +1033,11 @@ async def struct_overlay_image_position_handler(
         )
         await state.set_state(TextGenerationStructStates.waiting_results)
 
-        await track_user_operation(user_id=callback.from_user.id)
+        remaining = await track_user_operation(user_id=callback.from_user.id)
 
         return await callback.message.answer(
-            "Выберите действие", reply_markup=text_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=text_generation_results_keyboard(),
         )
 
     except Exception:
@@ -1068,14 +1104,16 @@ async def editing_handler(
 
     user_id = message.from_user.id
     loading_msg = await message.answer("⏳ Обновляю пост...")
+    show_queue_position(loading_msg)
 
     try:
         # Обновляем пост
-        updated_post = await ai_manager.generate_free_text_post(
+        updated_post = await ai_manager.revise_post(
             user_id=user_id,
             session=session,
-            user_idea=f"Исходный пост:\n{original_post}\n\nИзменения: {edit_request}",
-            style="разговорный",
+            flow="struct",
+            original_post=original_post,
+            edit_request=edit_request,
         )
 
         await loading_msg.edit_text("✨ Сохраняю изменения...")
@@ -1097,10 +1135,11 @@ async def editing_handler(
             )
             await state.update_data(image_file_id=new_image_file_id, has_image=True)
 
-        await track_user_operation(user_id)
+        remaining = await track_user_operation(user_id)
 
         return await message.answer(
-            "Выберите действие", reply_markup=text_generation_results_keyboard()
+            "Выберите действие" + format_budget(remaining),
+            reply_markup=text_generation_results_keyboard(),
         )
 
     except TextLengthLimitError:
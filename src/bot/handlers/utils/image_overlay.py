@@ -1,8 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
 from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from src.bot.handlers.utils.telegram_files import download_file_bytes
+from src.bot.states import (
+    ImageGenerationStates,
+    TextGenerationStates,
+    TextGenerationStructStates,
+)
+from src.services.image_executor import image_executor
+from src.services.image_overlay import ImageOverlayOptions
 
-from src.services.image_overlay import ImageOverlayOptions, apply_image_overlay
+logger = logging.getLogger(__name__)
 
 OVERLAY_TYPE_SIZES = {
     "logo": 0.22,
@@ -10,11 +26,128 @@ OVERLAY_TYPE_SIZES = {
 }
 
 
-async def download_file_bytes(bot: Bot, file_id: str) -> bytes:
-    """Скачивает файл из Telegram и возвращает его байты."""
-    file = await bot.get_file(file_id)
-    downloaded = await bot.download_file(file.file_path)
-    return downloaded.read()
+@dataclass
+class OverlayPrefetch:
+    base_file_id: str
+    overlay_file_id: str
+    task: asyncio.Task
+
+
+# Сколько секунд хранить подготовленные изображения и сколько подготовок
+# держать одновременно (самые старые отменяются)
+PREFETCH_TTL = 600
+MAX_PREFETCHES = 100
+
+# Состояния, в которых подготовленные изображения ещё понадобятся
+PREFETCH_STATES = {
+    overlay_state.state
+    for group in (
+        ImageGenerationStates,
+        TextGenerationStates,
+        TextGenerationStructStates,
+    )
+    for overlay_state in (group.adding_overlay_type, group.adding_overlay_position)
+}
+
+# Подготовка изображений, начатая сразу после загрузки логотипа/фото,
+# по ключу FSM-сессии пользователя
+_prefetches: Dict[StorageKey, OverlayPrefetch] = {}
+
+
+async def _download_assets(
+    bot: Bot, base_file_id: str, overlay_file_id: str
+) -> Tuple[bytes, bytes]:
+    base_bytes, overlay_bytes = await asyncio.gather(
+        download_file_bytes(bot, base_file_id),
+        download_file_bytes(bot, overlay_file_id),
+    )
+    return base_bytes, overlay_bytes
+
+
+async def _prepare_assets(
+    bot: Bot, base_file_id: str, overlay_file_id: str
+) -> Tuple[bytes, bytes]:
+    base_bytes, overlay_bytes = await _download_assets(
+        bot, base_file_id, overlay_file_id
+    )
+    overlay_bytes = await image_executor.prepare_overlay_image(
+        base_bytes, overlay_bytes, max(OVERLAY_TYPE_SIZES.values())
+    )
+    return base_bytes, overlay_bytes
+
+
+def _log_prefetch_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Не удалось заранее подготовить оверлей: {task.exception()}")
+
+
+def prefetch_overlay_assets(
+    bot: Bot, state_key: StorageKey, base_file_id: str, overlay_file_id: str
+) -> None:
+    """
+    Запускает в фоне скачивание и подготовку изображений, пока пользователь
+    выбирает тип и позицию оверлея. build_image_with_overlay с тем же
+    state_key использует готовый результат.
+    """
+    cancel_overlay_prefetch(state_key)
+    while len(_prefetches) >= MAX_PREFETCHES:
+        cancel_overlay_prefetch(next(iter(_prefetches)))
+
+    task = asyncio.create_task(_prepare_assets(bot, base_file_id, overlay_file_id))
+    task.add_done_callback(_log_prefetch_error)
+    _prefetches[state_key] = OverlayPrefetch(
+        base_file_id=base_file_id, overlay_file_id=overlay_file_id, task=task
+    )
+    asyncio.get_running_loop().call_later(
+        PREFETCH_TTL, _expire_prefetch, state_key, task
+    )
+
+
+def _expire_prefetch(state_key: StorageKey, task: asyncio.Task) -> None:
+    prefetch = _prefetches.get(state_key)
+    if prefetch is not None and prefetch.task is task:
+        cancel_overlay_prefetch(state_key)
+
+
+def cancel_overlay_prefetch(state_key: StorageKey) -> None:
+    prefetch = _prefetches.pop(state_key, None)
+    if prefetch is not None:
+        prefetch.task.cancel()
+
+
+async def discard_stale_overlay_prefetch(state: Optional[FSMContext]) -> None:
+    """Отменяет подготовку, если пользователь вышел из сценария оверлея"""
+    if state is None or state.key not in _prefetches:
+        return
+    if await state.get_state() not in PREFETCH_STATES:
+        cancel_overlay_prefetch(state.key)
+
+
+async def _take_prefetched(
+    state_key: Optional[StorageKey], base_file_id: str, overlay_file_id: str
+) -> Optional[Tuple[bytes, bytes]]:
+    if state_key is None:
+        return None
+
+    prefetch = _prefetches.pop(state_key, None)
+    if prefetch is None:
+        return None
+    if (prefetch.base_file_id, prefetch.overlay_file_id) != (
+        base_file_id,
+        overlay_file_id,
+    ):
+        prefetch.task.cancel()
+        return None
+
+    try:
+        return await prefetch.task
+    except asyncio.CancelledError:
+        # Отменена сама подготовка, а не текущий обработчик
+        if prefetch.task.cancelled():
+            return None
+        raise
+    except Exception:
+        return None
 
 
 async def build_image_with_overlay(
@@ -23,15 +156,19 @@ async def build_image_with_overlay(
     overlay_file_id: str,
     overlay_type: str,
     position: str,
+    state_key: Optional[StorageKey] = None,
 ) -> bytes:
     """Комбинирует исходное изображение с пользовательским логотипом/фото."""
     if overlay_type not in OVERLAY_TYPE_SIZES:
         raise ValueError(f"Unknown overlay type: {overlay_type}")
 
-    base_bytes = await download_file_bytes(bot, base_file_id)
-    overlay_bytes = await download_file_bytes(bot, overlay_file_id)
+    assets = await _take_prefetched(state_key, base_file_id, overlay_file_id)
+    if assets is None:
+        assets = await _download_assets(bot, base_file_id, overlay_file_id)
+    base_bytes, overlay_bytes = assets
+
     options = ImageOverlayOptions(
         position=position, size_ratio=OVERLAY_TYPE_SIZES[overlay_type]
     )
 
-    return apply_image_overlay(base_bytes, overlay_bytes, options)
+    return await image_executor.apply_image_overlay(base_bytes, overlay_bytes, options)
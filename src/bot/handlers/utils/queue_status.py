@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from aiogram import types
+
+from src.services.generation_scheduler import queue_listener
+
+
+def show_queue_position(message: types.Message, text: Optional[str] = None) -> None:
+    """
+    Показывает в сообщении загрузки позицию пользователя в очереди генерации.
+
+    Действует до конца обработки текущего апдейта. Когда запрос допущен
+    к генерации, сообщению возвращается исходный текст.
+
+    Args:
+        message: Сообщение загрузки («⏳ Создаю пост...»)
+        text: Текст, который нужно вернуть после ожидания (по умолчанию текущий)
+    """
+    base_text = text if text is not None else message.html_text
+
+    async def listener(position: int) -> None:
+        if position > 0:
+            await message.edit_text(
+                f"{base_text}\n\n🕒 Вы {position}-й в очереди на генерацию. "
+                "Пожалуйста, подождите."
+            )
+        else:
+            await message.edit_text(base_text)
+
+    queue_listener.set(listener)
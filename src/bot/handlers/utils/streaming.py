@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Optional
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from src.config import settings
+from src.services.ai_manager import FinalText
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def _build_preview(header: str, text: str) -> str:
+    preview = f"{header}{text}"
+    if len(preview) <= TELEGRAM_MESSAGE_LIMIT:
+        return preview
+    return preview[: TELEGRAM_MESSAGE_LIMIT - 1] + "…"
+
+
+async def stream_to_message(
+    message: types.Message,
+    chunks: AsyncIterator[str],
+    header: str = "",
+    render: Optional[Callable[[str], str]] = None,
+) -> str:
+    """
+    Постепенно обновляет сообщение по мере поступления фрагментов текста.
+
+    Частота edit_text ограничена STREAM_EDIT_INTERVAL, чтобы не упираться
+    в лимиты Telegram на редактирование сообщений.
+
+    Args:
+        message: Сообщение, которое будет обновляться (например, «⏳ Создаю пост...»)
+        chunks: Асинхронный поток фрагментов текста (FinalText заменяет текст целиком)
+        header: Строка, которая выводится перед текстом
+        render: Преобразование накопленного текста перед показом
+
+    Returns:
+        Полный накопленный текст
+    """
+    text = ""
+    last_shown = ""
+    next_edit_at = 0.0
+
+    # aclosing: при ошибке здесь поток закрывается сразу и в этом же контексте,
+    # освобождая слот генерации
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            # Повторная генерация без потока заменяет показанный текст
+            if isinstance(chunk, FinalText):
+                text = str(chunk)
+            else:
+                text += chunk
+
+            now = time.monotonic()
+            if now < next_edit_at:
+                continue
+
+            visible = render(text) if render else text
+            if not visible.strip():
+                continue
+
+            preview = _build_preview(header, visible)
+            if preview == last_shown:
+                continue
+
+            try:
+                # Без parse_mode: незавершённая разметка ломает HTML-парсер Telegram
+                await message.edit_text(preview, parse_mode=None)
+                last_shown = preview
+            except TelegramRetryAfter as e:
+                now += e.retry_after
+            except TelegramBadRequest as e:
+                logger.debug(f"Failed to update streaming message: {e}")
+
+            next_edit_at = now + settings.STREAM_EDIT_INTERVAL
+
+    return text
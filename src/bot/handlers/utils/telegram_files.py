@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from aiogram import Bot
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Сколько путей get_file хранить, прежде чем чистить устаревшие
+MAX_PATH_ENTRIES = 1000
+
+
+class TelegramFileCache:
+    """
+    Кэш файлов, скачанных из Telegram.
+
+    Байты хранятся по file_unique_id в LRU с ограничением по объёму;
+    вытесненные файлы при заданном TELEGRAM_FILE_CACHE_DIR сохраняются
+    на диск. Результат get_file запоминается на время жизни ссылки,
+    а одновременные запросы одного файла объединяются в одно скачивание.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        path_ttl: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        spill_max_bytes: Optional[int] = None,
+    ):
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else settings.TELEGRAM_FILE_CACHE_MAX_BYTES
+        )
+        self.path_ttl = (
+            path_ttl if path_ttl is not None else settings.TELEGRAM_FILE_PATH_TTL
+        )
+        if spill_dir is None:
+            spill_dir = settings.TELEGRAM_FILE_CACHE_DIR
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_max_bytes = (
+            spill_max_bytes
+            if spill_max_bytes is not None
+            else settings.TELEGRAM_FILE_CACHE_DISK_MAX_BYTES
+        )
+
+        self._files: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        # file_id -> (file_path, file_unique_id, момент истечения ссылки)
+        self._paths: Dict[str, Tuple[str, str, float]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.path_hits = 0
+        self.path_misses = 0
+
+    async def _coalesce(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Одна операция на ключ: остальные вызовы ждут её результата"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Отмена одного ожидающего не должна прерывать скачивание для остальных
+        return await asyncio.shield(task)
+
+    async def _get_file_info(self, bot: Bot, file_id: str) -> Tuple[str, str]:
+        cached = self._paths.get(file_id)
+        if cached is not None and cached[2] > time.monotonic():
+            self.path_hits += 1
+            return cached[0], cached[1]
+
+        self.path_misses += 1
+        file = await self._coalesce(f"path:{file_id}", lambda: bot.get_file(file_id))
+
+        if len(self._paths) >= MAX_PATH_ENTRIES:
+            now = time.monotonic()
+            for key in [k for k, v in self._paths.items() if v[2] <= now]:
+                del self._paths[key]
+            while len(self._paths) >= MAX_PATH_ENTRIES:
+                del self._paths[next(iter(self._paths))]
+
+        self._paths[file_id] = (
+            file.file_path,
+            file.file_unique_id,
+            time.monotonic() + self.path_ttl,
+        )
+        return file.file_path, file.file_unique_id
+
+    async def download(self, bot: Bot, file_id: str) -> bytes:
+        """Байты файла по file_id (из памяти, с диска или из Telegram)"""
+        file_path, unique_id = await self._get_file_info(bot, file_id)
+
+        data = self._files.get(unique_id)
+        if data is not None:
+            self._files.move_to_end(unique_id)
+            self.hits += 1
+            return data
+
+        return await self._coalesce(
+            f"file:{unique_id}", lambda: self._load(bot, file_path, unique_id)
+        )
+
+    async def _load(self, bot: Bot, file_path: str, unique_id: str) -> bytes:
+        data = await self._read_spill(unique_id)
+        if data is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            downloaded = await bot.download_file(file_path)
+            data = downloaded.read()
+
+        await self._put(unique_id, data)
+        return data
+
+    async def _put(self, unique_id: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            await self._write_spill(unique_id, data)
+            return
+
+        self._files[unique_id] = data
+        self._size += len(data)
+
+        while self._size > self.max_bytes:
+            evicted_id, evicted = self._files.popitem(last=False)
+            self._size -= len(evicted)
+            await self._write_spill(evicted_id, evicted)
+
+    def _spill_path(self, unique_id: str) -> Optional[Path]:
+        if self.spill_dir is None:
+            return None
+        return self.spill_dir / unique_id
+
+    async def _read_spill(self, unique_id: str) -> Optional[bytes]:
+        path = self._spill_path(unique_id)
+        if path is None:
+            return None
+        try:
+            return await asyncio.to_thread(_read_and_touch, path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать файл из кэша на диске: {e}")
+            return None
+
+    async def _write_spill(self, unique_id: str, data: bytes) -> None:
+        path = self._spill_path(unique_id)
+        if path is None:
+            return
+        try:
+            await asyncio.to_thread(_write_and_prune, path, data, self.spill_max_bytes)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить файл в кэш на диске: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self._files),
+            "memory_bytes": self._size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "path_hits": self.path_hits,
+            "path_misses": self.path_misses,
+        }
+
+
+def _read_and_touch(path: Path) -> bytes:
+    data = path.read_bytes()
+    # mtime служит порядком вытеснения на диске
+    os.utime(path)
+    return data
+
+
+def _write_and_prune(path: Path, data: bytes, max_bytes: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+
+    files = []
+    for entry in path.parent.iterdir():
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, entry))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, entry in sorted(files, key=lambda item: item[0]):
+        if total <= max_bytes:
+            break
+        entry.unlink(missing_ok=True)
+        total -= size
+
+
+telegram_file_cache = TelegramFileCache()
+
+
+async def download_file_bytes(bot: Bot, file_id: str) -> bytes:
+    """Скачивает файл из Telegram (через кэш) и возвращает его байты."""
+    return await telegram_file_cache.download(bot, file_id)
@@ -1,5 +1,4 @@
 import logging
-import time
 from typing import Any, Optional, Tuple
 
 from aiogram import BaseMiddleware, Bot, types
@@ -15,10 +14,24 @@ from src.bot.states import MainMenuStates
 from src.config import settings
 
 
+from src.bot.handlers.utils.image_overlay import discard_stale_overlay_prefetch
 from src.bot.keyboards import back_to_menu_keyboard
 from src.db.database import session_factory
-from src.db.models import User
+from src.db.session import (
+    LazySession,
+    reset_current_session,
+    session_stats,
+    set_current_session,
+)
+from src.services.operation_cost import (
+    has_open_reservations,
+    open_operation_scope,
+    refund_open_reservations,
+    settle_operation,
+    take_spent_cost,
+)
 from src.services.user import UserService
+from src.services.user_access_cache import UserAccess
 
 logger = logging.getLogger(__name__)
 
@@ -36,24 +49,42 @@ def _resolve_handler_name(handler: Any) -> str:
 
 class DBSessionMiddleware(BaseMiddleware):
     """
-    Открывает AsyncSession перед обработкой и роллбекает при ошибке.
+    Передаёт обработчику ленивую сессию и роллбекает при ошибке.
+
+    Соединение из пула берётся при первом запросе к БД; перед долгими
+    вызовами API оно возвращается (release_session_connection), поэтому
+    размер пула не ограничивает число одновременных генераций.
     """
 
     async def __call__(self, handler, event: TelegramObject, data: dict):
-        async with session_factory() as session:
-            data["session"] = session
-            try:
-                result = await handler(event, data)
-                return result
-            except Exception as e:
-                await session.rollback()
-                logger.exception(
-                    "Error in middleware %s for event %s Exception %s",
-                    _resolve_handler_name(handler),
-                    event,
-                    e,
-                )
-                return await _send_error_message(event)
+        session = LazySession(session_factory)
+        token = set_current_session(session)
+        data["session"] = session
+        try:
+            result = await handler(event, data)
+            return result
+        except Exception as e:
+            await session.rollback()
+            logger.exception(
+                "Error in middleware %s for event %s Exception %s",
+                _resolve_handler_name(handler),
+                event,
+                e,
+            )
+            return await _send_error_message(event)
+        finally:
+            await session.close()
+            reset_current_session(token)
+            handler_object = data.get("handler")
+            session_stats.record(
+                _resolve_handler_name(getattr(handler_object, "callback", handler)),
+                session,
+            )
+
+    @staticmethod
+    def get_stats() -> dict:
+        """Время удержания соединений с БД по обработчикам"""
+        return session_stats.get_stats()
 
 
 async def _send_error_message(event: TelegramObject):
@@ -78,6 +109,7 @@ class UserAccessMiddleware(BaseMiddleware):
 
     Пропускает администратора и активных пользователей. Остальным отвечает,
     что доступ ещё не открыт, и при первой заявке уведомляет администратора.
+    Статус берётся из user_access_cache, к БД запрос идёт только при промахе.
     """
 
     def __init__(self, bot: Bot, admin_id: int):
@@ -107,7 +139,7 @@ class UserAccessMiddleware(BaseMiddleware):
         )
 
         if telegram_id == self.admin_id:
-            await user_service.ensure_admin(
+            await user_service.ensure_admin_access(
                 telegram_id=telegram_id,
                 username=username,
             )
@@ -142,9 +174,9 @@ class UserAccessMiddleware(BaseMiddleware):
         user_service: UserService,
         telegram_id: int,
         username: Optional[str],
-    ) -> Tuple[User, bool]:
+    ) -> Tuple[UserAccess, bool]:
         try:
-            return await user_service.register_or_get_user(
+            return await user_service.get_access(
                 telegram_id=telegram_id,
                 username=username,
             )
@@ -152,7 +184,9 @@ class UserAccessMiddleware(BaseMiddleware):
             logger.exception("Не удалось зарегистрировать пользователя %s", telegram_id)
             raise
 
-    async def _notify_admin(self, user_service: UserService, user) -> None:
+    async def _notify_admin(
+        self, user_service: UserService, user: Optional[UserAccess]
+    ) -> None:
         if user is None:
             return
         try:
@@ -206,6 +240,63 @@ class UserAccessMiddleware(BaseMiddleware):
             logger.debug(f"Не удалось удалить сообщение {chat_id}:{message_id}: {e}")
 
 
+class OverlayPrefetchCleanupMiddleware(BaseMiddleware):
+    """
+    Освобождает заранее подготовленные изображения оверлея, когда
+    пользователь выходит из сценария (/start, главное меню, другой шаг).
+    """
+
+    async def __call__(self, handler, event, data: dict):
+        try:
+            return await handler(event, data)
+        finally:
+            try:
+                await discard_stale_overlay_prefetch(data.get("state"))
+            except Exception as e:
+                logger.debug(f"Не удалось проверить подготовку оверлея: {e}")
+
+
+def _scenario_left(state_before: Optional[str], state_after: Optional[str]) -> bool:
+    """Пользователь вышел из группы состояний, в которой был до апдейта"""
+    if state_before is None:
+        return False
+    if state_after is None:
+        return True
+    return state_before.split(":", 1)[0] != state_after.split(":", 1)[0]
+
+
+class OperationBudgetMiddleware(BaseMiddleware):
+    """
+    Учёт резервов лимита операций в рамках апдейта.
+
+    Генерации, которые завершились, но не были списаны обработчиком
+    (например, ответ не удалось отправить), списываются после обработки.
+    При выходе из сценария возвращаются резервы, оставшиеся открытыми
+    после прерванных апдейтов.
+    """
+
+    async def __call__(self, handler, event, data: dict):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        open_operation_scope()
+        try:
+            return await handler(event, data)
+        finally:
+            try:
+                if has_open_reservations():
+                    await settle_operation(user.id, take_spent_cost())
+
+                state: Optional[FSMContext] = data.get("state")
+                state_before = data.get("raw_state")
+                if state is not None and state_before is not None:
+                    if _scenario_left(state_before, await state.get_state()):
+                        await refund_open_reservations(user.id)
+            except Exception as e:
+                logger.warning(f"Не удалось закрыть резервы лимита user {user.id}: {e}")
+
+
 class RemoveLastKeyboardMiddleware(BaseMiddleware):
     async def __call__(self, handler, event, data: dict):
         state: FSMContext = data.get("state")
@@ -252,23 +343,125 @@ async def _remove_keyboard(bot: Bot, chat_id: int, message_id: int) -> None:
         logger.error(f"Unexpected error removing keyboard {chat_id}:{message_id}: {e}")
 
 
-async def clear_initiator(chat_id: int):
-    """Очистить статус инициатора для чата"""
+INITIATOR_LEASE_TTL = 180
+
+# Решение о допуске в групповом чате за один вызов. KEYS[1] — hash
+# с инициатором (user_id, last_activity, token). ARGV: user_id, /start (0/1),
+# разрешён ли перехват (0/1), ожидаемый token текущего инициатора (пусто —
+# перехват без проверки), TTL аренды, таймаут неактивности.
+# Возвращает {решение, инициатор, token}:
+# 1 — пропустить, 0 — чужой запрос, 2 — /start при активном инициаторе
+# (нужна проверка его состояния и повторный вызов с перехватом).
+# Новый token выдаётся при каждой смене инициатора и защищает от того,
+# чтобы запоздавшая очистка сняла чужую аренду.
+INITIATOR_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local user_id = ARGV[1]
+local is_start = ARGV[2] == '1'
+local takeover = ARGV[3] == '1'
+local lease = tonumber(ARGV[5])
+local timeout = tonumber(ARGV[6])
+
+local current = redis.call('HMGET', KEYS[1], 'user_id', 'last_activity', 'token')
+local initiator = current[1]
+local token = current[3] or ''
+if initiator and now - tonumber(current[2] or 0) > timeout then
+    initiator = false
+end
+
+if initiator and initiator ~= user_id then
+    if not is_start then
+        return {0, initiator, token}
+    end
+    if not takeover or (ARGV[4] ~= '' and ARGV[4] ~= token) then
+        return {2, initiator, token}
+    end
+    initiator = false
+end
+
+if not initiator then
+    token = time[1] .. string.format('%06d', tonumber(time[2]))
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'user_id', user_id, 'token', token)
+end
+redis.call('HSET', KEYS[1], 'last_activity', tostring(now))
+redis.call('EXPIRE', KEYS[1], lease)
+return {1, user_id, token}
+"""
+
+# Снятие аренды: без token — безусловно, иначе только своей
+RELEASE_INITIATOR_SCRIPT = """
+if ARGV[1] == '' or redis.call('HGET', KEYS[1], 'token') == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+INITIATOR_ALLOWED = 1
+INITIATOR_DENIED = 0
+INITIATOR_BUSY = 2
+
+_initiator_scripts: dict = {}
+
+
+def _initiator_key(chat_id: int) -> str:
+    return f"chat:{chat_id}:initiator_lease"
+
+
+async def _run_initiator_script(source: str, chat_id: int, args: list):
     if not rate_limiter.redis_client:
         await rate_limiter.initialize()
+    script = _initiator_scripts.get(source)
+    if script is None:
+        script = rate_limiter.redis_client.register_script(source)
+        _initiator_scripts[source] = script
+    return await script(
+        keys=[_initiator_key(chat_id)],
+        args=args,
+        client=rate_limiter.redis_client,
+    )
+
+
+async def acquire_initiator(
+    chat_id: int,
+    user_id: int,
+    is_start: bool,
+    takeover: bool = False,
+    expected_token: str = "",
+) -> Tuple[int, Optional[int], str]:
+    """
+    Проверяет и продлевает аренду инициатора чата за один запрос к Redis
 
-    initiator_key = f"chat:{chat_id}:initiator"
-    activity_key = f"chat:{chat_id}:initiator:last_activity"
-
-    await rate_limiter.redis_client.delete(initiator_key)
-    await rate_limiter.redis_client.delete(activity_key)
+    Returns:
+        Решение (INITIATOR_*), id инициатора и token его аренды
+    """
+    decision, initiator_id, token = await _run_initiator_script(
+        INITIATOR_SCRIPT,
+        chat_id,
+        [
+            user_id,
+            int(is_start),
+            int(takeover),
+            expected_token,
+            INITIATOR_LEASE_TTL,
+            settings.INACTIVITY_TIMEOUT,
+        ],
+    )
+    return int(decision), int(initiator_id), str(token)
+
+
+async def clear_initiator(chat_id: int, token: str = ""):
+    """Очистить статус инициатора для чата (только аренду с token, если задан)"""
+    await _run_initiator_script(RELEASE_INITIATOR_SCRIPT, chat_id, [token])
 
 
 class GroupChatAccessMiddleware(BaseMiddleware):
     """
     Middleware для проверки прав доступа в групповых чатах.
     Блокирует callback_query и message от пользователей, которые не инициировали запрос.
-    Использует Redis для хранения информации об инициаторе, привязанной к chat_id.
+    Инициатор хранится в Redis как аренда с TTL, привязанная к chat_id;
+    проверка, захват и продление выполняются одним Lua-скриптом.
     """
 
     def __init__(self, storage=None):
@@ -293,91 +486,36 @@ class GroupChatAccessMiddleware(BaseMiddleware):
         if not is_group_chat:
             return await handler(event, data)
 
-        if not rate_limiter.redis_client:
-            await rate_limiter.initialize()
-
-        initiator_key = f"chat:{chat_id}:initiator"
-        activity_key = f"chat:{chat_id}:initiator:last_activity"
-
-        initiator_user_id_str = await rate_limiter.redis_client.get(initiator_key)
-        initiator_user_id = (
-            int(initiator_user_id_str) if initiator_user_id_str else None
-        )
-
-        if initiator_user_id is not None:
-            last_activity_str = await rate_limiter.redis_client.get(activity_key)
-            if last_activity_str:
-                last_activity = float(last_activity_str)
-                time_since_activity = time.time() - last_activity
-
-                if time_since_activity > settings.INACTIVITY_TIMEOUT:
-                    await clear_initiator(chat_id)
-                    initiator_user_id = None
-                    logger.debug(
-                        f"Таймаут неактивности для чата {chat_id}, очищен статус инициатора"
-                    )
-
-        is_start_command = (
+        is_start_command = bool(
             isinstance(event, types.Message)
             and event.text
             and event.text.startswith("/start")
         )
 
-        # Если это команда /start, проверяем, есть ли активный процесс у текущего инициатора
-        if (
-            is_start_command
-            and initiator_user_id is not None
-            and initiator_user_id != user_id
-        ):
-            if self.storage:
-                try:
-                    storage_key = StorageKey(
-                        chat_id=chat_id, user_id=initiator_user_id, bot_id=event.bot.id
-                    )
-                    initiator_state = await self.storage.get_state(key=storage_key)
-
-                    main_menu_state_str = str(MainMenuStates.main_menu)
-                    is_active_process = (
-                        initiator_state is not None
-                        and str(initiator_state) != main_menu_state_str
-                    )
-
-                    if is_active_process:
-                        if isinstance(event, types.CallbackQuery):
-                            await event.answer(
-                                "⏳ Другой пользователь сейчас использует бота. "
-                                "Дождитесь завершения его запроса или попробуйте позже.",
-                                show_alert=True,
-                            )
-                        elif isinstance(event, types.Message):
-                            answer_msg = await event.answer(
-                                "⏳ Другой пользователь сейчас использует бота. "
-                                "Дождитесь завершения его запроса или попробуйте позже."
-                            )
-                            import asyncio
-
-                            asyncio.create_task(
-                                self._delete_message_after_delay(
-                                    event.bot, chat_id, answer_msg.message_id, delay=3
-                                )
-                            )
-                        return None
-                except Exception as e:
-                    logger.warning(f"Ошибка при проверке состояния инициатора: {e}")
-
-        # Если это команда /start или инициатор еще не установлен, устанавливаем текущего пользователя как инициатора
-        if is_start_command or initiator_user_id is None:
-            await rate_limiter.redis_client.set(initiator_key, str(user_id))
-            await rate_limiter.redis_client.expire(initiator_key, 180)
-
-            await rate_limiter.redis_client.set(activity_key, str(time.time()))
-            await rate_limiter.redis_client.expire(activity_key, 180)
-            result = await handler(event, data)
-            await self._check_and_clear_initiator_if_main_menu(chat_id, user_id, state)
-            return result
+        # Без storage состояние инициатора не проверить: /start перехватывает сразу
+        decision, initiator_user_id, token = await acquire_initiator(
+            chat_id, user_id, is_start_command, takeover=not self.storage
+        )
+
+        # /start при активном инициаторе: перехват, только если он в главном меню
+        if decision == INITIATOR_BUSY:
+            if await self._is_initiator_busy(event, chat_id, initiator_user_id):
+                await self._answer_busy(event, chat_id)
+                return None
+            decision, initiator_user_id, token = await acquire_initiator(
+                chat_id,
+                user_id,
+                is_start_command,
+                takeover=True,
+                expected_token=token,
+            )
+            # Аренду успел занять кто-то другой
+            if decision != INITIATOR_ALLOWED:
+                await self._answer_busy(event, chat_id)
+                return None
 
         # Проверяем, что текущий пользователь - это инициатор
-        if user_id != initiator_user_id:
+        if decision == INITIATOR_DENIED:
             if isinstance(event, types.CallbackQuery):
                 await event.answer(
                     "❌ Это не ваш запрос. Вы не можете использовать кнопки этого бота.",
@@ -387,16 +525,50 @@ class GroupChatAccessMiddleware(BaseMiddleware):
 
             return None
 
-        await rate_limiter.redis_client.set(activity_key, str(time.time()))
-        await rate_limiter.redis_client.expire(activity_key, 180)
-
         result = await handler(event, data)
-        await self._check_and_clear_initiator_if_main_menu(chat_id, user_id, state)
+        await self._check_and_clear_initiator_if_main_menu(
+            chat_id, user_id, state, token
+        )
 
         return result
 
+    async def _is_initiator_busy(
+        self, event, chat_id: int, initiator_user_id: int
+    ) -> bool:
+        """Есть ли у инициатора незавершённый процесс (не главное меню)"""
+        try:
+            storage_key = StorageKey(
+                chat_id=chat_id, user_id=initiator_user_id, bot_id=event.bot.id
+            )
+            initiator_state = await self.storage.get_state(key=storage_key)
+        except Exception as e:
+            logger.warning(f"Ошибка при проверке состояния инициатора: {e}")
+            return False
+
+        main_menu_state_str = str(MainMenuStates.main_menu)
+        return (
+            initiator_state is not None and str(initiator_state) != main_menu_state_str
+        )
+
+    async def _answer_busy(self, event, chat_id: int) -> None:
+        text = (
+            "⏳ Другой пользователь сейчас использует бота. "
+            "Дождитесь завершения его запроса или попробуйте позже."
+        )
+        if isinstance(event, types.CallbackQuery):
+            await event.answer(text, show_alert=True)
+        elif isinstance(event, types.Message):
+            answer_msg = await event.answer(text)
+            import asyncio
+
+            asyncio.create_task(
+                self._delete_message_after_delay(
+                    event.bot, chat_id, answer_msg.message_id, delay=3
+                )
+            )
+
     async def _check_and_clear_initiator_if_main_menu(
-        self, chat_id: int, user_id: int, state: FSMContext
+        self, chat_id: int, user_id: int, state: FSMContext, token: str = ""
     ):
         """Проверяет, находится ли пользователь в главном меню, и очищает статус инициатора если да"""
         if not state or not self.storage:
@@ -407,7 +579,7 @@ class GroupChatAccessMiddleware(BaseMiddleware):
             main_menu_state_str = str(MainMenuStates.main_menu)
 
             if current_state and str(current_state) == main_menu_state_str:
-                await clear_initiator(chat_id)
+                await clear_initiator(chat_id, token)
                 logger.debug(
                     f"Пользователь {user_id} в главном меню, очищен статус инициатора для чата {chat_id}"
                 )
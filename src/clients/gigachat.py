@@ -2,11 +2,25 @@ import logging
 import ssl
 import httpx
 import base64
+import json
 import uuid
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import AsyncIterator, Optional, List, Dict
+from src.clients.http_pool import http_pool
+from src.clients.token_manager import OAuthTokenManager
 from src.config import settings
-from src.services.service_decorators import with_retry, ensure_text_length
+from src.services.completion_cache import completion_cache
+from src.services.deadline import deadline_timeout
+from src.services.generation_context import get_generation_context
+from src.services.image_analysis_cache import image_analysis_cache
+from src.services.image_executor import image_executor
+from src.services.provider_limiter import provider_limiter
+from src.services.service_decorators import (
+    MAX_TEXT_LENGTH,
+    with_retry,
+    ensure_text_length,
+    is_retryable,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +32,9 @@ class GigaChatModel:
     BASE_URL = "https://gigachat.devices.sberbank.ru/api/v1"
 
     def __init__(self):
-        self.access_token: Optional[str] = None
-        self.token_expires_at: float = 0
-        self.conversation_history: List[Dict[str, str]] = []
+        self.token_manager = OAuthTokenManager(
+            name="GigaChat", fetch_token=self._get_auth_token, default_ttl=30 * 60
+        )
 
         src_root = Path(__file__).resolve().parent.parent
         certificates_dir = src_root / "assets" / "certificates"
@@ -46,8 +60,24 @@ class GigaChatModel:
         else:
             return {"verify": False}
 
+    def _get_client(self) -> httpx.AsyncClient:
+        """Общий долгоживущий клиент GigaChat из пула соединений"""
+        return http_pool.get_client("gigachat", **self._get_httpx_client_kwargs())
+
+    async def start(self):
+        """Подготовка долгоживущего HTTP клиента при запуске бота"""
+        if self.ssl_context is None:
+            # Сертификат мог появиться после импорта (setup_certificates)
+            self.ssl_context = self._create_ssl_context()
+        self._get_client()
+        await self.token_manager.start()
+
+    async def stop(self):
+        """Остановка фонового обновления токена"""
+        await self.token_manager.stop()
+
     @with_retry
-    async def _get_auth_token(self) -> str:
+    async def _get_auth_token(self) -> dict:
         """Получение токена авторизации с retry"""
         auth_string = f"{settings.GIGACHAT_CLIENT_ID}:{settings.GIGACHAT_CLIENT_SECRET}"
         auth_encoded = base64.b64encode(auth_string.encode()).decode()
@@ -61,13 +91,12 @@ class GigaChatModel:
         data = {"scope": settings.GIGACHAT_SCOPE}
 
         try:
-            async with httpx.AsyncClient(**self._get_httpx_client_kwargs()) as client:
-                response = await client.post(
-                    self.AUTH_URL, headers=headers, data=data, timeout=30.0
-                )
-                response.raise_for_status()
-                token_data = response.json()
-                return token_data["access_token"]
+            client = self._get_client()
+            response = await client.post(
+                self.AUTH_URL, headers=headers, data=data, timeout=30.0
+            )
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPStatusError as e:
             error_detail = ""
             try:
@@ -78,106 +107,160 @@ class GigaChatModel:
                 logger.error(error_detail)
             raise Exception(
                 f"Ошибка авторизации GigaChat: HTTP {e.response.status_code}: {error_detail}"
-            )
+            ) from e
         except Exception as e:
             logger.error(e)
-            raise Exception(f"Ошибка получения токена GigaChat: {str(e)}")
-
-    async def _ensure_token(self):
-        """Проверка и обновление токена при необходимости"""
-        import time
+            raise Exception(f"Ошибка получения токена GigaChat: {str(e)}") from e
 
-        if not self.access_token or time.time() >= (self.token_expires_at - 60):
-            self.access_token = await self._get_auth_token()
-            self.token_expires_at = time.time() + (30 * 60)
+    async def _ensure_token(self) -> str:
+        """Получение действующего токена (обновляется единым запросом)"""
+        return await self.token_manager.get_token()
 
-    @with_retry
-    async def analyze_image(
+    async def _authorized_post(
         self,
-        image_data: bytes,
-        prompt: str = "Максимально подробно опиши это изображение, чтобы не упустить все детали на нём",
-    ) -> str:
-        await self._ensure_token()
+        url: str,
+        access_token: str,
+        headers: dict,
+        timeout: float,
+        endpoint: str,
+        **kwargs,
+    ) -> httpx.Response:
+        """POST с повтором после обновления токена при ответе 401"""
+        client = self._get_client()
+        headers["Authorization"] = f"Bearer {access_token}"
+        await provider_limiter.acquire(endpoint)
+        response = await client.post(
+            url, headers=headers, timeout=deadline_timeout(timeout), **kwargs
+        )
+        await provider_limiter.record(endpoint, response.status_code)
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+        if response.status_code == 401:
+            self.token_manager.invalidate(access_token)
+            access_token = await self._ensure_token()
+            headers["Authorization"] = f"Bearer {access_token}"
 
-        async with httpx.AsyncClient(**self._get_httpx_client_kwargs()) as client:
-            try:
-                files = {"file": ("image.jpg", image_data, "image/jpeg")}
-                data = {"purpose": "general"}
+            # Повтор — отдельный запрос к API и отдельный слот бюджета
+            await provider_limiter.acquire(endpoint)
+            response = await client.post(
+                url, headers=headers, timeout=deadline_timeout(timeout), **kwargs
+            )
+            await provider_limiter.record(endpoint, response.status_code)
 
-                upload_response = await client.post(
-                    f"{self.BASE_URL}/files",
-                    headers=headers,
-                    files=files,
-                    data=data,
-                    timeout=60.0,
-                )
+        response.raise_for_status()
+        return response
 
-                if upload_response.status_code == 401:
-                    self.access_token = None
-                    await self._ensure_token()
-                    headers["Authorization"] = f"Bearer {self.access_token}"
-
-                    upload_response = await client.post(
-                        f"{self.BASE_URL}/files",
-                        headers=headers,
-                        files=files,
-                        data=data,
-                        timeout=60.0,
-                    )
+    async def _upload_image(self, image_data: bytes) -> str:
+        """Загрузка изображения в хранилище файлов GigaChat, возвращает id файла"""
+        access_token = await self._ensure_token()
 
-                upload_response.raise_for_status()
-                file_info = upload_response.json()
-                file_id = file_info.get("id")
+        try:
+            upload_response = await self._authorized_post(
+                f"{self.BASE_URL}/files",
+                access_token,
+                headers={},
+                timeout=60.0,
+                endpoint="gigachat:files",
+                files={"file": ("image.jpg", image_data, "image/jpeg")},
+                data={"purpose": "general"},
+            )
+        except httpx.HTTPStatusError as e:
+            error_detail = ""
+            try:
+                error_detail = e.response.json()
+            except ValueError:
+                error_detail = e.response.text
+            raise Exception(
+                f"Ошибка загрузки изображения: HTTP {e.response.status_code}: {error_detail}"
+            ) from e
 
-                if not file_id:
-                    raise Exception("Не удалось загрузить изображение")
+        file_id = upload_response.json().get("id")
+        if not file_id:
+            raise Exception("Не удалось загрузить изображение")
+        return file_id
 
-                headers["Content-Type"] = "application/json"
+    async def _analyze_file(self, file_id: str, prompt: str) -> str:
+        """Анализ ранее загруженного изображения"""
+        access_token = await self._ensure_token()
 
-                payload = {
-                    "model": "GigaChat-Pro",
-                    "messages": [
-                        {"role": "user", "content": prompt, "attachments": [file_id]}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 2000,
-                }
+        payload = {
+            "model": "GigaChat-Pro",
+            "messages": [{"role": "user", "content": prompt, "attachments": [file_id]}],
+            "temperature": 0.7,
+            "max_tokens": 2000,
+        }
 
-                response = await client.post(
-                    f"{self.BASE_URL}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=60.0,
-                )
+        try:
+            response = await self._authorized_post(
+                f"{self.BASE_URL}/chat/completions",
+                access_token,
+                headers={"Content-Type": "application/json"},
+                timeout=60.0,
+                endpoint="gigachat:chat",
+                json=payload,
+            )
+        except httpx.HTTPStatusError as e:
+            error_detail = ""
+            try:
+                error_detail = e.response.json()
+            except ValueError:
+                error_detail = e.response.text
+            raise Exception(
+                f"Ошибка анализа изображения: HTTP {e.response.status_code}: {error_detail}"
+            ) from e
 
-                if response.status_code == 401:
-                    self.access_token = None
-                    await self._ensure_token()
-                    headers["Authorization"] = f"Bearer {self.access_token}"
+        result = response.json()
+        return result["choices"][0]["message"]["content"]
 
-                    response = await client.post(
-                        f"{self.BASE_URL}/chat/completions",
-                        headers=headers,
-                        json=payload,
-                        timeout=60.0,
-                    )
+    @with_retry
+    async def analyze_image(
+        self,
+        image_data: bytes,
+        prompt: str = "Максимально подробно опиши это изображение, чтобы не упустить все детали на нём",
+    ) -> str:
+        """
+        Анализ изображения.
 
-                response.raise_for_status()
-                result = response.json()
+        Файл в GigaChat и результат анализа кэшируются по SHA-256 содержимого,
+        поэтому повторный анализ того же изображения обходится без загрузки
+        и запроса к модели. Перед загрузкой изображение уменьшается
+        и перекодируется в JPEG.
+        """
+        image_hash = image_analysis_cache.hash_image(image_data)
 
-                return result["choices"][0]["message"]["content"]
+        cached = await image_analysis_cache.get_analysis(image_hash, prompt)
+        if cached is not None:
+            return cached
 
-            except httpx.HTTPStatusError as e:
-                error_detail = ""
-                try:
-                    error_detail = e.response.json()
-                except ValueError:
-                    error_detail = e.response.text
-                raise Exception(
-                    f"Ошибка анализа изображения: HTTP {e.response.status_code}: {error_detail}"
-                )
+        analysis = None
+        file_id = await image_analysis_cache.get_file_id(image_hash)
+        if file_id is not None:
+            try:
+                analysis = await self._analyze_file(file_id, prompt)
+            except Exception as e:
+                if is_retryable(e):
+                    raise
+                # Файл мог быть уже удалён из GigaChat — загрузим заново
+                await image_analysis_cache.forget_file(image_hash, file_id)
+
+        if analysis is None:
+            upload_data = await image_executor.prepare_for_analysis(image_data)
+            file_id = await self._upload_image(upload_data)
+            await image_analysis_cache.set_file_id(image_hash, file_id)
+            analysis = await self._analyze_file(file_id, prompt)
+
+        await image_analysis_cache.set_analysis(image_hash, prompt, analysis)
+        return analysis
+
+    async def delete_file(self, file_id: str) -> None:
+        """Удаление загруженного файла из хранилища GigaChat"""
+        access_token = await self._ensure_token()
+        await self._authorized_post(
+            f"{self.BASE_URL}/files/{file_id}/delete",
+            access_token,
+            headers={},
+            timeout=30.0,
+            endpoint="gigachat:files",
+        )
 
     @with_retry
     async def _generate_text_raw(
@@ -187,85 +270,102 @@ class GigaChatModel:
         use_history: bool = False,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        cache: Optional[str] = None,
+        max_length: Optional[int] = None,
     ) -> str:
         """
         Внутренний метод генерации текста без проверки длины.
         Используется для случаев, когда нужен полный ответ (например, edit_post).
-        """
-        await self._ensure_token()
 
+        Если передан `cache` (имя места вызова), ответ берётся из Redis-кэша
+        и сохраняется в него; с историей диалога кэш не используется.
+        Ответы длиннее `max_length` не кэшируются и не попадают в историю
+        диалога: их всё равно сгенерируют заново.
+        """
         messages = []
 
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
 
-        if use_history and self.conversation_history:
-            messages.extend(self.conversation_history)
+        # История диалога хранится в контексте запроса, а не в общем клиенте
+        context = get_generation_context() if use_history else None
+        if context and context.history:
+            messages.extend(context.history)
 
         messages.append({"role": "user", "content": prompt})
 
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
-
         payload = {
             "model": settings.GIGACHAT_MODEL,
             "messages": messages,
-            "temperature": temperature or settings.AI_TEMPERATURE,
+            "temperature": (
+                temperature if temperature is not None else settings.AI_TEMPERATURE
+            ),
             "max_tokens": max_tokens or settings.AI_MAX_TOKENS,
             "repetition_penalty": 1.1,
         }
 
-        async with httpx.AsyncClient(**self._get_httpx_client_kwargs()) as client:
-            try:
+        use_cache = cache is not None and not use_history
+        if use_cache:
+            cached = await completion_cache.get(cache, payload)
+            if cached is not None:
+                return cached
+
+        access_token = await self._ensure_token()
+
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        }
+
+        client = self._get_client()
+        try:
+            await provider_limiter.acquire("gigachat:chat")
+            response = await client.post(
+                f"{self.BASE_URL}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=deadline_timeout(60.0),
+            )
+            await provider_limiter.record("gigachat:chat", response.status_code)
+
+            if response.status_code == 401:
+                self.token_manager.invalidate(access_token)
+                access_token = await self._ensure_token()
+                headers["Authorization"] = f"Bearer {access_token}"
+
+                await provider_limiter.acquire("gigachat:chat")
                 response = await client.post(
                     f"{self.BASE_URL}/chat/completions",
                     headers=headers,
                     json=payload,
-                    timeout=60.0,
+                    timeout=deadline_timeout(60.0),
                 )
+                await provider_limiter.record("gigachat:chat", response.status_code)
 
-                if response.status_code == 401:
-                    self.access_token = None
-                    await self._ensure_token()
-                    headers["Authorization"] = f"Bearer {self.access_token}"
-
-                    response = await client.post(
-                        f"{self.BASE_URL}/chat/completions",
-                        headers=headers,
-                        json=payload,
-                        timeout=60.0,
-                    )
+            response.raise_for_status()
+            result = response.json()
 
-                response.raise_for_status()
-                result = response.json()
+            generated_text = result["choices"][0]["message"]["content"]
 
-                generated_text = result["choices"][0]["message"]["content"]
+            accepted = max_length is None or len(generated_text.strip()) <= max_length
 
-                if use_history:
-                    self.conversation_history.append(
-                        {"role": "user", "content": prompt}
-                    )
-                    self.conversation_history.append(
-                        {"role": "assistant", "content": generated_text}
-                    )
+            if context is not None and accepted:
+                context.add_exchange(prompt, generated_text.strip())
 
-                    if len(self.conversation_history) > 20:
-                        self.conversation_history = self.conversation_history[-20:]
+            if use_cache and accepted:
+                await completion_cache.set(payload, generated_text)
 
-                return generated_text
+            return generated_text
 
-            except httpx.HTTPStatusError as e:
-                error_detail = ""
-                try:
-                    error_detail = e.response.json()
-                except ValueError:
-                    error_detail = e.response.text
-                raise Exception(f"HTTP {e.response.status_code}: {error_detail}")
+        except httpx.HTTPStatusError as e:
+            error_detail = ""
+            try:
+                error_detail = e.response.json()
+            except ValueError:
+                error_detail = e.response.text
+            raise Exception(f"HTTP {e.response.status_code}: {error_detail}") from e
 
     @ensure_text_length()
-    @with_retry
     async def generate_text(
         self,
         prompt: str,
@@ -273,6 +373,7 @@ class GigaChatModel:
         use_history: bool = False,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        cache: Optional[str] = None,
     ) -> str:
         """
         Генерация текста с проверкой длины (максимум 1024 символа)
@@ -283,6 +384,7 @@ class GigaChatModel:
             use_history: Использовать ли историю диалога
             temperature: Температура генерации (креативность)
             max_tokens: Максимальное количество токенов
+            cache: Имя места вызова для кэширования ответа (None — без кэша)
 
         Returns:
             Сгенерированный текст
@@ -293,8 +395,129 @@ class GigaChatModel:
             use_history=use_history,
             temperature=temperature,
             max_tokens=max_tokens,
+            cache=cache,
+            max_length=MAX_TEXT_LENGTH,
         )
 
+    async def stream_text(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        use_history: bool = False,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        max_length: Optional[int] = None,
+        cache: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Потоковая генерация текста (SSE, stream=true)
+
+        Args:
+            prompt: Запрос пользователя
+            system_prompt: Системный промпт для настройки поведения
+            use_history: Использовать ли историю диалога
+            temperature: Температура генерации (креативность)
+            max_tokens: Максимальное количество токенов
+            max_length: Ответ длиннее не попадает в историю диалога и кэш
+            cache: Имя места вызова для кэширования ответа (None — без кэша).
+                Ключ тот же, что у _generate_text_raw: ответ из кэша выдаётся
+                одним фрагментом, полный ответ потока сохраняется в кэш.
+
+        Yields:
+            Очередной фрагмент сгенерированного текста
+        """
+        messages = []
+
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+
+        context = get_generation_context() if use_history else None
+        if context and context.history:
+            messages.extend(context.history)
+
+        messages.append({"role": "user", "content": prompt})
+
+        payload = {
+            "model": settings.GIGACHAT_MODEL,
+            "messages": messages,
+            "temperature": (
+                temperature if temperature is not None else settings.AI_TEMPERATURE
+            ),
+            "max_tokens": max_tokens or settings.AI_MAX_TOKENS,
+            "repetition_penalty": 1.1,
+            "stream": True,
+        }
+
+        use_cache = cache is not None and not use_history
+        if use_cache:
+            cached = await completion_cache.get(cache, payload)
+            if cached is not None:
+                yield cached
+                return
+
+        access_token = await self._ensure_token()
+
+        client = self._get_client()
+        for attempt in range(2):
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream",
+            }
+
+            try:
+                await provider_limiter.acquire("gigachat:chat")
+                async with client.stream(
+                    "POST",
+                    f"{self.BASE_URL}/chat/completions",
+                    headers=headers,
+                    json=payload,
+                    timeout=deadline_timeout(60.0),
+                ) as response:
+                    await provider_limiter.record("gigachat:chat", response.status_code)
+                    if response.status_code == 401 and attempt == 0:
+                        self.token_manager.invalidate(access_token)
+                        access_token = await self._ensure_token()
+                        continue
+
+                    if response.is_error:
+                        await response.aread()
+                        response.raise_for_status()
+
+                    generated_text = ""
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+
+                        data = line[len("data:") :].strip()
+                        if data == "[DONE]":
+                            break
+
+                        chunk = json.loads(data)
+                        choices = chunk.get("choices") or [{}]
+                        delta = choices[0].get("delta", {}).get("content")
+                        if delta:
+                            generated_text += delta
+                            yield delta
+
+                    generated_text = generated_text.strip()
+                    accepted = bool(generated_text) and (
+                        max_length is None or len(generated_text) <= max_length
+                    )
+                    if context is not None and accepted:
+                        context.add_exchange(prompt, generated_text)
+                    if use_cache and accepted:
+                        await completion_cache.set(payload, generated_text)
+                    return
+
+            except httpx.HTTPStatusError as e:
+                error_detail = ""
+                try:
+                    error_detail = e.response.json()
+                except ValueError:
+                    error_detail = e.response.text
+                raise Exception(f"HTTP {e.response.status_code}: {error_detail}") from e
+
     @with_retry
     async def generate_image(
         self,
@@ -315,10 +538,10 @@ class GigaChatModel:
         Returns:
             Байты изображения
         """
-        await self._ensure_token()
+        access_token = await self._ensure_token()
 
         headers = {
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json",
         }
 
@@ -337,59 +560,64 @@ class GigaChatModel:
             "height": height,
         }
 
-        async with httpx.AsyncClient(**self._get_httpx_client_kwargs()) as client:
-            try:
+        client = self._get_client()
+        try:
+            await provider_limiter.acquire("gigachat:image")
+            response = await client.post(
+                f"{self.BASE_URL}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=deadline_timeout(120.0),
+            )
+
+            if response.status_code == 401:
+                self.token_manager.invalidate(access_token)
+                access_token = await self._ensure_token()
+                headers["Authorization"] = f"Bearer {access_token}"
+
                 response = await client.post(
                     f"{self.BASE_URL}/chat/completions",
                     headers=headers,
                     json=payload,
-                    timeout=120.0,
+                    timeout=deadline_timeout(120.0),
                 )
 
-                if response.status_code == 401:
-                    self.access_token = None
-                    await self._ensure_token()
-                    headers["Authorization"] = f"Bearer {self.access_token}"
-
-                    response = await client.post(
-                        f"{self.BASE_URL}/chat/completions",
-                        headers=headers,
-                        json=payload,
-                        timeout=120.0,
-                    )
-
-                response.raise_for_status()
-                result = response.json()
+            await provider_limiter.record("gigachat:image", response.status_code)
+            response.raise_for_status()
+            result = response.json()
 
-                content = result["choices"][0]["message"]["content"]
+            content = result["choices"][0]["message"]["content"]
 
-                import re
+            import re
 
-                file_id_match = re.search(r'<img.*?src="([^"]+)"', content)
-                if not file_id_match:
-                    raise ValueError("Не удалось получить file_id изображения")
+            file_id_match = re.search(r'<img.*?src="([^"]+)"', content)
+            if not file_id_match:
+                raise ValueError("Не удалось получить file_id изображения")
 
-                file_id = file_id_match.group(1)
+            file_id = file_id_match.group(1)
 
-                image_response = await client.get(
-                    f"{self.BASE_URL}/files/{file_id}/content",
-                    headers=headers,
-                    timeout=60.0,
-                )
-                image_response.raise_for_status()
+            image_response = await client.get(
+                f"{self.BASE_URL}/files/{file_id}/content",
+                headers=headers,
+                timeout=deadline_timeout(60.0),
+            )
+            image_response.raise_for_status()
 
-                return image_response.content
+            return image_response.content
 
-            except httpx.HTTPStatusError as e:
-                error_detail = ""
-                try:
-                    error_detail = e.response.json()
-                except ValueError:
-                    error_detail = e.response.text
-                raise Exception(f"HTTP {e.response.status_code}: {error_detail}")
+        except httpx.HTTPStatusError as e:
+            error_detail = ""
+            try:
+                error_detail = e.response.json()
+            except ValueError:
+                error_detail = e.response.text
+            raise Exception(f"HTTP {e.response.status_code}: {error_detail}") from e
 
     def clear_history(self):
-        self.conversation_history = []
+        context = get_generation_context()
+        if context is not None:
+            context.history.clear()
 
     def get_history(self) -> List[Dict[str, str]]:
-        return self.conversation_history.copy()
+        context = get_generation_context()
+        return context.history.copy() if context else []
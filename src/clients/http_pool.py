@@ -0,0 +1,134 @@
+import logging
+import ssl
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+import httpx
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConnectionStats:
+    """Счётчики использования соединений одного клиента"""
+
+    requests: int = 0
+    connections_opened: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        return max(0, self.requests - self.connections_opened)
+
+    @property
+    def reuse_ratio(self) -> float:
+        if not self.requests:
+            return 0.0
+        return self.connections_reused / self.requests
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": round(self.reuse_ratio, 3),
+        }
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HTTPClientPool:
+    """
+    Общий пул долгоживущих httpx.AsyncClient для внешних AI-сервисов.
+
+    Для каждого сервиса создаётся один клиент с keep-alive, поэтому
+    TCP+TLS рукопожатие выполняется один раз, а не на каждый запрос.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, ConnectionStats] = {}
+
+    def _build_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+        )
+
+    def _use_http2(self) -> bool:
+        if not settings.HTTP2_ENABLED:
+            return False
+        if not _http2_available():
+            logger.warning(
+                "HTTP/2 включён, но пакет h2 не установлен: используем HTTP/1.1"
+            )
+            return False
+        return True
+
+    def get_client(
+        self, name: str, verify: Union[ssl.SSLContext, bool]
+    ) -> httpx.AsyncClient:
+        """
+        Возвращает клиент сервиса, создавая его при первом обращении
+
+        Args:
+            name: Имя сервиса (например, "gigachat" или "salute")
+            verify: SSL контекст или флаг проверки сертификатов
+
+        Returns:
+            Общий httpx.AsyncClient
+        """
+        client = self._clients.get(name)
+        if client is not None and not client.is_closed:
+            return client
+
+        stats = self._stats.setdefault(name, ConnectionStats())
+
+        async def on_connection_event(event_name: str, info: dict) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                stats.connections_opened += 1
+
+        async def on_request(request: httpx.Request) -> None:
+            stats.requests += 1
+            request.extensions["trace"] = on_connection_event
+
+        http2 = self._use_http2()
+        client = httpx.AsyncClient(
+            verify=verify,
+            http2=http2,
+            limits=self._build_limits(),
+            event_hooks={"request": [on_request]},
+        )
+        self._clients[name] = client
+        logger.info(f"HTTP клиент '{name}' создан (http2={http2})")
+        return client
+
+    def get_stats(self, name: Optional[str] = None) -> dict:
+        """Статистика переиспользования соединений по сервисам"""
+        if name is not None:
+            return self._stats.get(name, ConnectionStats()).as_dict()
+        return {key: stats.as_dict() for key, stats in self._stats.items()}
+
+    async def close(self):
+        """Закрытие всех клиентов пула"""
+        for name, client in self._clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия HTTP клиента '{name}': {e}")
+            else:
+                logger.info(
+                    f"HTTP клиент '{name}' закрыт: {self._stats[name].as_dict()}"
+                )
+        self._clients.clear()
+
+
+http_pool = HTTPClientPool()
@@ -5,7 +5,11 @@ import base64
 import uuid
 from typing import Optional
 from pathlib import Path
+from src.clients.http_pool import http_pool
+from src.clients.token_manager import OAuthTokenManager
 from src.config import settings
+from src.services.deadline import deadline_timeout
+from src.services.provider_limiter import provider_limiter
 from src.services.service_decorators import with_retry
 
 logger = logging.getLogger(__name__)
@@ -18,8 +22,9 @@ class SaluteSpeechModel:
     BASE_URL = "https://smartspeech.sber.ru/rest/v1"
 
     def __init__(self):
-        self.access_token: Optional[str] = None
-        self.token_expires_at: float = 0
+        self.token_manager = OAuthTokenManager(
+            name="Salute", fetch_token=self._get_auth_token, default_ttl=29 * 60
+        )
 
         src_root = Path(__file__).resolve().parent.parent
         certificates_dir = src_root / "assets" / "certificates"
@@ -50,8 +55,24 @@ class SaluteSpeechModel:
             logger.warning("Salute: Использование verify=False (сертификат недоступен)")
             return {"verify": False}
 
+    def _get_client(self) -> httpx.AsyncClient:
+        """Общий долгоживущий клиент Salute Speech из пула соединений"""
+        return http_pool.get_client("salute", **self._get_httpx_client_kwargs())
+
+    async def start(self):
+        """Подготовка долгоживущего HTTP клиента при запуске бота"""
+        if self.ssl_context is None:
+            # Сертификат мог появиться после импорта (setup_certificates)
+            self.ssl_context = self._create_ssl_context()
+        self._get_client()
+        await self.token_manager.start()
+
+    async def stop(self):
+        """Остановка фонового обновления токена"""
+        await self.token_manager.stop()
+
     @with_retry
-    async def _get_auth_token(self) -> str:
+    async def _get_auth_token(self) -> dict:
         """Получение токена авторизации с retry"""
         auth_string = f"{settings.SALUTE_CLIENT_ID}:{settings.SALUTE_CLIENT_SECRET}"
         auth_encoded = base64.b64encode(auth_string.encode()).decode()
@@ -65,13 +86,12 @@ class SaluteSpeechModel:
         data = {"scope": settings.SALUTE_SCOPE}
 
         try:
-            async with httpx.AsyncClient(**self._get_httpx_client_kwargs()) as client:
-                response = await client.post(
-                    self.AUTH_URL, headers=headers, data=data, timeout=30.0
-                )
-                response.raise_for_status()
-                token_data = response.json()
-                return token_data["access_token"]
+            client = self._get_client()
+            response = await client.post(
+                self.AUTH_URL, headers=headers, data=data, timeout=30.0
+            )
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPStatusError as e:
             error_detail = ""
             try:
@@ -82,18 +102,14 @@ class SaluteSpeechModel:
                 logger.error(error_detail)
             raise Exception(
                 f"Ошибка авторизации Salute: HTTP {e.response.status_code}: {error_detail}"
-            )
+            ) from e
         except Exception as e:
             logger.error(e)
-            raise Exception(f"Ошибка получения токена Salute: {str(e)}")
-
-    async def _ensure_token(self):
-        """Проверка и обновление токена при необходимости"""
-        import time
+            raise Exception(f"Ошибка получения токена Salute: {str(e)}") from e
 
-        if not self.access_token or time.time() >= (self.token_expires_at - 60):
-            self.access_token = await self._get_auth_token()
-            self.token_expires_at = time.time() + (29 * 60)
+    async def _ensure_token(self) -> str:
+        """Получение действующего токена (обновляется единым запросом)"""
+        return await self.token_manager.get_token()
 
     @with_retry
     async def transcribe_audio(
@@ -109,10 +125,10 @@ class SaluteSpeechModel:
         Returns:
             Распознанный текст
         """
-        await self._ensure_token()
+        access_token = await self._ensure_token()
 
         headers = {
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {access_token}",
         }
 
         mime_types = {
@@ -129,34 +145,41 @@ class SaluteSpeechModel:
         params = {"format": audio_format if audio_format != "opus" else "ogg_opus"}
 
         try:
-            async with httpx.AsyncClient(**self._get_httpx_client_kwargs()) as client:
+            client = self._get_client()
+            await provider_limiter.acquire("salute:recognition")
+            response = await client.post(
+                f"{self.BASE_URL}/speech:recognize",
+                headers=headers,
+                params=params,
+                content=audio_data,
+                timeout=deadline_timeout(60.0),
+            )
+            await provider_limiter.record("salute:recognition", response.status_code)
+
+            if response.status_code == 401:
+                self.token_manager.invalidate(access_token)
+                access_token = await self._ensure_token()
+                headers["Authorization"] = f"Bearer {access_token}"
+
+                # Повтор — отдельный запрос к API и отдельный слот бюджета
+                await provider_limiter.acquire("salute:recognition")
                 response = await client.post(
                     f"{self.BASE_URL}/speech:recognize",
                     headers=headers,
                     params=params,
                     content=audio_data,
-                    timeout=60.0,
+                    timeout=deadline_timeout(60.0),
+                )
+                await provider_limiter.record(
+                    "salute:recognition", response.status_code
                 )
 
-                if response.status_code == 401:
-                    self.access_token = None
-                    await self._ensure_token()
-                    headers["Authorization"] = f"Bearer {self.access_token}"
-
-                    response = await client.post(
-                        f"{self.BASE_URL}/speech:recognize",
-                        headers=headers,
-                        params=params,
-                        content=audio_data,
-                        timeout=60.0,
-                    )
-
-                response.raise_for_status()
-                result = response.json()
+            response.raise_for_status()
+            result = response.json()
 
-                res_arr = result.get("result", [])
-                text_res = " ".join(res_arr)
-                return text_res
+            res_arr = result.get("result", [])
+            text_res = " ".join(res_arr)
+            return text_res
 
         except httpx.HTTPStatusError as e:
             error_detail = ""
@@ -166,7 +189,7 @@ class SaluteSpeechModel:
                 error_detail = e.response.text
             raise Exception(
                 f"Ошибка транскрибации: HTTP {e.response.status_code}: {error_detail}"
-            )
+            ) from e
 
     async def transcribe_from_file(
         self, file_path: str, audio_format: Optional[str] = None
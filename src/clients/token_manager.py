@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Токен считается просроченным чуть раньше, чем об этом скажет сервер
+EXPIRY_LEEWAY_SECONDS = 60
+# Пауза перед повторной попыткой фонового обновления после ошибки
+REFRESH_RETRY_SECONDS = 10
+
+
+class OAuthTokenManager:
+    """
+    Менеджер OAuth токена Сбера.
+
+    Одновременные запросы на обновление объединяются в один HTTP запрос,
+    срок жизни берётся из `expires_at` ответа сервера, а фоновая задача
+    обновляет токен заранее, чтобы пользовательские запросы не ждали авторизацию.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch_token: Callable[[], Awaitable[Dict[str, Any]]],
+        default_ttl: int,
+        refresh_margin: Optional[int] = None,
+    ):
+        self.name = name
+        self._fetch_token = fetch_token
+        self._default_ttl = default_ttl
+        self._refresh_margin = (
+            refresh_margin
+            if refresh_margin is not None
+            else settings.TOKEN_REFRESH_MARGIN
+        )
+
+        self._access_token: Optional[str] = None
+        self._expires_at: float = 0
+        self._inflight: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    def _is_valid(self) -> bool:
+        return bool(self._access_token) and time.time() < (
+            self._expires_at - EXPIRY_LEEWAY_SECONDS
+        )
+
+    def _parse_expires_at(self, token_data: Dict[str, Any]) -> float:
+        """Время истечения токена (unix timestamp в секундах)"""
+        expires_at = token_data.get("expires_at")
+        if expires_at:
+            try:
+                value = float(expires_at)
+            except (TypeError, ValueError):
+                value = 0
+            if value > 1e12:
+                # Сбер возвращает expires_at в миллисекундах
+                value /= 1000
+            if value > time.time():
+                return value
+
+        logger.warning(
+            f"{self.name}: expires_at не получен, используем TTL {self._default_ttl}с"
+        )
+        return time.time() + self._default_ttl
+
+    async def _fetch(self) -> str:
+        token_data = await self._fetch_token()
+        self._access_token = token_data["access_token"]
+        self._expires_at = self._parse_expires_at(token_data)
+        logger.info(
+            f"{self.name}: токен обновлён, истекает через "
+            f"{int(self._expires_at - time.time())}с"
+        )
+        return self._access_token
+
+    @staticmethod
+    def _consume_exception(task: asyncio.Task) -> None:
+        if not task.cancelled():
+            task.exception()
+
+    async def refresh(self) -> str:
+        """Обновление токена; параллельные вызовы ждут один общий запрос"""
+        if self._inflight is None or self._inflight.done():
+            # Пустой контекст: общий запрос не наследует срок и бюджет повторов
+            # первого вызвавшего пользователя
+            self._inflight = asyncio.create_task(
+                self._fetch(), context=contextvars.Context()
+            )
+            self._inflight.add_done_callback(self._consume_exception)
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(self._inflight)
+
+    async def get_token(self) -> str:
+        """Действующий токен; при необходимости обновляется"""
+        if self._is_valid():
+            return self._access_token
+        return await self.refresh()
+
+    def invalidate(self, token: Optional[str]) -> None:
+        """
+        Помечает токен недействительным (например, после ответа 401).
+
+        Сбрасывается только тот токен, с которым пришла ошибка, поэтому
+        поздние 401 не вызывают повторных обновлений уже нового токена.
+        """
+        if token is not None and token == self._access_token:
+            self._access_token = None
+            self._expires_at = 0
+
+    async def start(self) -> None:
+        """Прогрев токена и запуск фонового обновления"""
+        try:
+            await self.get_token()
+        except Exception as e:
+            logger.error(f"{self.name}: не удалось получить токен при запуске: {e}")
+
+        if self._background_task is None or self._background_task.done():
+            self._background_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """Остановка фонового обновления"""
+        for task in (self._background_task, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._background_task = None
+        self._inflight = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            if self._access_token:
+                delay = self._expires_at - self._refresh_margin - time.time()
+            else:
+                delay = 0
+            await asyncio.sleep(max(delay, 1))
+
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"{self.name}: фоновое обновление токена не удалось: {e}"
+                )
+                await asyncio.sleep(REFRESH_RETRY_SECONDS)
@@ -55,9 +55,14 @@ class Settings(BaseSettings):
     SALUTE_CLIENT_SECRET: str = ""
     SALUTE_SCOPE: str = "SALUTE_SPEECH_PERS"
 
-    # User operations limit
+    # User operations budget per window, in operation cost units
     USER_OPERATIONS_LIMIT: int = int(1)
     USER_OPERATIONS_WINDOW: int = int(360)
+    # For the "gcra" algorithm: operations allowed in a row (0 = USER_OPERATIONS_LIMIT)
+    USER_OPERATIONS_BURST: int = int(0)
+
+    # Rate limiter algorithm: "sliding_window" or "gcra"
+    RATE_LIMIT_ALGORITHM: str = "sliding_window"
 
     # Inactivity timeout for groups
     INACTIVITY_TIMEOUT: int = int(15)
@@ -66,6 +71,76 @@ class Settings(BaseSettings):
     MAX_RETRIES: int = int(3)
     RETRY_MIN_WAIT: int = int(1)
     RETRY_MAX_WAIT: int = int(10)
+    # Total retries allowed for one user request across nested calls
+    RETRY_BUDGET: int = int(3)
+
+    # HTTP connection pool for AI clients
+    HTTP_POOL_MAX_CONNECTIONS: int = int(20)
+    HTTP_POOL_MAX_KEEPALIVE: int = int(10)
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP2_ENABLED: bool = False
+
+    # Streaming: minimal interval between Telegram message edits (seconds)
+    STREAM_EDIT_INTERVAL: float = 1.5
+
+    # Completion cache for repeated GigaChat requests
+    COMPLETION_CACHE_ENABLED: bool = True
+    COMPLETION_CACHE_TTL: int = int(3600)
+    COMPLETION_CACHE_MAX_ENTRIES: int = int(1000)
+
+    # Generation scheduler: max simultaneous GigaChat generations
+    GENERATION_MAX_CONCURRENT: int = int(8)
+    # Time budget for one generation flow, all API calls included (seconds)
+    TEXT_GENERATION_DEADLINE: int = int(120)
+    IMAGE_GENERATION_DEADLINE: int = int(300)
+
+    # Conversation memory for post editing flows
+    CONVERSATION_TTL: int = int(86400)
+    CONVERSATION_MAX_TOKENS: int = int(1500)
+    CONVERSATION_SUMMARIZE: bool = True
+
+    # Cache of GigaChat image uploads and analyses (by image SHA-256)
+    IMAGE_ANALYSIS_CACHE_ENABLED: bool = True
+    IMAGE_ANALYSIS_CACHE_TTL: int = int(86400)
+    GIGACHAT_FILES_CLEANUP_INTERVAL: int = int(3600)
+
+    # Pillow rendering executor: "process", "thread" or "inline"
+    IMAGE_EXECUTOR: str = "process"
+    IMAGE_EXECUTOR_WORKERS: int = int(2)
+
+    # Output image encoding: "JPEG" or "WEBP", quality range and size budget
+    IMAGE_OUTPUT_FORMAT: str = "JPEG"
+    IMAGE_OUTPUT_QUALITY: int = int(90)
+    IMAGE_OUTPUT_MIN_QUALITY: int = int(60)
+    IMAGE_OUTPUT_MAX_BYTES: int = int(2 * 1024 * 1024)
+
+    # Normalisation of user images before upload to GigaChat for analysis
+    IMAGE_ANALYSIS_MAX_SIDE: int = int(1024)
+    IMAGE_ANALYSIS_MAX_PIXELS: int = int(50_000_000)
+    IMAGE_ANALYSIS_QUALITY: int = int(85)
+
+    # Telegram file download cache (memory budget, get_file link TTL, disk spill)
+    TELEGRAM_FILE_CACHE_MAX_BYTES: int = int(64 * 1024 * 1024)
+    TELEGRAM_FILE_PATH_TTL: int = int(3000)
+    TELEGRAM_FILE_CACHE_DIR: str = ""
+    TELEGRAM_FILE_CACHE_DISK_MAX_BYTES: int = int(512 * 1024 * 1024)
+
+    # Provider request budgets shared by all bot replicas (requests per minute)
+    PROVIDER_LIMIT_ENABLED: bool = True
+    GIGACHAT_CHAT_RPM: int = int(60)
+    GIGACHAT_IMAGE_RPM: int = int(10)
+    GIGACHAT_FILES_RPM: int = int(30)
+    SALUTE_RECOGNITION_RPM: int = int(30)
+
+    # User access cache: Redis TTL and in-process TTL (seconds)
+    USER_ACCESS_CACHE_TTL: int = int(300)
+    USER_ACCESS_LOCAL_TTL: int = int(10)
+
+    # Log handlers that hold a DB connection longer than this (seconds)
+    DB_SESSION_HOLD_WARNING: int = int(5)
+
+    # OAuth token refresh (seconds before expiry)
+    TOKEN_REFRESH_MARGIN: int = int(300)
 
 
 settings = Settings()
@@ -0,0 +1,156 @@
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LazySession:
+    """
+    AsyncSession, которая создаётся при первом обращении.
+
+    Соединение берётся из пула только при первом запросе к БД и возвращается
+    после commit/rollback. release() отдаёт соединение, если транзакция
+    только читала данные, — так долгий вызов API не держит соединение.
+    Время удержания соединений накапливается в hold_time.
+    """
+
+    def __init__(self, factory: async_sessionmaker):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+        self._checked_out_at: Optional[float] = None
+        self._has_writes = False
+
+        self.checkouts = 0
+        self.hold_time = 0.0
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+            sync_session = self._session.sync_session
+            event.listen(sync_session, "after_begin", self._on_begin)
+            event.listen(sync_session, "after_flush", self._on_flush)
+            event.listen(
+                sync_session, "after_transaction_end", self._on_transaction_end
+            )
+        return self._session
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+    def _on_begin(self, session, transaction, connection) -> None:
+        if self._checked_out_at is None:
+            self._checked_out_at = time.monotonic()
+            self.checkouts += 1
+
+    def _on_flush(self, session, flush_context) -> None:
+        self._has_writes = True
+
+    def _on_transaction_end(self, session, transaction) -> None:
+        if transaction.parent is not None or self._checked_out_at is None:
+            return
+        self.hold_time += time.monotonic() - self._checked_out_at
+        self._checked_out_at = None
+        self._has_writes = False
+
+    async def release(self) -> bool:
+        """
+        Возвращает соединение в пул, если в транзакции не было изменений.
+
+        Загруженные объекты остаются доступны (expire_on_commit=False),
+        следующий запрос возьмёт соединение заново.
+        """
+        session = self._session
+        if session is None or not session.in_transaction():
+            return False
+        if self._has_writes or session.new or session.dirty or session.deleted:
+            return False
+        await session.commit()
+        return True
+
+    async def rollback(self) -> None:
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+_current_session: ContextVar[Optional[LazySession]] = ContextVar(
+    "current_session", default=None
+)
+
+
+def set_current_session(session: Optional[LazySession]):
+    return _current_session.set(session)
+
+
+def reset_current_session(token) -> None:
+    _current_session.reset(token)
+
+
+async def release_session_connection() -> None:
+    """Отдаёт соединение сессии текущего обновления перед долгим вызовом"""
+    session = _current_session.get()
+    if session is None:
+        return
+    try:
+        await session.release()
+    except Exception as e:
+        logger.warning(f"Не удалось освободить соединение с БД: {e}")
+
+
+class SessionStats:
+    """Время удержания соединений с БД по обработчикам"""
+
+    def __init__(self):
+        self.updates: Dict[str, int] = defaultdict(int)
+        self.sessions: Dict[str, int] = defaultdict(int)
+        self.checkouts: Dict[str, int] = defaultdict(int)
+        self.hold_time: Dict[str, float] = defaultdict(float)
+        self.max_hold_time: Dict[str, float] = defaultdict(float)
+
+    def record(self, handler_name: str, session: LazySession) -> None:
+        self.updates[handler_name] += 1
+        if not session.opened:
+            return
+
+        self.sessions[handler_name] += 1
+        self.checkouts[handler_name] += session.checkouts
+        self.hold_time[handler_name] += session.hold_time
+        self.max_hold_time[handler_name] = max(
+            self.max_hold_time[handler_name], session.hold_time
+        )
+        if session.hold_time >= settings.DB_SESSION_HOLD_WARNING:
+            logger.warning(
+                f"Обработчик {handler_name} держал соединение с БД "
+                f"{session.hold_time:.2f} с"
+            )
+
+    def get_stats(self) -> dict:
+        return {
+            name: {
+                "updates": updates,
+                "sessions": self.sessions[name],
+                "checkouts": self.checkouts[name],
+                "hold_time": round(self.hold_time[name], 3),
+                "max_hold_time": round(self.max_hold_time[name], 3),
+            }
+            for name, updates in self.updates.items()
+        }
+
+
+session_stats = SessionStats()
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import logging
+
+from src.services.image_analysis_cache import image_analysis_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+async def cleanup_gigachat_files_job() -> None:
+    """
+    Удаляет из хранилища GigaChat изображения, ссылки на которые
+    уже истекли в кэше анализа изображений.
+    """
+    # Ленивая загрузка, чтобы не создавать клиентов AI при импорте задач.
+    from src.services.ai_manager import ai_manager  # noqa: WPS433
+
+    stale_files = await image_analysis_cache.pop_stale_files()
+    deleted = 0
+    for file_id in stale_files:
+        try:
+            await ai_manager.gigachat.delete_file(file_id)
+            deleted += 1
+        except Exception as e:
+            logger.warning("Failed to delete GigaChat file %s: %s", file_id, e)
+
+    if stale_files:
+        logger.info("Deleted %s of %s stale GigaChat files", deleted, len(stale_files))
@@ -2,7 +2,9 @@ import asyncio
 import logging
 
 from src.bot import bot, dp, setup_bot
+from src.config import settings
 from src.db.database import engine
+from src.jobs.gigachat_files_jobs import cleanup_gigachat_files_job
 from src.jobs.scheduler import init_scheduler
 from src.utils.setup_certificates import setup_certificates
 
@@ -11,6 +13,13 @@ async def main():
     setup_certificates()
 
     scheduler = init_scheduler(engine)
+    scheduler.add_job(
+        cleanup_gigachat_files_job,
+        trigger="interval",
+        seconds=settings.GIGACHAT_FILES_CLEANUP_INTERVAL,
+        id="cleanup_gigachat_files",
+        replace_existing=True,
+    )
 
     await setup_bot()
 
@@ -1,14 +1,38 @@
-from typing import Optional
+import logging
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.clients.gigachat import GigaChatModel
+from src.clients.http_pool import http_pool
 from src.clients.salute import SaluteSpeechModel
+from src.config import settings
+from src.db.session import release_session_connection
+from .completion_cache import completion_cache
 from .content_generator import ContentGenerator
+from .conversation_memory import conversation_memory
+from .deadline import DeadlineExceeded, deadline_scope
+from .generation_context import (
+    GenerationContext,
+    generation_context,
+    get_generation_context,
+)
+from .generation_scheduler import GenerationScheduler
+from .image_executor import image_executor
 from .image_generator import ImageGenerator
 from .nko import NKOService
+from .operation_cost import charge_operation, refund_operation, reserve_operation
+from .provider_limiter import provider_limiter
+from .service_decorators import MAX_TEXT_LENGTH, get_retry_stats
 from .text_overlay import TextOverlayConfig, TextOverlayService
 
+logger = logging.getLogger(__name__)
+
+
+class FinalText(str):
+    """Полный текст, заменяющий уже выданные фрагменты потока"""
+
 
 class AIManager:
     def __init__(self):
@@ -19,16 +43,122 @@ class AIManager:
         self.image_generator = ImageGenerator(
             self.gigachat, text_overlay_service=text_overlay_service
         )
+        self.scheduler = GenerationScheduler(
+            max_concurrent=settings.GENERATION_MAX_CONCURRENT
+        )
+
+    @asynccontextmanager
+    async def _generation(
+        self, user_id: Optional[int], kind: str, operation: str
+    ) -> AsyncIterator[None]:
+        """
+        Слот генерации, общий срок на все вызовы API внутри него
+        и собственный контекст запроса (профиль НКО, история диалога).
+        Отсчёт срока начинается после выхода из очереди. Перед генерацией
+        резервируется единица лимита пользователя (OperationLimitExceeded,
+        если лимит исчерпан); при успешном завершении стоимость операции
+        учитывается в лимите, при любом другом выходе (ошибка, отмена,
+        закрытый поток) резерв возвращается.
+        Соединение с БД на время ожидания и генерации возвращается в пул.
+        """
+        await release_session_connection()
+        reservation_id = (
+            await reserve_operation(user_id) if user_id is not None else None
+        )
+        seconds = (
+            settings.IMAGE_GENERATION_DEADLINE
+            if kind == "image"
+            else settings.TEXT_GENERATION_DEADLINE
+        )
+        completed = False
+        try:
+            async with self.scheduler.slot(user_id, kind):
+                with (
+                    deadline_scope(seconds),
+                    generation_context(GenerationContext(user_id=user_id)),
+                ):
+                    yield
+            completed = True
+            charge_operation(operation)
+        finally:
+            # Ошибка, отмена задачи или досрочно закрытый поток
+            if not completed and reservation_id is not None:
+                await refund_operation(user_id, reservation_id)
+
+    async def startup(self):
+        """Подготовка клиентов AI-сервисов при запуске бота"""
+        await self.gigachat.start()
+        await self.salute_speech.start()
+        await image_executor.start()
+
+    async def shutdown(self):
+        """Закрытие соединений с AI-сервисами"""
+        await self.gigachat.stop()
+        await self.salute_speech.stop()
+        await image_executor.stop()
+        await http_pool.close()
+
+    def get_connection_stats(self) -> dict:
+        """Статистика переиспользования HTTP соединений"""
+        return http_pool.get_stats()
+
+    def get_cache_stats(self) -> dict:
+        """Счётчики попаданий/промахов кэша ответов GigaChat"""
+        return completion_cache.get_stats()
+
+    def get_retry_stats(self) -> dict:
+        """Количество повторов запросов к AI-сервисам по методам"""
+        return get_retry_stats()
+
+    def get_image_executor_stats(self) -> dict:
+        """Время обработки изображений и задержки event loop"""
+        return image_executor.get_stats()
+
+    def get_provider_limit_stats(self) -> dict:
+        """Бюджеты запросов к GigaChat/Salute, ответы 429 и ожидания"""
+        return provider_limiter.get_stats()
+
+    def get_queue_position(self, user_id: int) -> Optional[int]:
+        """Позиция пользователя в очереди генерации (None — не ждёт)"""
+        return self.scheduler.get_position(user_id)
 
     # === МЕТОДЫ ДЛЯ РАБОТЫ С ТЕКСТОМ ===
 
+    async def _stream_with_fallback(
+        self,
+        stream: AsyncIterator[str],
+        fallback: Callable[[], Awaitable[str]],
+        max_length: Optional[int] = MAX_TEXT_LENGTH,
+    ) -> AsyncIterator[str]:
+        """
+        Фрагменты потока, а если поток оборвался или ответ пустой/длиннее
+        max_length — FinalText от обычного запроса с повторами.
+
+        Вызывается внутри _generation: повторный запрос идёт в том же слоте
+        и не списывает стоимость операции второй раз.
+        """
+        text = ""
+        try:
+            async with aclosing(stream) as chunks:
+                async for chunk in chunks:
+                    text += chunk
+                    yield chunk
+            text = text.strip()
+            if text and (max_length is None or len(text) <= max_length):
+                return
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Потоковая генерация не удалась, повторяем без потока: {e}")
+
+        yield FinalText(await fallback())
+
     async def _apply_ngo_context(self, session: AsyncSession, user_id: int) -> None:
+        """Загрузка профиля НКО в контекст текущего запроса"""
         nko_service = NKOService(session=session)
         ngo_info = await nko_service.get_data(user_id)
-        if ngo_info:
-            self.content_generator.set_ngo_info(ngo_info)
-        else:
-            self.content_generator.ngo_info = None
+        get_generation_context().ngo_info = ngo_info or None
+        await release_session_connection()
 
     async def generate_free_text_post(
         self,
@@ -39,12 +169,133 @@ class AIManager:
         additional_info: Optional[str] = None,
     ) -> str:
         """Генерация свободного текста поста"""
-        await self._apply_ngo_context(session=session, user_id=user_id)
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
+
+            return await self.content_generator.generate_free_text_post(
+                user_idea=user_idea, style=style, additional_info=additional_info
+            )
 
-        return await self.content_generator.generate_free_text_post(
-            user_idea=user_idea, style=style, additional_info=additional_info
+    async def stream_free_text_post(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        user_idea: str,
+        style: str = "разговорный",
+        additional_info: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Потоковая генерация свободного текста поста (фрагменты по мере готовности).
+        Если поток не удался, последним выдаётся FinalText с полным текстом.
+        """
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
+
+            async with aclosing(
+                self._stream_with_fallback(
+                    self.content_generator.stream_free_text_post(
+                        user_idea=user_idea,
+                        style=style,
+                        additional_info=additional_info,
+                    ),
+                    lambda: self.content_generator.generate_free_text_post(
+                        user_idea=user_idea,
+                        style=style,
+                        additional_info=additional_info,
+                    ),
+                )
+            ) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+
+    async def _load_post_history(
+        self, user_id: int, flow: str, current_post: str
+    ) -> None:
+        """
+        Загрузка истории правок поста в контекст запроса.
+        История обрезается до реплики с текущей версией поста; если такой нет
+        (история истекла или пост менялся в другом сценарии), начинается заново.
+        """
+        current_post = current_post.strip()
+        history = await conversation_memory.load(user_id, flow)
+
+        for index in range(len(history) - 1, -1, -1):
+            message = history[index]
+            if message["role"] == "assistant" and message["content"] == current_post:
+                history = history[: index + 1]
+                break
+        else:
+            history = [
+                {"role": "user", "content": "Подготовь пост для соцсети."},
+                {"role": "assistant", "content": current_post},
+            ]
+
+        get_generation_context().history = history
+
+    async def _save_post_history(self, user_id: int, flow: str) -> None:
+        await conversation_memory.save(
+            user_id,
+            flow,
+            get_generation_context().history,
+            summarize=self.content_generator.summarize_dialogue,
         )
 
+    async def revise_post(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        flow: str,
+        original_post: str,
+        edit_request: str,
+        style: str = "разговорный",
+    ) -> str:
+        """
+        Правка поста короткой инструкцией с учётом истории правок
+
+        Args:
+            flow: Сценарий, в рамках которого хранится история (например, "free_text")
+            original_post: Текущая версия поста
+            edit_request: Что нужно изменить
+        """
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
+            await self._load_post_history(user_id, flow, original_post)
+
+            updated_post = await self.content_generator.revise_post(
+                edit_request=edit_request, style=style
+            )
+            await self._save_post_history(user_id, flow)
+            return updated_post
+
+    async def stream_revise_post(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        flow: str,
+        original_post: str,
+        edit_request: str,
+        style: str = "разговорный",
+    ) -> AsyncIterator[str]:
+        """Потоковая правка поста с учётом истории правок"""
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
+            await self._load_post_history(user_id, flow, original_post)
+
+            async with aclosing(
+                self._stream_with_fallback(
+                    self.content_generator.stream_revise_post(
+                        edit_request=edit_request, style=style
+                    ),
+                    lambda: self.content_generator.revise_post(
+                        edit_request=edit_request, style=style
+                    ),
+                )
+            ) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+
+            await self._save_post_history(user_id, flow)
+
     async def generate_structured_post(
         self,
         user_id: int,
@@ -57,16 +308,17 @@ class AIManager:
         style: str = "разговорный",
     ) -> str:
         """Генерация структурированного поста"""
-        await self._apply_ngo_context(session=session, user_id=user_id)
-
-        return await self.content_generator.generate_structured_post(
-            event_type=event_type,
-            date=date,
-            location=location,
-            participants=participants,
-            details=details,
-            style=style,
-        )
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
+
+            return await self.content_generator.generate_structured_post(
+                event_type=event_type,
+                date=date,
+                location=location,
+                participants=participants,
+                details=details,
+                style=style,
+            )
 
     async def generate_structured_form_post(
         self,
@@ -84,20 +336,21 @@ class AIManager:
         additional_info: Optional[str] = None,
     ) -> str:
         """Генерация поста на основе структурированной формы (10 вопросов)"""
-        await self._apply_ngo_context(session=session, user_id=user_id)
-
-        return await self.content_generator.generate_structured_form_post(
-            event=event,
-            description=description,
-            goal=goal,
-            date=date,
-            location=location,
-            platform=platform,
-            audience=audience,
-            style=style,
-            length=length,
-            additional_info=additional_info,
-        )
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
+
+            return await self.content_generator.generate_structured_form_post(
+                event=event,
+                description=description,
+                goal=goal,
+                date=date,
+                location=location,
+                platform=platform,
+                audience=audience,
+                style=style,
+                length=length,
+                additional_info=additional_info,
+            )
 
     async def generate_post_from_example(
         self,
@@ -108,11 +361,12 @@ class AIManager:
         style: Optional[str] = None,
     ) -> str:
         """Генерация поста на основе примера"""
-        await self._apply_ngo_context(session=session, user_id=user_id)
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
 
-        return await self.content_generator.generate_post_from_example(
-            example_post=example_post, new_topic=new_topic, style=style
-        )
+            return await self.content_generator.generate_post_from_example(
+                example_post=example_post, new_topic=new_topic, style=style
+            )
 
     async def edit_post(
         self,
@@ -122,10 +376,41 @@ class AIManager:
         edit_request: str,
     ) -> tuple[str, list[str], list[str]]:
         """Редактирование поста на основе запроса пользователя"""
-        await self._apply_ngo_context(session=session, user_id=user_id)
-        return await self.content_generator.edit_post(
-            original_post=original_post, edit_request=edit_request
-        )
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
+            return await self.content_generator.edit_post(
+                original_post=original_post, edit_request=edit_request
+            )
+
+    async def stream_edit_post(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        original_post: str,
+        edit_request: str,
+    ) -> AsyncIterator[str]:
+        """Потоковое редактирование поста (сырые фрагменты ответа модели)"""
+        async with self._generation(user_id, "text", "text"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
+
+            async with aclosing(
+                self._stream_with_fallback(
+                    self.content_generator.stream_edit_post(
+                        original_post=original_post, edit_request=edit_request
+                    ),
+                    lambda: self.content_generator.generate_edit_response(
+                        original_post=original_post, edit_request=edit_request
+                    ),
+                    max_length=None,
+                )
+            ) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+
+    @staticmethod
+    def parse_edit_response(raw_response: str) -> tuple[str, list[str], list[str]]:
+        """Разбор ответа редактора на текст, ошибки и рекомендации"""
+        return ContentGenerator._parse_edit_response(raw_response)
 
     async def generate_content_plan(
         self,
@@ -136,13 +421,14 @@ class AIManager:
         preferences: Optional[str] = None,
     ) -> str:
         """Создание контент-плана"""
-        await self._apply_ngo_context(session=session, user_id=user_id)
+        async with self._generation(user_id, "text", "content_plan"):
+            await self._apply_ngo_context(session=session, user_id=user_id)
 
-        return await self.content_generator.generate_content_plan(
-            duration_days=duration_days,
-            posts_per_week=posts_per_week,
-            preferences=preferences,
-        )
+            return await self.content_generator.generate_content_plan(
+                duration_days=duration_days,
+                posts_per_week=posts_per_week,
+                preferences=preferences,
+            )
 
     # === МЕТОДЫ ДЛЯ РАБОТЫ С ИЗОБРАЖЕНИЯМИ ===
 
@@ -154,6 +440,7 @@ class AIManager:
         overlay_text: Optional[str] = None,
         overlay_font: Optional[str] = None,
         overlay_config: Optional[TextOverlayConfig] = None,
+        user_id: Optional[int] = None,
     ) -> bytes:
         """
         Генерация изображения
@@ -162,18 +449,20 @@ class AIManager:
             prompt: Промпт для генерации
             width: Ширина
             height: Высота
+            user_id: Пользователь (для очереди генерации)
 
         Returns:
             Байты изображения
         """
-        return await self.image_generator.generate_image(
-            prompt=prompt,
-            width=width,
-            height=height,
-            overlay_text=overlay_text,
-            overlay_font=overlay_font,
-            overlay_config=overlay_config,
-        )
+        async with self._generation(user_id, "image", "image"):
+            return await self.image_generator.generate_image(
+                prompt=prompt,
+                width=width,
+                height=height,
+                overlay_text=overlay_text,
+                overlay_font=overlay_font,
+                overlay_config=overlay_config,
+            )
 
     async def generate_image_from_post(
         self,
@@ -185,18 +474,20 @@ class AIManager:
         prepared_info_text: Optional[str] = None,
         overlay_font: Optional[str] = None,
         overlay_config: Optional[TextOverlayConfig] = None,
+        user_id: Optional[int] = None,
     ) -> bytes:
         """Генерация изображения на основе текста поста"""
-        return await self.image_generator.generate_image_from_post(
-            post_text=post_text,
-            image_description=image_description,
-            width=width,
-            height=height,
-            include_info_block=include_info_block,
-            prepared_info_text=prepared_info_text,
-            overlay_font=overlay_font,
-            overlay_config=overlay_config,
-        )
+        async with self._generation(user_id, "image", "image_from_post"):
+            return await self.image_generator.generate_image_from_post(
+                post_text=post_text,
+                image_description=image_description,
+                width=width,
+                height=height,
+                include_info_block=include_info_block,
+                prepared_info_text=prepared_info_text,
+                overlay_font=overlay_font,
+                overlay_config=overlay_config,
+            )
 
     async def edit_image(
         self,
@@ -204,6 +495,7 @@ class AIManager:
         edit_request: str,
         width: int = 1024,
         height: int = 1024,
+        user_id: Optional[int] = None,
     ) -> bytes:
         """
         Редактирование существующего изображения
@@ -213,16 +505,18 @@ class AIManager:
             edit_request: Описание требуемых изменений
             width: Ширина результата
             height: Высота результата
+            user_id: Пользователь (для очереди генерации)
 
         Returns:
             Байты отредактированного изображения
         """
-        return await self.image_generator.edit_image(
-            source_image_data=source_image_data,
-            edit_request=edit_request,
-            width=width,
-            height=height,
-        )
+        async with self._generation(user_id, "image", "image_edit"):
+            return await self.image_generator.edit_image(
+                source_image_data=source_image_data,
+                edit_request=edit_request,
+                width=width,
+                height=height,
+            )
 
     async def create_image_from_example(
         self,
@@ -230,6 +524,7 @@ class AIManager:
         creation_request: str,
         width: int = 1024,
         height: int = 1024,
+        user_id: Optional[int] = None,
     ) -> bytes:
         """
         Создание нового изображения на основе примера
@@ -239,25 +534,32 @@ class AIManager:
             creation_request: Описание того, что нужно создать
             width: Ширина результата
             height: Высота результата
+            user_id: Пользователь (для очереди генерации)
 
         Returns:
             Байты нового изображения
         """
-        return await self.image_generator.create_from_example(
-            example_image_data=example_image_data,
-            creation_request=creation_request,
-            width=width,
-            height=height,
-        )
+        async with self._generation(user_id, "image", "image_from_example"):
+            return await self.image_generator.create_from_example(
+                example_image_data=example_image_data,
+                creation_request=creation_request,
+                width=width,
+                height=height,
+            )
 
     # === МЕТОДЫ ДЛЯ РАБОТЫ С АУДИО ===
 
     async def transcribe_voice(
-        self, audio_data: bytes, audio_format: str = "opus"
+        self,
+        audio_data: bytes,
+        audio_format: str = "opus",
+        user_id: Optional[int] = None,
     ) -> str:
-        return await self.salute_speech.transcribe_audio(
-            audio_data=audio_data, audio_format=audio_format
-        )
+        """Распознавание голосового сообщения (в слоте генерации, как текст)"""
+        async with self._generation(user_id, "text", "voice"):
+            return await self.salute_speech.transcribe_audio(
+                audio_data=audio_data, audio_format=audio_format
+            )
 
     async def transcribe_voice_file(self, file_path: str) -> str:
         return await self.salute_speech.transcribe_from_file(file_path)
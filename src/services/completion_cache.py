@@ -0,0 +1,104 @@
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from src.config import settings
+from src.services.rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionCache:
+    """
+    Кэш ответов GigaChat в Redis для повторяющихся запросов.
+
+    Включается точечно: вызывающий код передаёт имя места вызова (`cache="edit_post"`),
+    по которому ведутся счётчики попаданий и промахов. Ключ — хэш канонического
+    JSON из модели, сообщений, температуры и max_tokens.
+    """
+
+    KEY_PREFIX = "completion_cache"
+    INDEX_KEY = "completion_cache:index"
+
+    def __init__(self):
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def make_key(cls, payload: Dict[str, Any]) -> str:
+        canonical = json.dumps(
+            {
+                "model": payload.get("model"),
+                "messages": payload.get("messages"),
+                "temperature": payload.get("temperature"),
+                "max_tokens": payload.get("max_tokens"),
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        digest = hashlib.sha256(canonical.encode()).hexdigest()
+        return f"{cls.KEY_PREFIX}:{digest}"
+
+    async def _get_redis(self):
+        if not rate_limiter.redis_client:
+            await rate_limiter.initialize()
+        return rate_limiter.redis_client
+
+    async def get(self, site: str, payload: Dict[str, Any]) -> Optional[str]:
+        """Ответ из кэша или None (ошибки Redis считаются промахом)"""
+        if not settings.COMPLETION_CACHE_ENABLED:
+            return None
+
+        try:
+            redis_client = await self._get_redis()
+            cached = await redis_client.get(self.make_key(payload))
+        except Exception as e:
+            logger.warning(f"Completion cache недоступен: {e}")
+            cached = None
+
+        if cached is None:
+            self.misses[site] += 1
+        else:
+            self.hits[site] += 1
+        return cached
+
+    async def set(self, payload: Dict[str, Any], value: str) -> None:
+        """Сохранение ответа с TTL и ограничением количества записей"""
+        if not settings.COMPLETION_CACHE_ENABLED or not value:
+            return
+
+        key = self.make_key(payload)
+        now = time.time()
+        ttl = settings.COMPLETION_CACHE_TTL
+
+        try:
+            redis_client = await self._get_redis()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(key, value, ex=ttl)
+                pipe.zadd(self.INDEX_KEY, {key: now})
+                pipe.zremrangebyscore(self.INDEX_KEY, 0, now - ttl)
+                pipe.zcard(self.INDEX_KEY)
+                *_, size = await pipe.execute()
+
+            overflow = size - settings.COMPLETION_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                evicted = await redis_client.zpopmin(self.INDEX_KEY, overflow)
+                if evicted:
+                    await redis_client.delete(*(member for member, _ in evicted))
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить ответ в completion cache: {e}")
+
+    def get_stats(self) -> dict:
+        """Счётчики попаданий и промахов по местам вызова"""
+        sites = set(self.hits) | set(self.misses)
+        return {
+            site: {"hits": self.hits[site], "misses": self.misses[site]}
+            for site in sorted(sites)
+        }
+
+
+completion_cache = CompletionCache()
@@ -1,15 +1,19 @@
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Optional, Dict, Any
 from src.clients.gigachat import GigaChatModel
+from src.services.generation_context import get_generation_context
+from src.services.service_decorators import MAX_TEXT_LENGTH
 
 
 class ContentGenerator:
     def __init__(self, gigachat_model: GigaChatModel):
         self.model = gigachat_model
-        self.ngo_info: Optional[Dict[str, Any]] = None
 
-    def set_ngo_info(self, ngo_info: Dict[str, Any]):
-        self.ngo_info = ngo_info
+    @property
+    def ngo_info(self) -> Optional[Dict[str, Any]]:
+        """Профиль НКО из контекста текущего запроса"""
+        context = get_generation_context()
+        return context.ngo_info if context else None
 
     def _build_ngo_context(self) -> str:
         """Формирование контекста об НКО для промпта"""
@@ -44,12 +48,13 @@ class ContentGenerator:
             return "\n".join(context_parts)
         return ""
 
-    async def generate_free_text_post(
+    def _build_free_text_post_prompts(
         self,
         user_idea: str,
-        style: str = "тёплый и человечный",
-        additional_info: Optional[str] = None,
-    ) -> str:
+        style: str,
+        additional_info: Optional[str],
+    ) -> tuple[str, str]:
+        """Системный и пользовательский промпты для свободного поста"""
         ngo_context = self._build_ngo_context()
 
         system_prompt = f"""Ты - профессиональный SMM-специалист для некоммерческих организаций.
@@ -116,10 +121,100 @@ class ContentGenerator:
         Если деталей много - раскрой их структурированно.
 
         НЕ ДОДУМЫВАЙ конкретику. Твоя задача - взять ЭТИ факты и подать их интересно."""
+        return system_prompt, prompt
+
+    async def generate_free_text_post(
+        self,
+        user_idea: str,
+        style: str = "тёплый и человечный",
+        additional_info: Optional[str] = None,
+    ) -> str:
+        system_prompt, prompt = self._build_free_text_post_prompts(
+            user_idea=user_idea, style=style, additional_info=additional_info
+        )
         return await self.model.generate_text(
             prompt=prompt, system_prompt=system_prompt, temperature=0.7
         )
 
+    async def stream_free_text_post(
+        self,
+        user_idea: str,
+        style: str = "тёплый и человечный",
+        additional_info: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Потоковая генерация свободного поста (без проверки длины)"""
+        system_prompt, prompt = self._build_free_text_post_prompts(
+            user_idea=user_idea, style=style, additional_info=additional_info
+        )
+        async for chunk in self.model.stream_text(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=0.7,
+            max_length=MAX_TEXT_LENGTH,
+        ):
+            yield chunk
+
+    def _build_revise_post_prompts(
+        self, edit_request: str, style: str
+    ) -> tuple[str, str]:
+        """
+        Промпты для правки поста по истории диалога: последний ответ
+        ассистента в истории — текущая версия поста
+        """
+        system_prompt, _ = self._build_free_text_post_prompts(
+            user_idea="", style=style, additional_info=None
+        )
+
+        prompt = f"""Внеси правку в последнюю версию поста из нашего диалога.
+
+        ПРАВКА:
+        {edit_request}
+
+        Сохрани всё, чего правка не касается. Верни только обновлённый пост целиком, без пояснений."""
+        return system_prompt, prompt
+
+    async def revise_post(self, edit_request: str, style: str = "разговорный") -> str:
+        """Правка поста короткой инструкцией с учётом истории диалога"""
+        system_prompt, prompt = self._build_revise_post_prompts(
+            edit_request=edit_request, style=style
+        )
+        return await self.model.generate_text(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            use_history=True,
+            temperature=0.7,
+        )
+
+    async def stream_revise_post(
+        self, edit_request: str, style: str = "разговорный"
+    ) -> AsyncIterator[str]:
+        """Потоковая правка поста с учётом истории диалога (без проверки длины)"""
+        system_prompt, prompt = self._build_revise_post_prompts(
+            edit_request=edit_request, style=style
+        )
+        async for chunk in self.model.stream_text(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            use_history=True,
+            temperature=0.7,
+            max_length=MAX_TEXT_LENGTH,
+        ):
+            yield chunk
+
+    async def summarize_dialogue(self, messages: list[Dict[str, str]]) -> str:
+        """Краткое содержание старых реплик диалога для сжатия истории"""
+        dialogue = "\n\n".join(
+            f"{'Пользователь' if message['role'] == 'user' else 'Ассистент'}: "
+            f"{message['content']}"
+            for message in messages
+        )
+        prompt = f"""Кратко перескажи диалог о подготовке поста: какие правки просил пользователь
+        и к какому результату пришли. Не добавляй новых фактов, 5-7 предложений.
+
+        ДИАЛОГ:
+        {dialogue}"""
+        return await self.model.generate_text(prompt=prompt, temperature=0.0)
+
     async def generate_structured_post(
         self,
         event_type: str,
@@ -429,19 +524,10 @@ class ContentGenerator:
 
         return (result["edited_text"], result["errors"], result["recommendations"])
 
-    async def edit_post(
+    def _build_edit_post_prompts(
         self, original_post: str, edit_request: str
-    ) -> tuple[str, list[str], list[str]]:
-        """
-        Редактирование поста на основе запроса пользователя
-
-        Args:
-            original_post: Исходный текст поста
-            edit_request: Запрос пользователя на изменение
-
-        Returns:
-            Tuple[edited_text, errors, recommendations]
-        """
+    ) -> tuple[str, str]:
+        """Системный и пользовательский промпты для редактирования поста"""
         ngo_context = self._build_ngo_context()
 
         system_prompt = f"""Ты - редактор SMM-постов для НКО.
@@ -499,12 +585,60 @@ class ContentGenerator:
         ЗАПРОС ПОЛЬЗОВАТЕЛЯ (содержит реальную информацию):
         {edit_request}
         """
+        return system_prompt, prompt
+
+    async def edit_post(
+        self, original_post: str, edit_request: str
+    ) -> tuple[str, list[str], list[str]]:
+        """
+        Редактирование поста на основе запроса пользователя
+
+        Args:
+            original_post: Исходный текст поста
+            edit_request: Запрос пользователя на изменение
 
-        raw_response = await self.model._generate_text_raw(
-            prompt=prompt, system_prompt=system_prompt, temperature=0.0
+        Returns:
+            Tuple[edited_text, errors, recommendations]
+        """
+        raw_response = await self.generate_edit_response(
+            original_post=original_post, edit_request=edit_request
         )
         return self._parse_edit_response(raw_response)
 
+    async def generate_edit_response(
+        self, original_post: str, edit_request: str
+    ) -> str:
+        """Сырой ответ редактора; разбор — через _parse_edit_response"""
+        system_prompt, prompt = self._build_edit_post_prompts(
+            original_post=original_post, edit_request=edit_request
+        )
+        return await self.model._generate_text_raw(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=0.0,
+            cache="edit_post",
+        )
+
+    async def stream_edit_post(
+        self, original_post: str, edit_request: str
+    ) -> AsyncIterator[str]:
+        """
+        Потоковое редактирование поста.
+
+        Возвращает сырые фрагменты ответа; разбор на разделы выполняется
+        через _parse_edit_response по накопленному тексту.
+        """
+        system_prompt, prompt = self._build_edit_post_prompts(
+            original_post=original_post, edit_request=edit_request
+        )
+        async for chunk in self.model.stream_text(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=0.0,
+            cache="edit_post",
+        ):
+            yield chunk
+
     async def generate_content_plan(
         self, duration_days: int, posts_per_week: int, preferences: Optional[str] = None
     ) -> str:
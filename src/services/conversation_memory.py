@@ -0,0 +1,120 @@
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src.config import settings
+from src.services.rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, str]
+Summarizer = Callable[[List[Message]], Awaitable[str]]
+
+# Грубая оценка количества символов русского текста на один токен
+CHARS_PER_TOKEN = 3
+
+SUMMARY_PREFIX = "Краткое содержание предыдущего диалога:"
+
+
+def estimate_tokens(messages: List[Message]) -> int:
+    characters = sum(len(message.get("content", "")) for message in messages)
+    return characters // CHARS_PER_TOKEN
+
+
+class ConversationMemory:
+    """
+    История диалога с GigaChat для пользователя в рамках одного сценария
+    (например, правки свободного поста).
+
+    Хранится в Redis с TTL. Размер ограничен по оценке токенов: старые
+    реплики сворачиваются в краткое содержание или отбрасываются.
+    """
+
+    KEY_PREFIX = "conversation"
+
+    def _key(self, user_id: int, flow: str) -> str:
+        return f"{self.KEY_PREFIX}:{user_id}:{flow}"
+
+    async def _get_redis(self):
+        if not rate_limiter.redis_client:
+            await rate_limiter.initialize()
+        return rate_limiter.redis_client
+
+    async def load(self, user_id: int, flow: str) -> List[Message]:
+        """История сценария (пустая, если истекла или Redis недоступен)"""
+        try:
+            redis_client = await self._get_redis()
+            raw = await redis_client.get(self._key(user_id, flow))
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить историю диалога: {e}")
+            return []
+
+        if not raw:
+            return []
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return []
+
+    async def save(
+        self,
+        user_id: int,
+        flow: str,
+        history: List[Message],
+        summarize: Optional[Summarizer] = None,
+    ) -> List[Message]:
+        """
+        Сохранение истории с ограничением размера
+
+        Returns:
+            История в том виде, в котором она сохранена
+        """
+        history = await self._compact(history, summarize)
+        try:
+            redis_client = await self._get_redis()
+            await redis_client.set(
+                self._key(user_id, flow),
+                json.dumps(history, ensure_ascii=False),
+                ex=settings.CONVERSATION_TTL,
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить историю диалога: {e}")
+        return history
+
+    async def clear(self, user_id: int, flow: str) -> None:
+        try:
+            redis_client = await self._get_redis()
+            await redis_client.delete(self._key(user_id, flow))
+        except Exception as e:
+            logger.warning(f"Не удалось очистить историю диалога: {e}")
+
+    async def _compact(
+        self, history: List[Message], summarize: Optional[Summarizer]
+    ) -> List[Message]:
+        max_tokens = settings.CONVERSATION_MAX_TOKENS
+        # Последний обмен (правка и её результат) всегда сохраняется целиком
+        if estimate_tokens(history) <= max_tokens or len(history) <= 2:
+            return history
+
+        older, recent = history[:-2], history[-2:]
+
+        if summarize is not None and settings.CONVERSATION_SUMMARIZE:
+            try:
+                summary = await summarize(older)
+            except Exception as e:
+                logger.warning(f"Не удалось сжать историю диалога: {e}")
+            else:
+                compacted = [
+                    {"role": "user", "content": f"{SUMMARY_PREFIX}\n{summary}"},
+                    *recent,
+                ]
+                if estimate_tokens(compacted) <= max_tokens:
+                    return compacted
+
+        # Без краткого содержания отбрасываем самые старые реплики
+        while len(history) > 2 and estimate_tokens(history) > max_tokens:
+            history = history[2:] if history[0]["role"] == "user" else history[1:]
+        return history
+
+
+conversation_memory = ConversationMemory()
@@ -0,0 +1,74 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """Время на обработку запроса пользователя истекло"""
+
+
+class Deadline:
+    """Крайний срок выполнения запроса (по монотонным часам)"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, default: float) -> float:
+        """Таймаут очередного вызова: не больше оставшегося времени"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return min(default, remaining)
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar(
+    "current_deadline", default=None
+)
+
+
+def get_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[Deadline]:
+    """
+    Ограничивает время выполнения блока.
+
+    Вложенная область не может продлить внешний срок: действует более ранний.
+
+    Usage:
+        with deadline_scope(90):
+            await ai_manager.generate_free_text_post(...)
+    """
+    outer = _current_deadline.get()
+    deadline = Deadline(seconds)
+    if outer is not None and outer.expires_at <= deadline.expires_at:
+        deadline = outer
+
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def deadline_timeout(default: float) -> float:
+    """
+    Таймаут HTTP запроса с учётом текущего срока.
+
+    Без активного срока возвращается `default`; если срок истёк —
+    выбрасывается DeadlineExceeded.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    return deadline.timeout(default)
@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+# Сколько последних сообщений диалога хранится в контексте
+MAX_HISTORY_MESSAGES = 20
+
+
+@dataclass
+class GenerationContext:
+    """
+    Данные одного запроса генерации: профиль НКО и история диалога.
+
+    Хранится в contextvar, поэтому параллельные запросы разных пользователей
+    к общему ai_manager не видят данные друг друга.
+    """
+
+    user_id: Optional[int] = None
+    ngo_info: Optional[Dict[str, Any]] = None
+    history: List[Dict[str, str]] = field(default_factory=list)
+
+    def add_exchange(self, prompt: str, answer: str) -> None:
+        self.history.append({"role": "user", "content": prompt})
+        self.history.append({"role": "assistant", "content": answer})
+        if len(self.history) > MAX_HISTORY_MESSAGES:
+            del self.history[:-MAX_HISTORY_MESSAGES]
+
+
+_current_context: ContextVar[Optional[GenerationContext]] = ContextVar(
+    "generation_context", default=None
+)
+
+
+def get_generation_context() -> Optional[GenerationContext]:
+    """Контекст текущего запроса (None вне ai_manager)"""
+    return _current_context.get()
+
+
+@contextmanager
+def generation_context(context: GenerationContext) -> Iterator[GenerationContext]:
+    """
+    Делает `context` текущим на время блока
+
+    Usage:
+        with generation_context(GenerationContext(user_id=user_id)):
+            ...
+    """
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QueueListener = Callable[[int], Awaitable[None]]
+
+# Обработчик позиции в очереди для текущего апдейта (0 — запрос допущен)
+queue_listener: ContextVar[Optional[QueueListener]] = ContextVar(
+    "queue_listener", default=None
+)
+
+# Порядок приоритетов: текстовые запросы обслуживаются раньше изображений
+PRIORITIES = ("text", "image")
+
+# Сколько ждать последнего обновления позиции («допущен») перед генерацией
+FINAL_NOTIFY_TIMEOUT = 5.0
+
+
+@dataclass(eq=False)
+class _Waiter:
+    user_id: Optional[int]
+    kind: str
+    future: asyncio.Future
+    listener: Optional[QueueListener] = None
+    position: int = field(default=0)
+    notify_task: Optional[asyncio.Task] = None
+
+
+class GenerationScheduler:
+    """
+    Допуск запросов генерации к GigaChat.
+
+    Ограничивает общее число одновременных генераций, а ожидающие запросы
+    обслуживает по кругу между пользователями (round-robin внутри приоритета),
+    поэтому серия запросов одного пользователя не блокирует остальных.
+    Текстовые запросы имеют приоритет над генерацией изображений.
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self._active = 0
+        self._queues: Dict[str, "OrderedDict[Optional[int], Deque[_Waiter]]"] = {
+            kind: OrderedDict() for kind in PRIORITIES
+        }
+        self._notify_tasks: set[asyncio.Task] = set()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return sum(
+            len(waiters)
+            for queue in self._queues.values()
+            for waiters in queue.values()
+        )
+
+    @asynccontextmanager
+    async def slot(
+        self, user_id: Optional[int], kind: str = "text"
+    ) -> AsyncIterator[None]:
+        """
+        Занимает слот генерации на время блока
+
+        Usage:
+            async with scheduler.slot(user_id, "image"):
+                ...
+        """
+        if kind not in self._queues:
+            raise ValueError(f"Unknown generation kind: {kind}")
+
+        await self._acquire(user_id, kind)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def get_position(self, user_id: int) -> Optional[int]:
+        """Позиция первого ожидающего запроса пользователя (начиная с 1)"""
+        for position, waiter in enumerate(self._ordered_waiters(), start=1):
+            if waiter.user_id == user_id:
+                return position
+        return None
+
+    def get_stats(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+        }
+
+    async def _acquire(self, user_id: Optional[int], kind: str) -> None:
+        if self._active < self.max_concurrent and not self.queued:
+            self._active += 1
+            return
+
+        waiter = _Waiter(
+            user_id=user_id,
+            kind=kind,
+            future=asyncio.get_running_loop().create_future(),
+            listener=queue_listener.get(),
+        )
+        self._queues[kind].setdefault(user_id, deque()).append(waiter)
+        self._notify_positions()
+
+        try:
+            await waiter.future
+            await self._finish_notifications(waiter)
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Слот уже выдан, но запрос отменён — возвращаем слот
+                self._release()
+            else:
+                self._remove(waiter)
+                self._notify_positions()
+            raise
+
+    @staticmethod
+    async def _finish_notifications(waiter: _Waiter) -> None:
+        """
+        Дожидается последнего обновления позиции, прежде чем слот перейдёт
+        к вызывающему коду: иначе оно может перезаписать сообщение,
+        которое уже начал редактировать stream_to_message.
+        """
+        task = waiter.notify_task
+        if task is None or task.done():
+            return
+        done, _ = await asyncio.wait({task}, timeout=FINAL_NOTIFY_TIMEOUT)
+        if not done:
+            task.cancel()
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrent:
+            waiter = self._pop_next()
+            if waiter is None:
+                break
+            if waiter.future.done():
+                continue
+
+            self._active += 1
+            waiter.future.set_result(None)
+            self._notify(waiter, 0)
+
+        self._notify_positions()
+
+    def _pop_next(self) -> Optional[_Waiter]:
+        for kind in PRIORITIES:
+            queue = self._queues[kind]
+            if not queue:
+                continue
+
+            user_id, waiters = next(iter(queue.items()))
+            waiter = waiters.popleft()
+            del queue[user_id]
+            if waiters:
+                # Пользователь уходит в конец круга
+                queue[user_id] = waiters
+            return waiter
+        return None
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues[waiter.kind]
+        waiters = queue.get(waiter.user_id)
+        if not waiters:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            del queue[waiter.user_id]
+
+    def _ordered_waiters(self) -> List[_Waiter]:
+        """Ожидающие запросы в том порядке, в котором их выпустит _dispatch"""
+        ordered: List[_Waiter] = []
+        for kind in PRIORITIES:
+            lanes = [list(waiters) for waiters in self._queues[kind].values()]
+            depth = max((len(lane) for lane in lanes), default=0)
+            for index in range(depth):
+                ordered.extend(lane[index] for lane in lanes if index < len(lane))
+        return ordered
+
+    def _notify_positions(self) -> None:
+        for position, waiter in enumerate(self._ordered_waiters(), start=1):
+            if waiter.position != position:
+                self._notify(waiter, position)
+
+    def _notify(self, waiter: _Waiter, position: int) -> None:
+        waiter.position = position
+        if waiter.listener is None:
+            return
+
+        # Более новая позиция заменяет ещё не отправленную
+        if waiter.notify_task is not None and not waiter.notify_task.done():
+            waiter.notify_task.cancel()
+
+        task = asyncio.create_task(self._call_listener(waiter.listener, position))
+        waiter.notify_task = task
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    @staticmethod
+    async def _call_listener(listener: QueueListener, position: int) -> None:
+        try:
+            await listener(position)
+        except Exception as e:
+            logger.debug(f"Не удалось сообщить позицию в очереди: {e}")
@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import time
+from typing import List, Optional
+
+from src.config import settings
+from src.services.rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class ImageAnalysisCache:
+    """
+    Кэш загруженных в GigaChat изображений и их анализов в Redis.
+
+    Ключ — SHA-256 содержимого изображения: одно и то же изображение
+    (например, при повторной генерации) не загружается в /files заново,
+    а анализ с тем же промптом берётся из кэша. Загруженные файлы
+    учитываются в индексе, по которому устаревшие удаляются из GigaChat.
+    """
+
+    KEY_PREFIX = "image_analysis"
+    FILES_INDEX_KEY = "image_analysis:files"
+
+    @staticmethod
+    def hash_image(image_data: bytes) -> str:
+        return hashlib.sha256(image_data).hexdigest()
+
+    def _file_key(self, image_hash: str) -> str:
+        return f"{self.KEY_PREFIX}:file:{image_hash}"
+
+    def _analysis_key(self, image_hash: str, prompt: str) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()[:16]
+        return f"{self.KEY_PREFIX}:text:{image_hash}:{prompt_hash}"
+
+    async def _get_redis(self):
+        if not rate_limiter.redis_client:
+            await rate_limiter.initialize()
+        return rate_limiter.redis_client
+
+    async def _get(self, key: str) -> Optional[str]:
+        if not settings.IMAGE_ANALYSIS_CACHE_ENABLED:
+            return None
+        try:
+            redis_client = await self._get_redis()
+            return await redis_client.get(key)
+        except Exception as e:
+            logger.warning(f"Кэш анализа изображений недоступен: {e}")
+            return None
+
+    async def get_file_id(self, image_hash: str) -> Optional[str]:
+        """id файла в GigaChat для изображения, если оно уже загружалось"""
+        return await self._get(self._file_key(image_hash))
+
+    async def get_analysis(self, image_hash: str, prompt: str) -> Optional[str]:
+        return await self._get(self._analysis_key(image_hash, prompt))
+
+    async def set_file_id(self, image_hash: str, file_id: str) -> None:
+        if not settings.IMAGE_ANALYSIS_CACHE_ENABLED:
+            return
+        try:
+            redis_client = await self._get_redis()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(
+                    self._file_key(image_hash),
+                    file_id,
+                    ex=settings.IMAGE_ANALYSIS_CACHE_TTL,
+                )
+                pipe.zadd(self.FILES_INDEX_KEY, {file_id: time.time()})
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить id файла GigaChat: {e}")
+
+    async def set_analysis(self, image_hash: str, prompt: str, analysis: str) -> None:
+        if not settings.IMAGE_ANALYSIS_CACHE_ENABLED or not analysis:
+            return
+        try:
+            redis_client = await self._get_redis()
+            await redis_client.set(
+                self._analysis_key(image_hash, prompt),
+                analysis,
+                ex=settings.IMAGE_ANALYSIS_CACHE_TTL,
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить анализ изображения: {e}")
+
+    async def forget_file(self, image_hash: str, file_id: str) -> None:
+        """Удаление записи о файле (например, если он уже удалён в GigaChat)"""
+        try:
+            redis_client = await self._get_redis()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(self._file_key(image_hash))
+                pipe.zrem(self.FILES_INDEX_KEY, file_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Не удалось удалить запись о файле GigaChat: {e}")
+
+    async def pop_stale_files(self) -> List[str]:
+        """
+        id файлов, загруженных раньше TTL кэша; из индекса они удаляются.
+        Ссылки на них в кэше к этому моменту уже истекли.
+        """
+        threshold = time.time() - settings.IMAGE_ANALYSIS_CACHE_TTL
+        try:
+            redis_client = await self._get_redis()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.zrangebyscore(self.FILES_INDEX_KEY, 0, threshold)
+                pipe.zremrangebyscore(self.FILES_INDEX_KEY, 0, threshold)
+                stale, _ = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Не удалось получить устаревшие файлы GigaChat: {e}")
+            return []
+        return list(stale)
+
+
+image_analysis_cache = ImageAnalysisCache()
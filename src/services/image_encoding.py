@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+# Модуль выполняется в процессах-воркерах image_executor и не импортирует
+# настройки: их значения передаются через EncodingOptions и AnalysisOptions
+# (см. image_output).
+
+# Ограничения Telegram для фото (sendPhoto)
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+TELEGRAM_PHOTO_MAX_DIMENSIONS_SUM = 10000
+
+# Если даже минимальное качество не влезает в бюджет — уменьшаем изображение
+DOWNSCALE_FACTOR = 0.8
+MAX_DOWNSCALE_STEPS = 5
+
+SUPPORTED_FORMATS = {"JPEG": "jpg", "WEBP": "webp"}
+
+
+class ImageTooLargeError(ValueError):
+    """Изображение превышает допустимое число пикселей."""
+
+
+@dataclass(frozen=True)
+class EncodingOptions:
+    """Формат, качество и бюджет размера изображения для Telegram."""
+
+    output_format: str = "JPEG"
+    quality: int = 90
+    min_quality: int = 60
+    max_bytes: int = 2 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class AnalysisOptions:
+    """Ограничения изображения, загружаемого в GigaChat для анализа."""
+
+    max_side: int = 1024
+    max_pixels: int = 50_000_000
+    quality: int = 85
+
+
+def normalize_format(output_format: str) -> str:
+    output_format = output_format.upper()
+    return output_format if output_format in SUPPORTED_FORMATS else "JPEG"
+
+
+def _fit_telegram_dimensions(image: Image.Image) -> Image.Image:
+    width, height = image.size
+    scale = TELEGRAM_PHOTO_MAX_DIMENSIONS_SUM / (width + height)
+    if scale >= 1:
+        return image
+    return image.resize(
+        (max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS
+    )
+
+
+def _prepare_mode(image: Image.Image, output_format: str) -> Image.Image:
+    """Приведение к режиму, который поддерживает формат (JPEG — без альфа-канала)."""
+    has_alpha = image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+    if output_format == "JPEG":
+        if not has_alpha:
+            return image if image.mode == "RGB" else image.convert("RGB")
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+
+    if image.mode in ("RGB", "RGBA"):
+        return image
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def _save(image: Image.Image, output_format: str, quality: int) -> bytes:
+    # EXIF и ICC-профиль не передаются — метаданные в результат не попадают
+    output = io.BytesIO()
+    if output_format == "JPEG":
+        image.save(
+            output, format="JPEG", quality=quality, optimize=True, progressive=True
+        )
+    else:
+        image.save(output, format="WEBP", quality=quality, method=4)
+    return output.getvalue()
+
+
+def _encode_within_budget(
+    image: Image.Image, output_format: str, max_bytes: int, options: EncodingOptions
+) -> Optional[bytes]:
+    """Наибольшее качество, при котором файл не больше max_bytes (бинарный поиск)."""
+    max_quality = options.quality
+    min_quality = min(options.min_quality, max_quality)
+
+    data = _save(image, output_format, max_quality)
+    if len(data) <= max_bytes:
+        return data
+
+    best: Optional[bytes] = None
+    low, high = min_quality, max_quality - 1
+    while low <= high:
+        quality = (low + high) // 2
+        data = _save(image, output_format, quality)
+        if len(data) <= max_bytes:
+            best = data
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best
+
+
+def encode_image(
+    image: Image.Image, options: Optional[EncodingOptions] = None
+) -> bytes:
+    """
+    Кодирует изображение для отправки в Telegram.
+
+    Формат и качество задаются options (IMAGE_OUTPUT_FORMAT и
+    IMAGE_OUTPUT_QUALITY); качество снижается (не ниже min_quality), а затем
+    изображение уменьшается, пока файл не уложится в max_bytes
+    и ограничения Telegram на размер и стороны фото.
+    """
+    options = options or EncodingOptions()
+    output_format = normalize_format(options.output_format)
+    max_bytes = min(options.max_bytes, TELEGRAM_PHOTO_MAX_BYTES)
+
+    image = _prepare_mode(_fit_telegram_dimensions(image), output_format)
+
+    for _ in range(MAX_DOWNSCALE_STEPS):
+        data = _encode_within_budget(image, output_format, max_bytes, options)
+        if data is not None:
+            return data
+
+        width, height = image.size
+        image = image.resize(
+            (
+                max(1, int(width * DOWNSCALE_FACTOR)),
+                max(1, int(height * DOWNSCALE_FACTOR)),
+            ),
+            Image.LANCZOS,
+        )
+
+    return _save(image, output_format, options.min_quality)
+
+
+def prepare_for_analysis(
+    image_data: bytes, options: Optional[AnalysisOptions] = None
+) -> bytes:
+    """
+    Подготовка пользовательского изображения к загрузке в GigaChat.
+
+    Размер проверяется по заголовку до декодирования (защита от
+    decompression bomb), JPEG декодируется сразу в уменьшенном виде
+    через Image.draft, после чего изображение вписывается в
+    max_side (IMAGE_ANALYSIS_MAX_SIDE) и сохраняется в JPEG без метаданных.
+
+    Raises:
+        ImageTooLargeError: Если пикселей больше max_pixels
+    """
+    options = options or AnalysisOptions()
+    image = Image.open(io.BytesIO(image_data))
+    width, height = image.size
+    if width * height > options.max_pixels:
+        raise ImageTooLargeError(
+            f"Изображение слишком большое: {width}x{height} пикселей"
+        )
+
+    max_side = options.max_side
+    source_is_small_jpeg = image.format == "JPEG" and max(width, height) <= max_side
+
+    image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image = _prepare_mode(image, "JPEG")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    prepared = _save(image, "JPEG", options.quality)
+    if source_is_small_jpeg and len(image_data) <= len(prepared):
+        return image_data
+    return prepared
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from src.config import settings
+from src.services.image_encoding import prepare_for_analysis
+from src.services.image_jobs import apply_text_job, init_worker, ping
+from src.services.image_output import analysis_options, encoding_options
+from src.services.image_overlay import ImageOverlayOptions
+from src.services.image_overlay import apply_image_overlay as _apply_image_overlay
+from src.services.image_overlay import prepare_overlay_image
+from src.services.text_overlay import TextOverlayConfig
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Измерение блокировок event loop: периодически засыпает на `interval`
+    и считает, насколько позже запланированного loop его разбудил.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - started - self.interval, 0.0)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def get_stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "total_lag": round(self.total_lag, 3),
+            "avg_lag": round(self.total_lag / self.samples, 4) if self.samples else 0.0,
+            "max_lag": round(self.max_lag, 3),
+        }
+
+
+class ImageExecutor:
+    """
+    Выполнение CPU-операций Pillow вне event loop.
+
+    Режим задаётся IMAGE_EXECUTOR: "process" — пул процессов с прогретыми
+    воркерами (шрифты загружаются при старте, задачи — из image_jobs,
+    который не импортирует настройки), "thread" — пул потоков,
+    "inline" — прямо в event loop (для сравнения метрик блокировки).
+    """
+
+    def __init__(self, mode: Optional[str] = None, workers: Optional[int] = None):
+        self.mode = mode or settings.IMAGE_EXECUTOR
+        self.workers = workers or settings.IMAGE_EXECUTOR_WORKERS
+        self._executor: Optional[Executor] = None
+        self.loop_monitor = LoopLagMonitor()
+
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.total_time: Dict[str, float] = defaultdict(float)
+        # Время, на которое операция заняла сам event loop (режим inline)
+        self.loop_blocking_time: Dict[str, float] = defaultdict(float)
+
+        # Экономия на загрузке изображений в GigaChat для анализа
+        self.analysis_images = 0
+        self.analysis_original_bytes = 0
+        self.analysis_uploaded_bytes = 0
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.mode == "inline":
+            return None
+
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="image"
+                )
+            logger.info(
+                f"Пул для обработки изображений создан "
+                f"(mode={self.mode}, workers={self.workers})"
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Прогрев воркеров и запуск измерения блокировок event loop"""
+        executor = self._get_executor()
+        if executor is not None:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(
+                *(loop.run_in_executor(executor, ping) for _ in range(self.workers))
+            )
+        self.loop_monitor.start()
+
+    async def stop(self) -> None:
+        await self.loop_monitor.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, name: str, func: Callable[..., Any], *args: Any) -> Any:
+        """Выполнение `func(*args)` в пуле с учётом метрик"""
+        executor = self._get_executor()
+        started = time.perf_counter()
+        try:
+            if executor is None:
+                return func(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, func, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.calls[name] += 1
+            self.total_time[name] += elapsed
+            if executor is None:
+                self.loop_blocking_time[name] += elapsed
+
+    async def apply_text(
+        self,
+        image_bytes: bytes,
+        text: str,
+        font_variant: Optional[str] = None,
+        config: Optional[TextOverlayConfig] = None,
+    ) -> bytes:
+        """Асинхронная обёртка над TextOverlayService.apply_text"""
+        return await self.run(
+            "apply_text",
+            apply_text_job,
+            image_bytes,
+            text,
+            font_variant,
+            config,
+            encoding_options(),
+        )
+
+    async def apply_image_overlay(
+        self,
+        base_image_bytes: bytes,
+        overlay_image_bytes: bytes,
+        options: Optional[ImageOverlayOptions] = None,
+    ) -> bytes:
+        """Асинхронная обёртка над apply_image_overlay"""
+        return await self.run(
+            "apply_image_overlay",
+            _apply_image_overlay,
+            base_image_bytes,
+            overlay_image_bytes,
+            options,
+            encoding_options(),
+        )
+
+    async def prepare_overlay_image(
+        self,
+        base_image_bytes: bytes,
+        overlay_image_bytes: bytes,
+        max_size_ratio: float,
+    ) -> bytes:
+        """Асинхронная обёртка над prepare_overlay_image"""
+        return await self.run(
+            "prepare_overlay_image",
+            prepare_overlay_image,
+            base_image_bytes,
+            overlay_image_bytes,
+            max_size_ratio,
+        )
+
+    async def prepare_for_analysis(self, image_data: bytes) -> bytes:
+        """Уменьшение и перекодирование изображения перед загрузкой в GigaChat"""
+        prepared = await self.run(
+            "prepare_for_analysis", prepare_for_analysis, image_data, analysis_options()
+        )
+        self.analysis_images += 1
+        self.analysis_original_bytes += len(image_data)
+        self.analysis_uploaded_bytes += len(prepared)
+        return prepared
+
+    def get_stats(self) -> dict:
+        saved_bytes = self.analysis_original_bytes - self.analysis_uploaded_bytes
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "operations": {
+                name: {
+                    "calls": self.calls[name],
+                    "total_time": round(self.total_time[name], 3),
+                    "loop_blocking_time": round(self.loop_blocking_time[name], 3),
+                }
+                for name in sorted(self.calls)
+            },
+            "event_loop_lag": self.loop_monitor.get_stats(),
+            "analysis_uploads": {
+                "images": self.analysis_images,
+                "original_bytes": self.analysis_original_bytes,
+                "uploaded_bytes": self.analysis_uploaded_bytes,
+                "saved_bytes": saved_bytes,
+                "saved_ratio": (
+                    round(saved_bytes / self.analysis_original_bytes, 3)
+                    if self.analysis_original_bytes
+                    else 0.0
+                ),
+            },
+        }
+
+
+image_executor = ImageExecutor()
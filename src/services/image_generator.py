@@ -1,6 +1,8 @@
 from typing import Optional
 
 from src.clients.gigachat import GigaChatModel
+from .image_executor import image_executor
+from .pipeline import Pipeline
 from .text_overlay import TextOverlayConfig, TextOverlayService
 
 IMAGE_GENERATION_SYSTEM_PROMPT = """ПРАВИЛА КОМПОЗИЦИИ:
@@ -120,7 +122,10 @@ class ImageGenerator:
 Создай промпт длиной 50-150 слов."""
 
         return await self.model.generate_text(
-            prompt=prompt, system_prompt=system_prompt, temperature=0.7
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=0.7,
+            cache="image_prompt",
         )
 
     async def generate_image(
@@ -153,7 +158,7 @@ class ImageGenerator:
             width=width,
             height=height,
         )
-        return self._apply_overlay_if_needed(
+        return await self._apply_overlay_if_needed(
             base_image, overlay_text, overlay_font, overlay_config
         )
 
@@ -204,17 +209,27 @@ class ImageGenerator:
         Returns:
             Байты изображения
         """
-        prompt = await self.generate_image_prompt(post_text, image_description)
-        image_bytes = await self.generate_image(prompt, width, height)
-
-        overlay_text = prepared_info_text
-        if include_info_block:
-            overlay_text = overlay_text or await self.generate_information_text(
-                post_text=post_text, image_description=image_description
+        pipeline = Pipeline()
+        pipeline.add(
+            "prompt", lambda: self.generate_image_prompt(post_text, image_description)
+        )
+        pipeline.add(
+            "image", lambda prompt: self.generate_image(prompt, width, height), "prompt"
+        )
+        if include_info_block and not prepared_info_text:
+            # Инфоблок зависит только от поста и готовится параллельно с картинкой
+            pipeline.add(
+                "info_text",
+                lambda: self.generate_information_text(
+                    post_text=post_text, image_description=image_description
+                ),
             )
 
-        return self._apply_overlay_if_needed(
-            image_bytes, overlay_text, overlay_font, overlay_config
+        results = await pipeline.run()
+        overlay_text = results.get("info_text", prepared_info_text)
+
+        return await self._apply_overlay_if_needed(
+            results["image"], overlay_text, overlay_font, overlay_config
         )
 
     async def edit_image(
@@ -304,10 +319,11 @@ class ImageGenerator:
             system_prompt=INFO_TEXT_SYSTEM_PROMPT,
             temperature=0.4,
             max_tokens=400,
+            cache="information_text",
         )
         return result.strip()
 
-    def _apply_overlay_if_needed(
+    async def _apply_overlay_if_needed(
         self,
         image_bytes: bytes,
         overlay_text: Optional[str],
@@ -320,7 +336,8 @@ class ImageGenerator:
         if not self.text_overlay:
             return image_bytes
 
-        return self.text_overlay.apply_text(
+        # Отрисовка текста выполняется вне event loop
+        return await image_executor.apply_text(
             image_bytes=image_bytes,
             text=overlay_text,
             font_variant=overlay_font,
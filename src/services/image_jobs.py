@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from src.services.image_encoding import EncodingOptions
+from src.services.text_overlay import TextOverlayConfig, TextOverlayService
+
+# Задачи пула image_executor. Процессы-воркеры (spawn) импортируют только
+# этот модуль и модули Pillow (text_overlay, image_overlay, image_encoding):
+# настройки, Redis и модули бота в воркере не загружаются.
+
+# Сервис текста в процессе-воркере: шрифты находятся один раз при старте воркера
+_worker_text_overlay: Optional[TextOverlayService] = None
+
+
+def init_worker() -> None:
+    global _worker_text_overlay
+    _worker_text_overlay = TextOverlayService()
+
+
+def _get_text_overlay() -> TextOverlayService:
+    global _worker_text_overlay
+    if _worker_text_overlay is None:
+        _worker_text_overlay = TextOverlayService()
+    return _worker_text_overlay
+
+
+def ping() -> bool:
+    return True
+
+
+def apply_text_job(
+    image_bytes: bytes,
+    text: str,
+    font_variant: Optional[str],
+    config: Optional[TextOverlayConfig],
+    encoding: Optional[EncodingOptions],
+) -> bytes:
+    return _get_text_overlay().apply_text(
+        image_bytes=image_bytes,
+        text=text,
+        font_variant=font_variant,
+        config=config,
+        encoding=encoding,
+    )
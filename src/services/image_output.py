@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from src.config import settings
+from src.services.image_encoding import (
+    SUPPORTED_FORMATS,
+    AnalysisOptions,
+    EncodingOptions,
+    normalize_format,
+)
+
+
+def encoding_options() -> EncodingOptions:
+    """Настройки кодирования изображений для Telegram из конфигурации."""
+    return EncodingOptions(
+        output_format=normalize_format(settings.IMAGE_OUTPUT_FORMAT),
+        quality=settings.IMAGE_OUTPUT_QUALITY,
+        min_quality=settings.IMAGE_OUTPUT_MIN_QUALITY,
+        max_bytes=settings.IMAGE_OUTPUT_MAX_BYTES,
+    )
+
+
+def analysis_options() -> AnalysisOptions:
+    """Ограничения изображений для анализа в GigaChat из конфигурации."""
+    return AnalysisOptions(
+        max_side=settings.IMAGE_ANALYSIS_MAX_SIDE,
+        max_pixels=settings.IMAGE_ANALYSIS_MAX_PIXELS,
+        quality=settings.IMAGE_ANALYSIS_QUALITY,
+    )
+
+
+def photo_filename(stem: str) -> str:
+    """Имя файла для отправки изображения с расширением текущего формата."""
+    return f"{stem}.{SUPPORTED_FORMATS[normalize_format(settings.IMAGE_OUTPUT_FORMAT)]}"
@@ -2,10 +2,12 @@ from __future__ import annotations
 
 import io
 from dataclasses import dataclass
-from typing import Literal
+from typing import Literal, Tuple
 
 from PIL import Image
 
+from src.services.image_encoding import EncodingOptions, encode_image
+
 
 OverlayPosition = Literal[
     "top_left",
@@ -16,6 +18,50 @@ OverlayPosition = Literal[
 ]
 
 
+def open_for_compositing(image_bytes: bytes) -> Image.Image:
+    """
+    Открывает изображение для наложения оверлеев.
+
+    RGB и RGBA остаются как есть: целиком в RGBA кадр не переводится,
+    конвертируется только область под оверлеем.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    return image
+
+
+def composite_region(
+    base_image: Image.Image, patch: Image.Image, origin: Tuple[int, int]
+) -> Image.Image:
+    """
+    Накладывает RGBA-фрагмент на изображение, обрабатывая только
+    занятую им область (crop → alpha_composite → paste).
+    Исходное изображение изменяется на месте.
+    """
+    x, y = origin
+    left, top = max(x, 0), max(y, 0)
+    right = min(x + patch.width, base_image.width)
+    bottom = min(y + patch.height, base_image.height)
+    if right <= left or bottom <= top:
+        return base_image
+
+    if (left, top, right, bottom) != (x, y, x + patch.width, y + patch.height):
+        patch = patch.crop((left - x, top - y, right - x, bottom - y))
+
+    box = (left, top, right, bottom)
+    region = base_image.crop(box)
+    if region.mode != "RGBA":
+        region = region.convert("RGBA")
+    region.alpha_composite(patch)
+
+    if base_image.mode != "RGBA":
+        region = region.convert(base_image.mode)
+    base_image.paste(region, box)
+    return base_image
+
+
 @dataclass
 class ImageOverlayOptions:
     """Настройки добавления пользовательского изображения поверх сгенерированного."""
@@ -26,10 +72,36 @@ class ImageOverlayOptions:
     opacity: float = 1.0
 
 
+def prepare_overlay_image(
+    base_image_bytes: bytes, overlay_image_bytes: bytes, max_size_ratio: float
+) -> bytes:
+    """
+    Подготовка логотипа/фото до выбора типа и позиции: декодирование
+    и уменьшение до наибольшей ширины, которую оверлей может занять
+    на базовом изображении.
+
+    Returns:
+        PNG-байты оверлея, пригодные для apply_image_overlay
+    """
+    with Image.open(io.BytesIO(base_image_bytes)) as base_image:
+        base_width = base_image.width
+
+    max_width = max(1, int(base_width * min(max(max_size_ratio, 0.05), 1.0)))
+    overlay_image = Image.open(io.BytesIO(overlay_image_bytes)).convert("RGBA")
+    if overlay_image.width > max_width:
+        height = max(1, int(overlay_image.height * max_width / overlay_image.width))
+        overlay_image = overlay_image.resize((max_width, height), Image.LANCZOS)
+
+    output = io.BytesIO()
+    overlay_image.save(output, format="PNG", compress_level=1)
+    return output.getvalue()
+
+
 def apply_image_overlay(
     base_image_bytes: bytes,
     overlay_image_bytes: bytes,
     options: ImageOverlayOptions | None = None,
+    encoding: EncodingOptions | None = None,
 ) -> bytes:
     """
     Накладывает пользовательское изображение (логотип/фото) поверх базовой картинки.
@@ -38,6 +110,7 @@ def apply_image_overlay(
         base_image_bytes: Исходное изображение
         overlay_image_bytes: Изображение, которое нужно добавить
         options: Настройки размещения
+        encoding: Формат и бюджет размера результата
 
     Returns:
         Байты изображения с добавленным оверлеем
@@ -45,7 +118,7 @@ def apply_image_overlay(
 
     cfg = options or ImageOverlayOptions()
 
-    base_image = Image.open(io.BytesIO(base_image_bytes)).convert("RGBA")
+    base_image = open_for_compositing(base_image_bytes)
     overlay_image = Image.open(io.BytesIO(overlay_image_bytes)).convert("RGBA")
 
     # Масштабируем логотип/фото относительно ширины базового изображения
@@ -85,15 +158,5 @@ def apply_image_overlay(
     x = max(0, min(origin[0], base_image.width - resized_overlay.width))
     y = max(0, min(origin[1], base_image.height - resized_overlay.height))
 
-    composed = base_image.copy()
-    composed.alpha_composite(resized_overlay, dest=(x, y))
-
-    output = io.BytesIO()
-    output_format = base_image.format or "PNG"
-
-    if output_format.upper() == "JPEG":
-        composed.convert("RGB").save(output, format=output_format, quality=95)
-    else:
-        composed.save(output, format=output_format)
-
-    return output.getvalue()
+    composite_region(base_image, resized_overlay, (x, y))
+    return encode_image(base_image, encoding)
@@ -0,0 +1,262 @@
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from typing import List, Optional
+
+from src.config import settings
+from src.services.rate_limiter import RateLimitError, RateLimitResult, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Стоимость операций в единицах лимита — примерное число обращений к API
+OPERATION_COSTS = {
+    "text": 1,
+    "content_plan": 2,
+    "voice": 1,
+    "image": 1,
+    "image_from_post": 3,  # промпт, изображение, информационный блок
+    "image_edit": 4,  # загрузка, анализ, промпт, изображение
+    "image_from_example": 4,
+}
+
+# Сколько единиц резервируется перед каждым вызовом модели (AIManager._generation)
+RESERVATION_COST = 1
+
+_spent_costs: ContextVar[Optional[List[int]]] = ContextVar("spent_costs", default=None)
+_reservations: ContextVar[Optional[List[str]]] = ContextVar(
+    "reservations", default=None
+)
+
+
+class OperationLimitExceeded(RateLimitError):
+    """Лимит пользователя исчерпан к моменту вызова модели"""
+
+    def __init__(self, result: RateLimitResult):
+        super().__init__("Превышен лимит операций пользователя")
+        self.result = result
+
+
+def open_operation_scope() -> None:
+    """
+    Счётчики стоимости и резервов для нового апдейта.
+
+    Списки создаются заранее, чтобы операции, выполненные в дочерних
+    задачах обработчика, попали в общий учёт апдейта.
+    """
+    _spent_costs.set([])
+    _reservations.set([])
+
+
+def charge_operation(operation: str) -> None:
+    """
+    Учитывает стоимость выполненной операции в текущем запросе.
+
+    Накопленная сумма списывается с лимита пользователя в
+    track_user_operation после успешной обработки.
+    """
+    spent = _spent_costs.get()
+    if spent is None:
+        spent = []
+        _spent_costs.set(spent)
+    spent.append(OPERATION_COSTS[operation])
+
+
+def take_spent_cost() -> int:
+    """Сумма стоимостей операций текущего запроса (счётчик обнуляется)"""
+    spent = _spent_costs.get()
+    if not spent:
+        return 0
+    cost = sum(spent)
+    spent.clear()
+    return cost
+
+
+def _remember_reservation(reservation_id: str) -> None:
+    reservations = _reservations.get()
+    if reservations is None:
+        reservations = []
+        _reservations.set(reservations)
+    reservations.append(reservation_id)
+
+
+def _forget_reservation(reservation_id: str) -> None:
+    reservations = _reservations.get()
+    if reservations and reservation_id in reservations:
+        reservations.remove(reservation_id)
+
+
+def _take_reservations() -> List[str]:
+    reservations = _reservations.get()
+    if not reservations:
+        return []
+    taken = list(reservations)
+    reservations.clear()
+    return taken
+
+
+def has_open_reservations() -> bool:
+    """Остались ли в текущем апдейте резервы, которые не списаны и не возвращены"""
+    return bool(_reservations.get())
+
+
+def _limit_key(user_id: int) -> str:
+    return f"user:{user_id}:operations"
+
+
+def _reservations_key(user_id: int) -> str:
+    return f"rate_limit:user:{user_id}:reservations"
+
+
+async def _get_redis():
+    if not rate_limiter.redis_client:
+        await rate_limiter.initialize()
+    return rate_limiter.redis_client
+
+
+async def check_operation_budget(user_id: int) -> RateLimitResult:
+    """
+    Проверка остатка лимита без записи операции.
+
+    Используется при входе в сценарий: единица резервируется позже,
+    непосредственно перед вызовом модели (reserve_operation).
+    """
+    return await rate_limiter.acquire(
+        key=_limit_key(user_id),
+        max_requests=settings.USER_OPERATIONS_LIMIT,
+        window_seconds=settings.USER_OPERATIONS_WINDOW,
+        burst=settings.USER_OPERATIONS_BURST or None,
+        cost=0,
+    )
+
+
+async def reserve_operation(user_id: int) -> str:
+    """
+    Резерв RESERVATION_COST единиц лимита перед вызовом модели.
+
+    Проверка и резерв выполняются одним вызовом скрипта, поэтому два
+    одновременных запроса не могут оба пройти по последней единице.
+    Id резерва хранится в контексте апдейта и в хэше пользователя в Redis;
+    резерв засчитывается в settle_operation или возвращается
+    в refund_operation — каждый ровно один раз (HDEL).
+
+    Raises:
+        OperationLimitExceeded: Лимит пользователя исчерпан
+    """
+    reservation_id = uuid.uuid4().hex
+    result = await rate_limiter.acquire(
+        key=_limit_key(user_id),
+        max_requests=settings.USER_OPERATIONS_LIMIT,
+        window_seconds=settings.USER_OPERATIONS_WINDOW,
+        burst=settings.USER_OPERATIONS_BURST or None,
+        cost=RESERVATION_COST,
+        operation_id=reservation_id,
+    )
+    if not result.allowed:
+        raise OperationLimitExceeded(result)
+
+    try:
+        redis_client = await _get_redis()
+        key = _reservations_key(user_id)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hset(key, reservation_id, time.time())
+            pipe.expire(key, settings.USER_OPERATIONS_WINDOW)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить резерв лимита для user {user_id}: {e}")
+
+    _remember_reservation(reservation_id)
+    return reservation_id
+
+
+async def _release_reservation(user_id: int, reservation_id: str) -> None:
+    await rate_limiter.release(
+        key=_limit_key(user_id),
+        max_requests=settings.USER_OPERATIONS_LIMIT,
+        window_seconds=settings.USER_OPERATIONS_WINDOW,
+        operation_id=reservation_id,
+        cost=RESERVATION_COST,
+    )
+
+
+async def settle_operation(user_id: int, cost: int) -> RateLimitResult:
+    """
+    Списание стоимости выполненных операций текущего апдейта.
+
+    Резервы апдейта, которые ещё открыты, входят в стоимость; резерв,
+    уже возвращённый при выходе из сценария, не вычитается. Операция уже
+    выполнена, поэтому записывается даже сверх лимита.
+    """
+    reservation_ids = _take_reservations()
+    if reservation_ids:
+        try:
+            redis_client = await _get_redis()
+            settled = await redis_client.hdel(
+                _reservations_key(user_id), *reservation_ids
+            )
+            cost -= settled * RESERVATION_COST
+        except Exception as e:
+            logger.warning(f"Не удалось закрыть резерв лимита для user {user_id}: {e}")
+
+    return await rate_limiter.acquire(
+        key=_limit_key(user_id),
+        max_requests=settings.USER_OPERATIONS_LIMIT,
+        window_seconds=settings.USER_OPERATIONS_WINDOW,
+        burst=settings.USER_OPERATIONS_BURST or None,
+        cost=max(cost, 0),
+        overdraw=True,
+    )
+
+
+async def refund_operation(user_id: int, reservation_id: str) -> None:
+    """Возврат резерва генерации, которая не завершилась успешно"""
+    _forget_reservation(reservation_id)
+    try:
+        redis_client = await _get_redis()
+        if await redis_client.hdel(_reservations_key(user_id), reservation_id):
+            await _release_reservation(user_id, reservation_id)
+    except Exception as e:
+        logger.warning(f"Не удалось вернуть резерв лимита для user {user_id}: {e}")
+
+
+async def refund_open_reservations(user_id: int) -> int:
+    """
+    Возврат резервов пользователя, оставшихся от прерванных апдейтов
+    (вызывается при выходе из сценария).
+
+    Резервы текущего апдейта не трогаются. Если резерв ещё используется
+    другим апдейтом, тот после генерации спишет полную стоимость.
+
+    Returns:
+        Сколько резервов возвращено
+    """
+    redis_client = await _get_redis()
+    key = _reservations_key(user_id)
+    reservations = await redis_client.hgetall(key)
+    current = set(_reservations.get() or ())
+    candidates = [
+        (reservation_id, reserved_at)
+        for reservation_id, reserved_at in reservations.items()
+        if reservation_id not in current
+    ]
+    if not candidates:
+        return 0
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for reservation_id, _ in candidates:
+            pipe.hdel(key, reservation_id)
+        owned = await pipe.execute()
+
+    refunded = 0
+    for (reservation_id, reserved_at), deleted in zip(candidates, owned):
+        if not deleted:
+            continue
+        try:
+            age = time.time() - float(reserved_at)
+        except ValueError:
+            continue
+        # Записи старше окна уже выпали из лимита
+        if age < settings.USER_OPERATIONS_WINDOW:
+            await _release_reservation(user_id, reservation_id)
+            refunded += 1
+    return refunded
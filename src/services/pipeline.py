@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    inputs: Tuple[str, ...] = ()
+
+
+class Pipeline:
+    """
+    Исполнитель многошаговой генерации в виде графа зависимостей.
+
+    Каждый шаг объявляет, результаты каких шагов ему нужны; они передаются
+    в функцию шага именованными аргументами. Независимые шаги выполняются
+    одновременно, поэтому общее время равно самой длинной цепочке.
+
+    Usage:
+        pipeline = Pipeline()
+        pipeline.add("prompt", lambda: generate_prompt(post))
+        pipeline.add("image", lambda prompt: generate_image(prompt), "prompt")
+        pipeline.add("info_text", lambda: generate_info(post))
+        results = await pipeline.run()
+    """
+
+    def __init__(self):
+        self._steps: Dict[str, Step] = {}
+
+    def add(
+        self, name: str, func: Callable[..., Awaitable[Any]], *inputs: str
+    ) -> "Pipeline":
+        if name in self._steps:
+            raise ValueError(f"Step '{name}' is already defined")
+        self._steps[name] = Step(name=name, func=func, inputs=tuple(inputs))
+        return self
+
+    def _ordered_steps(self) -> List[Step]:
+        """Шаги в порядке зависимостей (с проверкой графа)"""
+        ordered: List[Step] = []
+        state: Dict[str, str] = {}
+
+        def visit(step: Step) -> None:
+            if state.get(step.name) == "done":
+                return
+            if state.get(step.name) == "visiting":
+                raise ValueError(f"Pipeline has a cycle at step '{step.name}'")
+
+            state[step.name] = "visiting"
+            for dependency in step.inputs:
+                if dependency not in self._steps:
+                    raise ValueError(
+                        f"Step '{step.name}' depends on unknown step '{dependency}'"
+                    )
+                visit(self._steps[dependency])
+            state[step.name] = "done"
+            ordered.append(step)
+
+        for step in self._steps.values():
+            visit(step)
+        return ordered
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Выполнение всех шагов
+
+        Returns:
+            Результаты шагов по именам
+
+        Raises:
+            Исключение первого упавшего шага; остальные шаги отменяются
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: Step) -> Any:
+            kwargs = {name: await tasks[name] for name in step.inputs}
+            return await step.func(**kwargs)
+
+        for step in self._ordered_steps():
+            tasks[step.name] = asyncio.create_task(
+                run_step(step), name=f"pipeline:{step.name}"
+            )
+
+        try:
+            done, pending = await asyncio.wait(
+                tasks.values(), return_when=asyncio.FIRST_EXCEPTION
+            )
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        return {name: task.result() for name, task in tasks.items()}
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from src.config import settings
+from src.services.deadline import DeadlineExceeded, get_deadline
+from src.services.rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+# Сколько секунд реплика использует прочитанный из Redis бюджет
+BUDGET_REFRESH_SECONDS = 5.0
+# Без ответов 429 сниженный бюджет через час возвращается к максимуму
+BUDGET_TTL = 3600
+# После 429 бюджет уменьшается вдвое, но не чаще раза в COOLDOWN секунд
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 10
+# После стольких успешных ответов подряд бюджет растёт на 10% от максимума
+INCREASE_AFTER_SUCCESSES = 20
+INCREASE_STEP_RATIO = 0.1
+MIN_WAIT = 0.05
+
+
+class ProviderLimiter:
+    """
+    Общий для всех реплик бота лимит запросов к GigaChat и Salute.
+
+    У каждого типа запросов (chat, image, files, recognition) свой бюджет
+    в запросах в минуту; окно хранится в Redis через rate_limiter. Ответ 429
+    уменьшает бюджет для всех реплик, серия успешных ответов — увеличивает
+    его обратно до значения из настроек.
+
+    Usage:
+        await provider_limiter.acquire("gigachat:chat")
+        response = await client.post(...)
+        await provider_limiter.record("gigachat:chat", response.status_code)
+    """
+
+    KEY_PREFIX = "provider_limit"
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        self._limits = limits
+        self._budgets: Dict[str, Tuple[int, float]] = {}
+        self._successes: Dict[str, int] = defaultdict(int)
+
+        self.throttled: Dict[str, int] = defaultdict(int)
+        self.waits: Dict[str, int] = defaultdict(int)
+        self.wait_time: Dict[str, float] = defaultdict(float)
+
+    @property
+    def limits(self) -> Dict[str, int]:
+        if self._limits is None:
+            self._limits = {
+                "gigachat:chat": settings.GIGACHAT_CHAT_RPM,
+                "gigachat:image": settings.GIGACHAT_IMAGE_RPM,
+                "gigachat:files": settings.GIGACHAT_FILES_RPM,
+                "salute:recognition": settings.SALUTE_RECOGNITION_RPM,
+            }
+        return self._limits
+
+    def _budget_key(self, endpoint: str) -> str:
+        return f"{self.KEY_PREFIX}:{endpoint}:budget"
+
+    def _cooldown_key(self, endpoint: str) -> str:
+        return f"{self.KEY_PREFIX}:{endpoint}:cooldown"
+
+    async def _get_redis(self):
+        if not rate_limiter.redis_client:
+            await rate_limiter.initialize()
+        return rate_limiter.redis_client
+
+    async def get_budget(self, endpoint: str, refresh: bool = False) -> int:
+        """Текущий бюджет в запросах в минуту (общий для всех реплик)"""
+        cached = self._budgets.get(endpoint)
+        if (
+            not refresh
+            and cached is not None
+            and time.monotonic() - cached[1] < BUDGET_REFRESH_SECONDS
+        ):
+            return cached[0]
+
+        max_budget = self.limits[endpoint]
+        try:
+            redis_client = await self._get_redis()
+            value = await redis_client.get(self._budget_key(endpoint))
+        except Exception as e:
+            logger.warning(f"Бюджет запросов {endpoint} недоступен: {e}")
+            value = None
+
+        budget = min(int(value), max_budget) if value else max_budget
+        self._budgets[endpoint] = (budget, time.monotonic())
+        return budget
+
+    async def _set_budget(self, endpoint: str, budget: int) -> None:
+        redis_client = await self._get_redis()
+        await redis_client.set(self._budget_key(endpoint), budget, ex=BUDGET_TTL)
+        self._budgets[endpoint] = (budget, time.monotonic())
+
+    async def acquire(self, endpoint: str) -> None:
+        """
+        Ожидание свободного слота для запроса к API
+
+        Raises:
+            DeadlineExceeded: Если слот освободится позже срока запроса
+        """
+        if not settings.PROVIDER_LIMIT_ENABLED:
+            return
+
+        started = time.monotonic()
+        while True:
+            budget = await self.get_budget(endpoint)
+            try:
+                result = await rate_limiter.acquire(
+                    key=f"{self.KEY_PREFIX}:{endpoint}",
+                    max_requests=budget,
+                    window_seconds=WINDOW_SECONDS,
+                )
+            except Exception as e:
+                # Недоступность Redis не должна останавливать генерацию
+                logger.warning(f"Лимит запросов {endpoint} недоступен: {e}")
+                return
+
+            if result.allowed:
+                break
+
+            wait_time = max(result.reset_after, MIN_WAIT)
+            deadline = get_deadline()
+            if deadline is not None and deadline.remaining() <= wait_time:
+                raise DeadlineExceeded(f"Provider rate limit for {endpoint}")
+            await asyncio.sleep(wait_time + random.uniform(0, MIN_WAIT))
+
+        waited = time.monotonic() - started
+        if waited >= MIN_WAIT:
+            self.waits[endpoint] += 1
+            self.wait_time[endpoint] += waited
+
+    async def record(self, endpoint: str, status_code: int) -> None:
+        """Учёт ответа API для адаптации бюджета"""
+        if not settings.PROVIDER_LIMIT_ENABLED:
+            return
+
+        try:
+            if status_code == 429:
+                await self._on_throttled(endpoint)
+            elif status_code < 400:
+                self._successes[endpoint] += 1
+                if self._successes[endpoint] >= INCREASE_AFTER_SUCCESSES:
+                    self._successes[endpoint] = 0
+                    await self._on_success_streak(endpoint)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить бюджет запросов {endpoint}: {e}")
+
+    async def _on_throttled(self, endpoint: str) -> None:
+        self.throttled[endpoint] += 1
+        self._successes[endpoint] = 0
+
+        redis_client = await self._get_redis()
+        # Волна 429 от одного всплеска снижает бюджет один раз на все реплики
+        if not await redis_client.set(
+            self._cooldown_key(endpoint), 1, nx=True, ex=DECREASE_COOLDOWN
+        ):
+            return
+
+        budget = await self.get_budget(endpoint, refresh=True)
+        new_budget = max(1, int(budget * DECREASE_FACTOR))
+        await self._set_budget(endpoint, new_budget)
+        logger.warning(
+            f"Ответ 429 от {endpoint}: бюджет снижен до {new_budget} запросов в минуту"
+        )
+
+    async def _on_success_streak(self, endpoint: str) -> None:
+        redis_client = await self._get_redis()
+        if await redis_client.exists(self._cooldown_key(endpoint)):
+            return
+
+        max_budget = self.limits[endpoint]
+        budget = await self.get_budget(endpoint, refresh=True)
+        if budget >= max_budget:
+            return
+
+        step = max(1, int(max_budget * INCREASE_STEP_RATIO))
+        await self._set_budget(endpoint, min(max_budget, budget + step))
+
+    def get_stats(self) -> dict:
+        return {
+            endpoint: {
+                "limit": limit,
+                "budget": self._budgets.get(endpoint, (limit, 0.0))[0],
+                "throttled": self.throttled[endpoint],
+                "waits": self.waits[endpoint],
+                "wait_time": round(self.wait_time[endpoint], 3),
+            }
+            for endpoint, limit in self.limits.items()
+        }
+
+
+provider_limiter = ProviderLimiter()
@@ -1,6 +1,7 @@
 import redis.asyncio as redis
+from dataclasses import dataclass
 from typing import Optional
-import time
+import uuid
 from src.config import settings
 
 
@@ -10,12 +11,154 @@ class RateLimitError(Exception):
     pass
 
 
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Результат проверки лимита"""
+
+    allowed: bool
+    remaining: int
+    # Через сколько секунд освободится ближайший слот (0 — окно пустое)
+    reset_after: float
+
+
+# Скользящее окно: очистка, проверка, запись и подсчёт остатка за один вызов.
+# KEYS[1] — ZSET операций; ARGV: лимит, окно (сек), стоимость, id операции,
+# overdraw (0/1). Операция допускается, пока лимит не исчерпан, и списывается
+# целиком (дорогая операция может уйти за лимит). Стоимость 0 — только
+# проверка; overdraw=1 записывает уже выполненную операцию даже сверх лимита.
+# Время берётся у Redis, поэтому все реплики бота считают окно по одним часам.
+SLIDING_WINDOW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local overdraw = ARGV[5] == '1'
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+
+local allowed = 0
+if cost == 0 then
+    if count < limit then
+        allowed = 1
+    end
+elseif count < limit or overdraw then
+    allowed = 1
+    for i = 1, cost do
+        redis.call('ZADD', KEYS[1], now, ARGV[4] .. ':' .. i)
+    end
+    redis.call('EXPIRE', KEYS[1], math.ceil(window))
+    count = count + cost
+end
+
+-- Момент, когда истечёт запись, после которой лимит снова станет доступен
+local reset_ms = 0
+local index = math.max(count - limit, 0)
+local entry = redis.call('ZRANGE', KEYS[1], index, index, 'WITHSCORES')
+if entry[2] then
+    reset_ms = math.max(0, math.ceil((tonumber(entry[2]) + window - now) * 1000))
+end
+
+return {allowed, math.max(limit - count, 0), reset_ms}
+"""
+
+# GCRA: один ключ на субъект с теоретическим временем прихода (TAT).
+# Устойчивая скорость — limit операций за window, burst — сколько операций
+# можно выполнить подряд. KEYS[1] — строка с TAT; ARGV: лимит, окно (сек),
+# стоимость, burst, overdraw (0/1). Как и в скользящем окне, стоимость
+# списывается целиком, если лимит не исчерпан (или всегда при overdraw=1).
+# Ключ живёт, пока «ведро» не опустеет.
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local burst = tonumber(ARGV[4])
+local overdraw = ARGV[5] == '1'
+
+local interval = window / limit
+local tolerance = interval * burst
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+
+local allowed = 0
+if tat + interval - now <= tolerance then
+    allowed = 1
+end
+
+if overdraw and cost > 0 then
+    allowed = 1
+end
+
+if allowed == 1 and cost > 0 then
+    tat = tat + interval * cost
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+end
+
+local remaining = math.floor((tolerance - (tat - now)) / interval + 0.000001)
+local reset_ms = math.max(0, math.ceil((tat + interval - tolerance - now) * 1000))
+
+return {allowed, math.max(remaining, 0), reset_ms}
+"""
+
+# Возврат записанной операции (резерв, который не понадобился).
+# Скользящее окно: KEYS[1] — ZSET; ARGV: стоимость, id операции.
+SLIDING_WINDOW_RELEASE_SCRIPT = """
+local removed = 0
+for i = 1, tonumber(ARGV[1]) do
+    removed = removed + redis.call('ZREM', KEYS[1], ARGV[2] .. ':' .. i)
+end
+return removed
+"""
+
+# GCRA: KEYS[1] — строка с TAT; ARGV: лимит, окно (сек), стоимость.
+# TAT сдвигается назад, но не раньше текущего момента.
+GCRA_RELEASE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat then
+    return 0
+end
+
+tat = tat - tonumber(ARGV[2]) / tonumber(ARGV[1]) * tonumber(ARGV[3])
+if tat <= now then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+end
+return 1
+"""
+
+ALGORITHMS = ("sliding_window", "gcra")
+
+
 class RateLimiter:
-    """Rate limiter на основе Redis"""
+    """
+    Rate limiter на основе Redis.
 
-    def __init__(self, redis_url: Optional[str] = None):
+    Алгоритм задаётся RATE_LIMIT_ALGORITHM: "sliding_window" хранит каждую
+    операцию в ZSET (точное окно, память растёт с числом операций), "gcra"
+    хранит одно значение на ключ и поддерживает burst.
+    """
+
+    def __init__(
+        self, redis_url: Optional[str] = None, algorithm: Optional[str] = None
+    ):
         self.redis_client: Optional[redis.Redis] = None
         self.redis_url = redis_url or "redis://localhost:6379"
+        self.algorithm = algorithm or settings.RATE_LIMIT_ALGORITHM
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm: {self.algorithm}")
+        self._sliding_window = None
+        self._gcra = None
+        self._sliding_window_release = None
+        self._gcra_release = None
 
     async def initialize(self):
         """Инициализация подключения к Redis"""
@@ -23,48 +166,126 @@ class RateLimiter:
             self.redis_client = await redis.from_url(
                 self.redis_url, decode_responses=True
             )
+            # Скрипт вызывается через EVALSHA и загружается в Redis при первом вызове
+            self._sliding_window = self.redis_client.register_script(
+                SLIDING_WINDOW_SCRIPT
+            )
+            self._gcra = self.redis_client.register_script(GCRA_SCRIPT)
+            self._sliding_window_release = self.redis_client.register_script(
+                SLIDING_WINDOW_RELEASE_SCRIPT
+            )
+            self._gcra_release = self.redis_client.register_script(GCRA_RELEASE_SCRIPT)
 
     async def close(self):
         """Закрытие подключения к Redis"""
         if self.redis_client:
             await self.redis_client.close()
 
-    async def check_rate_limit(
-        self, key: str, max_requests: int, window_seconds: int
-    ) -> bool:
+    async def acquire(
+        self,
+        key: str,
+        max_requests: int,
+        window_seconds: int,
+        cost: int = 1,
+        burst: Optional[int] = None,
+        operation_id: Optional[str] = None,
+        overdraw: bool = False,
+    ) -> RateLimitResult:
         """
-        Проверка rate limit для ключа
+        Атомарная проверка и запись операции за один запрос к Redis
 
         Args:
             key: Уникальный ключ (например, "gigachat:api" или "user:123")
             max_requests: Максимальное количество запросов
             window_seconds: Временное окно в секундах
+            cost: Стоимость операции в единицах лимита; 0 — только проверить остаток
+            burst: Операций подряд для GCRA (по умолчанию max_requests)
+            operation_id: Id записи для последующего release (по умолчанию случайный)
+            overdraw: Записать операцию даже при исчерпанном лимите
 
         Returns:
-            True если запрос можно выполнить, False если достигнут лимит
+            Разрешена ли операция, остаток и время до освобождения слота
         """
         if not self.redis_client:
             await self.initialize()
 
-        current_time = time.time()
-        window_start = current_time - window_seconds
+        if self.algorithm == "gcra":
+            allowed, remaining, reset_ms = await self._gcra(
+                keys=[f"rate_limit:gcra:{key}"],
+                args=[
+                    max_requests,
+                    window_seconds,
+                    cost,
+                    burst or max_requests,
+                    int(overdraw),
+                ],
+            )
+        else:
+            allowed, remaining, reset_ms = await self._sliding_window(
+                keys=[f"rate_limit:{key}"],
+                args=[
+                    max_requests,
+                    window_seconds,
+                    cost,
+                    operation_id or uuid.uuid4().hex,
+                    int(overdraw),
+                ],
+            )
+        return RateLimitResult(
+            allowed=bool(allowed),
+            remaining=int(remaining),
+            reset_after=int(reset_ms) / 1000,
+        )
 
-        # Ключ для хранения списка запросов
-        rate_key = f"rate_limit:{key}"
+    async def release(
+        self,
+        key: str,
+        max_requests: int,
+        window_seconds: int,
+        operation_id: str,
+        cost: int = 1,
+    ) -> None:
+        """
+        Вернуть в лимит операцию, записанную через acquire с operation_id
 
-        await self.redis_client.zremrangebyscore(rate_key, 0, window_start)
-        request_count = await self.redis_client.zcard(rate_key)
+        Для GCRA операции не различаются: возвращается cost единиц.
+        """
+        if not self.redis_client:
+            await self.initialize()
 
-        if request_count >= max_requests:
-            return False
+        if self.algorithm == "gcra":
+            await self._gcra_release(
+                keys=[f"rate_limit:gcra:{key}"],
+                args=[max_requests, window_seconds, cost],
+            )
+        else:
+            await self._sliding_window_release(
+                keys=[f"rate_limit:{key}"],
+                args=[cost, operation_id],
+            )
 
-        await self.redis_client.zadd(rate_key, {str(current_time): current_time})
-        await self.redis_client.expire(rate_key, window_seconds)
+    async def check_rate_limit(
+        self,
+        key: str,
+        max_requests: int,
+        window_seconds: int,
+        burst: Optional[int] = None,
+    ) -> bool:
+        """
+        Проверка rate limit для ключа с записью операции
 
-        return True
+        Returns:
+            True если запрос можно выполнить, False если достигнут лимит
+        """
+        result = await self.acquire(key, max_requests, window_seconds, burst=burst)
+        return result.allowed
 
     async def get_remaining_requests(
-        self, key: str, max_requests: int, window_seconds: int
+        self,
+        key: str,
+        max_requests: int,
+        window_seconds: int,
+        burst: Optional[int] = None,
     ) -> int:
         """
         Получить количество оставшихся запросов
@@ -72,24 +293,24 @@ class RateLimiter:
         Returns:
             Количество доступных запросов
         """
-        if not self.redis_client:
-            await self.initialize()
-
-        current_time = time.time()
-        window_start = current_time - window_seconds
-
-        rate_key = f"rate_limit:{key}"
-
-        await self.redis_client.zremrangebyscore(rate_key, 0, window_start)
-        request_count = await self.redis_client.zcard(rate_key)
-
-        return max(0, max_requests - request_count)
+        result = await self.acquire(
+            key, max_requests, window_seconds, cost=0, burst=burst
+        )
+        return result.remaining
 
-    async def track_operation(self, key: str, max_requests: int, window_seconds: int):
+    async def track_operation(
+        self,
+        key: str,
+        max_requests: int,
+        window_seconds: int,
+        burst: Optional[int] = None,
+    ):
         """
         Отслеживание операции (вызывается вручную в handlers)
         """
-        can_proceed = await self.check_rate_limit(key, max_requests, window_seconds)
+        can_proceed = await self.check_rate_limit(
+            key, max_requests, window_seconds, burst=burst
+        )
         if not can_proceed:
             raise RateLimitError(
                 f"Превышен лимит: {max_requests} операций в течение {window_seconds // 60} минут"
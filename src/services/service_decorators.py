@@ -1,55 +1,202 @@
 import asyncio
 import logging
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from functools import wraps
-from typing import Callable, Awaitable
+from typing import Awaitable, Callable, Dict, Iterator, Optional
 import httpx
 from src.config import settings
+from src.services.deadline import get_deadline
 
 logger = logging.getLogger(__name__)
 
 
+# Статусы, при которых повтор имеет смысл; остальные 4xx считаются фатальными
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class RetryBudget:
+    """Общий на один пользовательский запрос запас повторов"""
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+
+    def try_spend(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+_retry_budget: ContextVar[Optional[RetryBudget]] = ContextVar(
+    "retry_budget", default=None
+)
+
+
+@contextmanager
+def retry_budget_scope() -> Iterator[RetryBudget]:
+    """
+    Область действия бюджета повторов.
+
+    Вложенные вызовы используют бюджет внешнего, поэтому стек из нескольких
+    декораторов не умножает количество HTTP запросов.
+    """
+    budget = _retry_budget.get()
+    if budget is not None:
+        yield budget
+        return
+
+    budget = RetryBudget(settings.RETRY_BUDGET)
+    token = _retry_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _retry_budget.reset(token)
+
+
+class RetryStats:
+    """Счётчики повторов по функциям"""
+
+    def __init__(self):
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.exhausted: Dict[str, int] = defaultdict(int)
+        self.fatal: Dict[str, int] = defaultdict(int)
+
+    def as_dict(self) -> dict:
+        names = set(self.retries) | set(self.exhausted) | set(self.fatal)
+        return {
+            name: {
+                "retries": self.retries[name],
+                "exhausted": self.exhausted[name],
+                "fatal": self.fatal[name],
+            }
+            for name in sorted(names)
+        }
+
+
+retry_stats = RetryStats()
+
+
+def _find_http_error(exc: BaseException) -> Optional[httpx.HTTPError]:
+    """Исходная ошибка httpx (клиенты оборачивают её в Exception через `from e`)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, httpx.HTTPError):
+            return exc
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Сетевые ошибки, таймауты, 429 и 5xx повторяются; остальное — нет"""
+    http_error = _find_http_error(exc)
+    if isinstance(http_error, httpx.HTTPStatusError):
+        return http_error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(http_error, httpx.TransportError)
+
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """Значение заголовка Retry-After в секундах, если сервер его прислал"""
+    http_error = _find_http_error(exc)
+    if not isinstance(http_error, httpx.HTTPStatusError):
+        return None
+
+    value = http_error.response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _backoff(attempt: int) -> float:
+    """Экспоненциальная задержка с полным джиттером"""
+    cap = min(settings.RETRY_MIN_WAIT * (2**attempt), settings.RETRY_MAX_WAIT)
+    return random.uniform(0, cap)
+
+
 def with_retry(func: Callable):
     """
     Декоратор для retry
 
+    Повторяет только временные ошибки (см. `is_retryable`), учитывает
+    Retry-After и расходует общий на запрос бюджет повторов.
+
     Usage:
         @with_retry
         async def my_api_call():
             ...
     """
+    name = func.__qualname__
 
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        last_exception = None
-
-        for attempt in range(settings.MAX_RETRIES):
-            try:
-                return await func(*args, **kwargs)
-            except (httpx.HTTPError, httpx.TimeoutException) as e:
-                last_exception = e
-                if attempt < settings.MAX_RETRIES - 1:
-                    wait_time = min(
-                        settings.RETRY_MIN_WAIT * (2**attempt), settings.RETRY_MAX_WAIT
+        with retry_budget_scope() as budget:
+            for attempt in range(settings.MAX_RETRIES):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    if not is_retryable(e):
+                        retry_stats.fatal[name] += 1
+                        raise
+
+                    retry_after = get_retry_after(e)
+                    wait_time = (
+                        retry_after if retry_after is not None else _backoff(attempt)
                     )
+                    deadline = get_deadline()
+                    if (
+                        attempt >= settings.MAX_RETRIES - 1
+                        or (
+                            retry_after is not None
+                            and retry_after > settings.RETRY_MAX_WAIT
+                        )
+                        # После паузы не останется времени на сам запрос
+                        or (deadline is not None and deadline.remaining() <= wait_time)
+                        or not budget.try_spend()
+                    ):
+                        retry_stats.exhausted[name] += 1
+                        logger.error(f"All retries failed for {name}: {str(e)}")
+                        raise
+
+                    retry_stats.retries[name] += 1
                     logger.warning(
-                        f"Retry {attempt + 1}/{settings.MAX_RETRIES} "
-                        f"after {wait_time}s: {str(e)}"
+                        f"Retry {attempt + 1}/{settings.MAX_RETRIES} of {name} "
+                        f"after {wait_time:.1f}s: {str(e)}"
                     )
                     await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"All retries failed: {str(e)}")
-
-        raise last_exception
 
     return wrapper
 
 
+def get_retry_stats() -> dict:
+    """Метрики повторов: выполненные, исчерпанные и фатальные ошибки"""
+    return retry_stats.as_dict()
+
+
+# Максимальная длина подписи к фото в Telegram
+MAX_TEXT_LENGTH = 1024
+
+
 class TextLengthLimitError(Exception):
     """Raised when we fail to produce text within configured limits."""
 
 
 def ensure_text_length(
-    max_length: int = 1024,
+    max_length: int = MAX_TEXT_LENGTH,
     max_attempts: int = 3,
 ) -> Callable[[Callable[..., Awaitable[str]]], Callable[..., Awaitable[str]]]:
     """
@@ -59,18 +206,20 @@ def ensure_text_length(
     def decorator(func: Callable[..., Awaitable[str]]):
         @wraps(func)
         async def wrapper(*args, **kwargs) -> str:
-            for attempt in range(max_attempts):
-                text = await func(*args, **kwargs)
-                sanitized = (text or "").strip()
-                if not sanitized or len(sanitized) <= max_length:
-                    return sanitized
-
-                logger.warning(
-                    "Generated text exceeded %s chars on attempt %s/%s",
-                    max_length,
-                    attempt + 1,
-                    max_attempts,
-                )
+            # Все попытки генерации делят один бюджет повторов при ошибках
+            with retry_budget_scope():
+                for attempt in range(max_attempts):
+                    text = await func(*args, **kwargs)
+                    sanitized = (text or "").strip()
+                    if not sanitized or len(sanitized) <= max_length:
+                        return sanitized
+
+                    logger.warning(
+                        "Generated text exceeded %s chars on attempt %s/%s",
+                        max_length,
+                        attempt + 1,
+                        max_attempts,
+                    )
 
             raise TextLengthLimitError(
                 f"Max length {max_length} exceeded after {max_attempts} attempts"
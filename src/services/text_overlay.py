@@ -1,16 +1,36 @@
 from __future__ import annotations
 
-import io
 import logging
 import random
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Sequence, Tuple
 
 from PIL import Image, ImageDraw, ImageFont
 
+from src.services.image_encoding import EncodingOptions, encode_image
+from src.services.image_overlay import composite_region, open_for_compositing
+
 logger = logging.getLogger(__name__)
 
+# Во сколько раз можно увеличить шрифт для короткого текста
+MAX_FONT_SCALE = 1.8
+# Какую долю max_width может занять самая широкая строка при увеличении
+FIT_WIDTH_RATIO = 0.9
+
+
+@lru_cache(maxsize=64)
+def _load_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Шрифт FreeType, загруженный с диска один раз для (path, size)"""
+    return ImageFont.truetype(path, size=size)
+
+
+@lru_cache(maxsize=8192)
+def _text_width(path: str, size: int, text: str) -> float:
+    """Ширина слова или строки для шрифта (path, size)"""
+    return _load_font(path, size).getlength(text)
+
 
 @dataclass
 class TextOverlayConfig:
@@ -62,7 +82,7 @@ class TextOverlayService:
                 continue
 
             try:
-                ImageFont.truetype(path, size=25)
+                _load_font(path, 25)
                 resolved[font_name] = path
             except Exception:
                 continue
@@ -73,28 +93,31 @@ class TextOverlayService:
         """Возвращает список доступных шрифтов."""
         return list(self._resolved_fonts.keys())
 
-    def _get_font(
-        self, size: int, font_variant: Optional[str] = None
-    ) -> ImageFont.FreeTypeFont:
-        """Загружает шрифт нужного размера."""
+    def _get_font_path(self, font_variant: Optional[str] = None) -> str:
+        """Путь к шрифту: выбранный пользователем или случайный из доступных."""
         if font_variant:
             key = font_variant.strip().lower()
             path = self._resolved_fonts.get(key)
             if path:
-                return ImageFont.truetype(path, size=size)
+                return path
 
         # Случайный шрифт из доступных
-        path = random.choice(list(self._resolved_fonts.values()))
-        return ImageFont.truetype(path, size=size)
+        return random.choice(list(self._resolved_fonts.values()))
 
     def _wrap_text(
         self,
         text: str,
-        draw: ImageDraw.ImageDraw,
-        font: ImageFont.FreeTypeFont,
+        font_path: str,
+        font_size: int,
         max_width: int,
     ) -> List[str]:
-        """Разбивает текст на строки по ширине."""
+        """
+        Разбивает текст на строки по ширине.
+
+        Ширина строки считается как сумма закэшированных ширин слов и пробелов,
+        поэтому перенос линеен по длине текста.
+        """
+        space_width = _text_width(font_path, font_size, " ")
         lines = []
         for paragraph in text.strip().splitlines():
             paragraph = paragraph.strip()
@@ -102,28 +125,76 @@ class TextOverlayService:
                 lines.append("")
                 continue
 
-            words = paragraph.split()
-            current_line = ""
-            for word in words:
-                test_line = f"{current_line} {word}".strip()
-                if draw.textlength(test_line, font=font) <= max_width:
-                    current_line = test_line
+            current_words: List[str] = []
+            current_width = 0.0
+            for word in paragraph.split():
+                word_width = _text_width(font_path, font_size, word)
+                if not current_words:
+                    current_words, current_width = [word], word_width
+                    continue
+
+                test_width = current_width + space_width + word_width
+                if test_width <= max_width:
+                    current_words.append(word)
+                    current_width = test_width
                 else:
-                    if current_line:
-                        lines.append(current_line)
-                    current_line = word
+                    lines.append(" ".join(current_words))
+                    current_words, current_width = [word], word_width
 
-            if current_line:
-                lines.append(current_line)
+            if current_words:
+                lines.append(" ".join(current_words))
 
         return lines
 
+    @staticmethod
+    def _max_line_width(lines: List[str], font_path: str, font_size: int) -> float:
+        return max(
+            (_text_width(font_path, font_size, line) for line in lines if line),
+            default=0,
+        )
+
+    def _fit_font_size(
+        self, text: str, font_path: str, base_size: int, max_width: int
+    ) -> Tuple[int, List[str]]:
+        """
+        Размер шрифта и перенос строк.
+
+        Короткий текст (до 3 строк), занимающий меньше 70% ширины, увеличивается:
+        бинарным поиском выбирается наибольший размер до MAX_FONT_SCALE,
+        при котором число строк не растёт, а самая широкая строка
+        не шире FIT_WIDTH_RATIO от max_width.
+        """
+        lines = self._wrap_text(text, font_path, base_size, max_width)
+        text_width = self._max_line_width(lines, font_path, base_size)
+        coverage = text_width / max_width if max_width else 1
+        if len(lines) > 3 or coverage >= 0.7:
+            return base_size, lines
+
+        best_size, best_lines = base_size, lines
+        low, high = base_size + 1, int(base_size * MAX_FONT_SCALE)
+        while low <= high:
+            size = (low + high) // 2
+            candidate = self._wrap_text(text, font_path, size, max_width)
+            candidate_width = self._max_line_width(candidate, font_path, size)
+            fits = (
+                len(candidate) <= len(lines)
+                and candidate_width <= max_width * FIT_WIDTH_RATIO
+            )
+            if fits:
+                best_size, best_lines = size, candidate
+                low = size + 1
+            else:
+                high = size - 1
+
+        return best_size, best_lines
+
     def apply_text(
         self,
         image_bytes: bytes,
         text: str,
         font_variant: Optional[str] = None,
         config: Optional[TextOverlayConfig] = None,
+        encoding: Optional[EncodingOptions] = None,
     ) -> bytes:
         """
         Добавляет текст на изображение.
@@ -133,6 +204,7 @@ class TextOverlayService:
             text: Текст для нанесения
             font_variant: Название шрифта (опционально)
             config: Настройки отображения
+            encoding: Формат и бюджет размера результата
 
         Returns:
             Байты обновлённого изображения
@@ -141,63 +213,37 @@ class TextOverlayService:
             return image_bytes
 
         cfg = config or TextOverlayConfig()
-        base_image = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+        base_image = open_for_compositing(image_bytes)
 
         # Расчёт базовых параметров
         max_text_width = int(base_image.width * cfg.max_width_ratio)
         padding = int(min(base_image.size) * cfg.padding_ratio)
         font_size = max(60, int(base_image.height * cfg.font_size_ratio))
 
-        # Создание оверлея
-        overlay = Image.new("RGBA", base_image.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
-
-        # Загрузка шрифта и перенос текста
-        font = self._get_font(font_size, font_variant)
-        lines = self._wrap_text(text, draw, font, max_text_width)
+        # Подбор размера шрифта и перенос текста
+        font_path = self._get_font_path(font_variant)
+        font_size, lines = self._fit_font_size(
+            text, font_path, font_size, max_text_width
+        )
+        font = _load_font(font_path, font_size)
 
         if not any(line.strip() for line in lines):
             return image_bytes
 
         # Расчёт размеров текстового блока
-        line_heights = [
-            draw.textbbox((0, 0), line or " ", font=font)[3]
-            - draw.textbbox((0, 0), line or " ", font=font)[1]
-            for line in lines
-        ]
+        line_heights = []
+        for line in lines:
+            bbox = font.getbbox(line or " ")
+            line_heights.append(bbox[3] - bbox[1])
         spacing = (
             int(line_heights[0] * max(cfg.line_spacing - 1.0, 0)) if line_heights else 0
         )
         text_height = sum(line_heights) + spacing * max(len(lines) - 1, 0)
-        text_width = max(
-            (draw.textlength(line, font=font) for line in lines if line), default=0
-        )
-
-        # Масштабирование для коротких текстов
-        coverage = text_width / max_text_width if max_text_width else 1
-        if len(lines) <= 3 and coverage < 0.7:
-            scale = min(1.8, max(1.15, 0.9 / max(coverage, 0.05)))
-            font = self._get_font(int(font_size * scale), font_variant)
-            lines = self._wrap_text(text, draw, font, max_text_width)
-
-            line_heights = [
-                draw.textbbox((0, 0), line or " ", font=font)[3]
-                - draw.textbbox((0, 0), line or " ", font=font)[1]
-                for line in lines
-            ]
-            spacing = (
-                int(line_heights[0] * max(cfg.line_spacing - 1.0, 0))
-                if line_heights
-                else 0
-            )
-            text_height = sum(line_heights) + spacing * max(len(lines) - 1, 0)
-            text_width = max(
-                (draw.textlength(line, font=font) for line in lines if line), default=0
-            )
+        text_width = self._max_line_width(lines, font_path, font_size)
 
         # Размеры и позиция блока
         extra_width = int(text_width * cfg.background_expand_ratio)
-        block_width = text_width + padding * 2 + extra_width
+        block_width = int(text_width) + padding * 2 + extra_width
         block_height = text_height + padding * 2
 
         if cfg.position == "top":
@@ -209,30 +255,26 @@ class TextOverlayService:
 
         left = (base_image.width - block_width) // 2
 
+        # Оверлей размером с текстовый блок, а не со всё изображение
+        overlay = Image.new("RGBA", (block_width + 1, block_height + 1), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(overlay)
+
         # Рисование фона
         draw.rounded_rectangle(
-            [left, top, left + block_width, top + block_height],
+            [0, 0, block_width, block_height],
             radius=int(padding * 0.4),
             fill=cfg.background_color,
         )
 
         # Рисование текста
-        current_y = top + padding
+        current_y = padding
         for idx, line in enumerate(lines):
             display_line = line.upper() if idx == 0 and cfg.uppercase_headers else line
             line_width = draw.textlength(display_line, font=font)
-            x = left + (block_width - line_width) / 2
+            x = (block_width - line_width) / 2
             draw.text((x, current_y), display_line, font=font, fill=cfg.text_color)
             current_y += line_heights[idx] + spacing
 
-        # Композиция и сохранение
-        composed = Image.alpha_composite(base_image, overlay)
-        output = io.BytesIO()
-        output_format = base_image.format or "PNG"
-
-        if output_format.upper() == "JPEG":
-            composed.convert("RGB").save(output, format=output_format, quality=95)
-        else:
-            composed.save(output, format=output_format)
-
-        return output.getvalue()
+        # Композиция только области блока и сохранение
+        composite_region(base_image, overlay, (left, top))
+        return encode_image(base_image, encoding)
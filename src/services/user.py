@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional, Sequence, Tuple
+from typing import Optional, Sequence, Tuple, Union
 
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, Message
@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.db.models import User
 from src.repositories.user import UserRepository
+from src.services.user_access_cache import UserAccess, user_access_cache
 
 
 class UserService:
@@ -96,6 +97,48 @@ class UserService:
             await self.session.rollback()
             raise
 
+    async def get_access(
+        self,
+        telegram_id: int,
+        username: Optional[str],
+    ) -> Tuple[UserAccess, bool]:
+        """
+        Доступ пользователя через кэш; при промахе — register_or_get_user.
+
+        Username в БД обновляется, только когда отличается от закэшированного.
+        Возвращает кортеж (access, created).
+        """
+        access = await user_access_cache.get(telegram_id)
+        if access is not None and (not username or access.username == username):
+            return access, False
+
+        user, created = await self.register_or_get_user(
+            telegram_id=telegram_id,
+            username=username,
+        )
+        access = _to_access(user)
+        await user_access_cache.set(access)
+        return access, created
+
+    async def ensure_admin_access(
+        self,
+        telegram_id: int,
+        username: Optional[str],
+    ) -> UserAccess:
+        """ensure_admin через кэш: без обращения к БД, пока запись актуальна."""
+        access = await user_access_cache.get(telegram_id)
+        if (
+            access is not None
+            and access.is_active
+            and (not username or access.username == username)
+        ):
+            return access
+
+        user = await self.ensure_admin(telegram_id=telegram_id, username=username)
+        access = _to_access(user)
+        await user_access_cache.set(access)
+        return access
+
     async def activate_user(self, telegram_id: int) -> Optional[User]:
         """Активирует пользователя и фиксирует изменения."""
         try:
@@ -104,11 +147,13 @@ class UserService:
                 telegram_id=telegram_id,
             )
             await self.session.commit()
-            return user
         except Exception:
             await self.session.rollback()
             raise
 
+        await user_access_cache.invalidate(telegram_id)
+        return user
+
     async def deactivate_user(self, telegram_id: int) -> Optional[User]:
         """Деактивирует пользователя."""
         try:
@@ -117,11 +162,13 @@ class UserService:
                 telegram_id=telegram_id,
             )
             await self.session.commit()
-            return user
         except Exception:
             await self.session.rollback()
             raise
 
+        await user_access_cache.invalidate(telegram_id)
+        return user
+
     async def list_pending_users(self) -> Sequence[User]:
         """Возвращает пользователей, ожидающих активации."""
         return await self.repository.list_pending_users(session=self.session)
@@ -137,11 +184,13 @@ class UserService:
 
             user.is_active = True
             await self.session.commit()
-            return user
         except Exception:
             await self.session.rollback()
             raise
 
+        await user_access_cache.invalidate(user.telegram_id)
+        return user
+
     async def deactivate_user_by_username(self, username: str) -> Optional[User]:
         try:
             user = await self.repository.get_by_username(
@@ -153,14 +202,16 @@ class UserService:
 
             user.is_active = False
             await self.session.commit()
-            return user
         except Exception:
             await self.session.rollback()
             raise
 
+        await user_access_cache.invalidate(user.telegram_id)
+        return user
+
     async def send_access_request_to_admin(
         self,
-        user: User,
+        user: Union[User, UserAccess],
         text: Optional[str] = None,
         reply_markup: Optional[InlineKeyboardMarkup] = None,
     ) -> Message:
@@ -182,3 +233,11 @@ class UserService:
             text=message_text,
             reply_markup=reply_markup,
         )
+
+
+def _to_access(user: User) -> UserAccess:
+    return UserAccess(
+        telegram_id=user.telegram_id,
+        is_active=user.is_active,
+        username=user.username,
+    )
@@ -0,0 +1,141 @@
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from src.config import settings
+from src.services.rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Сколько записей держать в памяти, прежде чем чистить устаревшие
+MAX_LOCAL_ENTRIES = 10000
+
+
+@dataclass(frozen=True)
+class UserAccess:
+    """Данные пользователя, достаточные для проверки доступа"""
+
+    telegram_id: int
+    is_active: bool
+    username: Optional[str]
+
+
+class UserAccessCache:
+    """
+    Кэш решений о доступе пользователя к боту.
+
+    Запись читается сначала из памяти процесса (короткий TTL, чтобы реплики
+    быстро увидели изменения), затем из Redis. Смена статуса в UserService
+    удаляет запись явно, поэтому TTL в Redis ограничивает только устаревание
+    после изменений в обход сервиса.
+    """
+
+    KEY_PREFIX = "user_access"
+
+    def __init__(self, ttl: Optional[int] = None, local_ttl: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else settings.USER_ACCESS_CACHE_TTL
+        self.local_ttl = (
+            local_ttl if local_ttl is not None else settings.USER_ACCESS_LOCAL_TTL
+        )
+        # telegram_id -> (запись, момент истечения)
+        self._local: Dict[int, Tuple[UserAccess, float]] = {}
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _key(self, telegram_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{telegram_id}"
+
+    async def _get_redis(self):
+        if not rate_limiter.redis_client:
+            await rate_limiter.initialize()
+        return rate_limiter.redis_client
+
+    async def get(self, telegram_id: int) -> Optional[UserAccess]:
+        """Запись из кэша или None, если её нужно прочитать из БД"""
+        if self.ttl <= 0:
+            return None
+
+        cached = self._local.get(telegram_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self.hits += 1
+            return cached[0]
+
+        try:
+            redis_client = await self._get_redis()
+            raw = await redis_client.get(self._key(telegram_id))
+        except Exception as e:
+            logger.warning(f"Кэш доступа пользователей недоступен: {e}")
+            raw = None
+
+        if raw:
+            try:
+                payload = json.loads(raw)
+                access = UserAccess(
+                    telegram_id=telegram_id,
+                    is_active=bool(payload["is_active"]),
+                    username=payload.get("username"),
+                )
+            except (ValueError, KeyError):
+                access = None
+            if access is not None:
+                self.redis_hits += 1
+                self._remember(access)
+                return access
+
+        self.misses += 1
+        return None
+
+    async def set(self, access: UserAccess) -> None:
+        if self.ttl <= 0:
+            return
+
+        self._remember(access)
+        try:
+            redis_client = await self._get_redis()
+            await redis_client.set(
+                self._key(access.telegram_id),
+                json.dumps(
+                    {"is_active": access.is_active, "username": access.username},
+                    ensure_ascii=False,
+                ),
+                ex=self.ttl,
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить доступ пользователя в кэш: {e}")
+
+    async def invalidate(self, telegram_id: int) -> None:
+        """Удаляет запись после изменения статуса пользователя"""
+        self._local.pop(telegram_id, None)
+        try:
+            redis_client = await self._get_redis()
+            await redis_client.delete(self._key(telegram_id))
+        except Exception as e:
+            logger.warning(f"Не удалось сбросить кэш доступа пользователя: {e}")
+
+    def _remember(self, access: UserAccess) -> None:
+        if len(self._local) >= MAX_LOCAL_ENTRIES:
+            now = time.monotonic()
+            for key in [k for k, v in self._local.items() if v[1] <= now]:
+                del self._local[key]
+            while len(self._local) >= MAX_LOCAL_ENTRIES:
+                del self._local[next(iter(self._local))]
+
+        self._local[access.telegram_id] = (
+            access,
+            time.monotonic() + self.local_ttl,
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self._local),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+        }
+
+
+user_access_cache = UserAccessCache()
@@ -0,0 +1,6 @@
+import os
+
+# Settings() требует ADMIN_ID, а engine создаётся при импорте src.db.database
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ.setdefault("REDIS_PORT", "6379")
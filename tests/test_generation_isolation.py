@@ -0,0 +1,221 @@
+"""
+Нагрузочная проверка изоляции параллельных генераций.
+
+Много «апдейтов» разных пользователей одновременно идут через общий
+AIManager; модель подменена заглушкой со случайными задержками, чтобы
+задачи чередовались. Проверяется, что профиль НКО, срок и стоимость
+операций не переходят от одного запроса к другому.
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from src.services import ai_manager as ai_manager_module
+from src.services.ai_manager import AIManager
+from src.services.deadline import get_deadline
+from src.services.generation_context import get_generation_context
+from src.services.operation_cost import OPERATION_COSTS, take_spent_cost
+
+USERS = 60
+OPERATIONS_PER_USER = 4
+
+
+class FakeNKOService:
+    def __init__(self, session):
+        self.session = session
+
+    async def get_data(self, user_id: int) -> dict:
+        await asyncio.sleep(random.uniform(0, 0.005))
+        return {"name": f"НКО пользователя {user_id}"}
+
+
+class FakeModel:
+    """Заглушка GigaChat: запоминает, в каком контексте её вызвали"""
+
+    def __init__(self, fail_users=()):
+        self.fail_users = set(fail_users)
+        self.hang_users = set()
+        self.started = asyncio.Event()
+        self.calls = []
+
+    async def generate_text(self, prompt, system_prompt=None, **kwargs) -> str:
+        context = get_generation_context()
+        deadline = get_deadline()
+        await asyncio.sleep(random.uniform(0, 0.01))
+
+        # После переключения на другие задачи контекст и срок те же
+        assert get_generation_context() is context
+        assert get_deadline() is deadline
+
+        self.calls.append((context.user_id, f"{system_prompt}\n{prompt}", deadline))
+        if context.user_id in self.fail_users:
+            raise RuntimeError("GigaChat unavailable")
+        if context.user_id in self.hang_users:
+            self.started.set()
+            await asyncio.Event().wait()
+        return f"Пост пользователя {context.user_id}"
+
+    async def stream_text(self, prompt, system_prompt=None, **kwargs):
+        for chunk in ("Пост ", "пользователя ", str(get_generation_context().user_id)):
+            await asyncio.sleep(0.001)
+            yield chunk
+
+
+async def fake_reserve(user_id: int) -> str:
+    return f"reservation-{user_id}-{random.getrandbits(32)}"
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(ai_manager_module, "NKOService", FakeNKOService)
+    monkeypatch.setattr(ai_manager_module, "reserve_operation", fake_reserve)
+    manager = AIManager()
+    manager.content_generator.model = FakeModel()
+    return manager
+
+
+async def _run_update(manager: AIManager, user_id: int, operations: list) -> int:
+    """Один апдейт: несколько операций подряд, затем списание стоимости"""
+    for operation in operations:
+        if operation == "text":
+            post = await manager.generate_free_text_post(
+                user_id=user_id, session=None, user_idea="идея"
+            )
+            assert post == f"Пост пользователя {user_id}"
+        else:
+            await manager.generate_content_plan(
+                user_id=user_id, session=None, duration_days=7, posts_per_week=2
+            )
+
+    assert get_generation_context() is None
+    assert get_deadline() is None
+    return take_spent_cost()
+
+
+def test_concurrent_generations_stay_isolated(manager):
+    rng = random.Random(8)
+    plans = {
+        user_id: [
+            rng.choice(["text", "content_plan"]) for _ in range(OPERATIONS_PER_USER)
+        ]
+        for user_id in range(1, USERS + 1)
+    }
+
+    async def main():
+        # Как в aiogram: каждый апдейт — отдельная задача со своей копией контекста
+        tasks = {
+            user_id: asyncio.create_task(_run_update(manager, user_id, operations))
+            for user_id, operations in plans.items()
+        }
+        await asyncio.gather(*tasks.values())
+        return {user_id: task.result() for user_id, task in tasks.items()}
+
+    spent = asyncio.run(main())
+
+    for user_id, operations in plans.items():
+        assert spent[user_id] == sum(OPERATION_COSTS[op] for op in operations)
+
+    calls = manager.content_generator.model.calls
+    assert len(calls) == USERS * OPERATIONS_PER_USER
+    for user_id, prompt, _ in calls:
+        assert f"НКО пользователя {user_id}" in prompt
+        assert "НКО пользователя" not in prompt.replace(
+            f"НКО пользователя {user_id}", ""
+        )
+
+    # У каждой генерации свой срок
+    assert len({id(deadline) for _, _, deadline in calls}) == len(calls)
+    assert manager.scheduler.active == 0
+
+
+@pytest.fixture
+def refunded(monkeypatch):
+    refunded = []
+
+    async def fake_refund(user_id: int, reservation_id: str) -> None:
+        assert reservation_id.startswith(f"reservation-{user_id}-")
+        refunded.append(user_id)
+
+    monkeypatch.setattr(ai_manager_module, "refund_operation", fake_refund)
+    return refunded
+
+
+def test_failed_generation_refunds_only_its_user(manager, refunded):
+    failing = {3, 7, 11}
+    manager.content_generator.model.fail_users = failing
+
+    async def update(user_id: int) -> int:
+        try:
+            await manager.generate_free_text_post(
+                user_id=user_id, session=None, user_idea="идея"
+            )
+        except RuntimeError:
+            assert user_id in failing
+        assert get_generation_context() is None
+        return take_spent_cost()
+
+    async def main():
+        return await asyncio.gather(*(update(user_id) for user_id in range(1, 21)))
+
+    spent = asyncio.run(main())
+
+    assert sorted(refunded) == sorted(failing)
+    for user_id, cost in zip(range(1, 21), spent):
+        assert cost == (0 if user_id in failing else OPERATION_COSTS["text"])
+    assert manager.scheduler.active == 0
+
+
+def test_cancelled_generation_refunds_reservation(manager, refunded):
+    model = manager.content_generator.model
+    model.hang_users = {5}
+
+    async def main():
+        task = asyncio.create_task(
+            manager.generate_free_text_post(user_id=5, session=None, user_idea="идея")
+        )
+        await model.started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return take_spent_cost()
+
+    assert asyncio.run(main()) == 0
+    assert refunded == [5]
+    assert manager.scheduler.active == 0
+
+
+def test_closed_stream_refunds_reservation(manager, refunded):
+    async def read_first_chunk(user_id: int) -> str:
+        stream = manager.stream_free_text_post(
+            user_id=user_id, session=None, user_idea="идея"
+        )
+        chunk = await anext(stream)
+        # Как aclosing в stream_to_message при ошибке отправки
+        await stream.aclose()
+        return chunk
+
+    async def read_all(user_id: int) -> str:
+        return "".join(
+            [
+                chunk
+                async for chunk in manager.stream_free_text_post(
+                    user_id=user_id, session=None, user_idea="идея"
+                )
+            ]
+        )
+
+    async def main():
+        first = await read_first_chunk(1)
+        assert take_spent_cost() == 0
+        full = await read_all(2)
+        return first, full, take_spent_cost()
+
+    first, full, spent = asyncio.run(main())
+
+    assert first == "Пост "
+    assert full == "Пост пользователя 2"
+    assert spent == OPERATION_COSTS["text"]
+    assert refunded == [1]
+    assert manager.scheduler.active == 0
@@ -0,0 +1,40 @@
+"""
+Уведомления о позиции в очереди генерации.
+
+Последнее обновление («допущен», позиция 0) должно завершиться до того,
+как запрос начнёт генерацию и редактирование того же сообщения.
+"""
+
+import asyncio
+
+from src.services.generation_scheduler import GenerationScheduler, queue_listener
+
+
+def test_final_position_update_finishes_before_slot_is_entered():
+    scheduler = GenerationScheduler(max_concurrent=1)
+    events = []
+
+    async def listener(position: int) -> None:
+        # Медленный edit_text в Telegram
+        await asyncio.sleep(0.02)
+        events.append(f"position {position}")
+
+    async def first() -> None:
+        async with scheduler.slot(1):
+            await asyncio.sleep(0.01)
+
+    async def second() -> None:
+        queue_listener.set(listener)
+        async with scheduler.slot(2):
+            events.append("generation")
+
+    async def main():
+        holder = asyncio.create_task(first())
+        await asyncio.sleep(0)
+        await asyncio.gather(holder, second())
+
+    asyncio.run(main())
+
+    # Позиция 1 заменена итоговым обновлением, которое пришло раньше генерации
+    assert events == ["position 0", "generation"]
+    assert scheduler.active == 0